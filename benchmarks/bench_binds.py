@@ -0,0 +1,72 @@
+"""
+Running long `>>` chains of policy rules: PolicyRule's flat bind chains
+(see `BindChain` in `calcifer.monads`), against the generic StateT bind,
+which nests one closure (and one Python frame per run) per bind.
+
+Run with `python benchmarks/bench_binds.py`
+"""
+import sys
+import timeit
+
+from pymonad import List
+
+from calcifer.monads import Stream, stateT
+from calcifer.operators import operators_for
+from calcifer.partial import Partial
+
+
+def make_chain(ops, steps, bind):
+    def increment(value):
+        return ops.unit(value + 1)
+
+    rule = ops.unit(0)
+    for _ in range(steps):
+        rule = bind(rule, increment)
+    return rule
+
+
+def flat_bind(rule, rule_func):
+    return rule >> rule_func
+
+
+def nested_bind(rule, rule_func):
+    return stateT(List).bind(rule, rule_func)
+
+
+def report(name, rule, run, number=10):
+    try:
+        seconds = min(timeit.repeat(
+            lambda: run(rule), number=number, repeat=3
+        ))
+    except RuntimeError:  # RecursionError
+        print("{:<40} RecursionError".format(name))
+        return
+    print("{:<40} {:>8.2f} ms/run".format(name, seconds / number * 1e3))
+
+
+def run_list(rule):
+    return rule.run(Partial())
+
+
+def run_stream(rule):
+    return list(rule.run(Partial()))
+
+
+if __name__ == '__main__':
+    list_ops = operators_for(List)
+    stream_ops = operators_for(Stream)
+    print("recursion limit: {}".format(sys.getrecursionlimit()))
+
+    for steps in [500, 10000]:
+        report(
+            "nested StateT bind, {} steps".format(steps),
+            make_chain(list_ops, steps, nested_bind), run_list
+        )
+        report(
+            "flat PolicyRule bind, {} steps".format(steps),
+            make_chain(list_ops, steps, flat_bind), run_list
+        )
+        report(
+            "flat PolicyRule bind (Stream), {} steps".format(steps),
+            make_chain(stream_ops, steps, flat_bind), run_stream
+        )
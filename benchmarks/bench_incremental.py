@@ -0,0 +1,56 @@
+"""
+Re-running a policy on a form after each field edit: from scratch with
+`BasePolicy.run`, and incrementally with `BasePolicy.incremental`.
+
+Run with `python benchmarks/bench_incremental.py`
+"""
+import timeit
+
+from calcifer.policy import DefaultPolicy
+
+FIELDS = 200
+
+
+class Forms(object):
+    @DefaultPolicy
+    def form_policy(ctx):
+        for idx in range(FIELDS):
+            ctx.select("/field{}".format(idx)).require()
+
+
+def make_edits(form):
+    """
+    Returns a function returning the form with the next field edited
+    """
+    edits = [0]
+
+    def edit():
+        edits[0] += 1
+        edited = dict(form)
+        edited["field{}".format(edits[0] % FIELDS)] = "edit{}".format(edits[0])
+        return edited
+    return edit
+
+
+def report(func, number=20):
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    return seconds / number * 1e3
+
+
+if __name__ == '__main__':
+    policy = Forms().form_policy
+    incremental = policy.incremental()
+    # every third field missing
+    form = {
+        "field{}".format(idx): "value"
+        for idx in range(FIELDS) if idx % 3
+    }
+    incremental.run(dict(form))
+
+    edit = make_edits(form)
+    print("{:<12} {:>10}".format("run", "ms"))
+    print("{:<12} {:>10.2f}".format("full", report(lambda: policy.run(edit()))))
+    print("{:<12} {:>10.2f}".format(
+        "incremental", report(lambda: incremental.run(edit()))
+    ))
+    print(incremental)
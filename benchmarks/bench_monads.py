@@ -0,0 +1,42 @@
+"""
+Per-rule construction cost of PolicyRule, with and without the
+per-monad class cache in `calcifer.monads`.
+
+Run with `python benchmarks/bench_monads.py`
+"""
+import timeit
+
+from pymonad import List
+
+from calcifer.monads import policyM, stateT
+from calcifer.operators import set_value
+
+
+def for_partial(partial):
+    return List((None, partial))
+
+
+def uncached_rule():
+    # what every rule construction used to do: create a fresh StateT and
+    # a fresh PolicyRule class
+    stateT.uncached(List)
+    return policyM.uncached(List)(for_partial)
+
+
+def cached_rule():
+    return policyM(List)(for_partial)
+
+
+def operator_call():
+    return set_value(5)
+
+
+def report(name, func, number=10000):
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    print("{:<32} {:>8.2f} us/rule".format(name, seconds / number * 1e6))
+
+
+if __name__ == '__main__':
+    report("uncached PolicyRule class", uncached_rule)
+    report("cached PolicyRule class", cached_rule)
+    report("operator call (set_value(5))", operator_call)
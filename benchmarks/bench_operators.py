@@ -0,0 +1,54 @@
+"""
+Building and running each operator: the time to build a policy rule with
+the operator (what contexts do when finalizing, and operators like `each`
+do for every node they visit), and to run it on a small partial.
+
+Run with `python benchmarks/bench_operators.py`
+"""
+import timeit
+
+from pymonad import List
+
+from calcifer.operators import operators_for
+from calcifer.partial import Partial
+
+
+def make_cases(ops):
+    """
+    (name, build) pairs; `build()` returns a policy rule
+    """
+    return [
+        ("regarding", lambda: ops.regarding("/a", ops.set_value(1))),
+        ("each", lambda: ops.regarding(
+            "/fields", ops.get_value() >> ops.each(ops.set_value(1))
+        )),
+        ("trace", lambda: ops.trace(ops.unit)),
+        ("unless_errors", lambda: ops.unless_errors(ops.set_value(1))),
+        ("collect", lambda: ops.unit(1) >> ops.collect(ops.unit, ops.unit)),
+        ("or_error", lambda: ops.unit(1) >> ops.or_error(ops.require_value)),
+        ("attempt", lambda: ops.unit(1) >> ops.attempt(ops.unit)),
+        ("push_context", lambda: ops.push_context("frame")),
+        ("wrap_context", lambda: ops.wrap_context(
+            "frame", ops.regarding("/a", ops.set_value(1))
+        )),
+        ("append_value", lambda: ops.regarding(
+            "/a", ops.append_value(1)
+        )),
+    ]
+
+
+def report(name, func, number=2000):
+    seconds = min(timeit.repeat(func, number=number, repeat=7))
+    return seconds / number * 1e6
+
+
+if __name__ == '__main__':
+    ops = operators_for(List)
+    partial = Partial.from_obj({"fields": {"a": 1, "b": 2, "c": 3}})
+
+    print("{:<16} {:>12} {:>12}".format("operator", "build us", "run us"))
+    for name, build in make_cases(ops):
+        rule = build()
+        built = report(name, build)
+        ran = report(name, lambda: rule.run(partial))
+        print("{:<16} {:>12.2f} {:>12.2f}".format(name, built, ran))
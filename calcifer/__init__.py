@@ -25,6 +25,7 @@ from calcifer.operators import (
     get_node,
     get_value,
     match,
+    or_error,
     permit_values,
     policies,
     pop_value,
@@ -43,9 +44,10 @@ from calcifer.operators import (
 )
 from calcifer.partial import Partial
 from calcifer.monads import (
-    PolicyRule, PolicyRuleFunc, policy_rule, policy_rule_func,
+    PolicyRule, PolicyRuleFunc, Stream, policy_rule, policy_rule_func,
 )
 from calcifer.policy import BasePolicy
+from calcifer.executor import PolicyExecutor
 from calcifer.policy import DefaultPolicy as Policy
 
 from calcifer._version import __version__
@@ -1,9 +1,15 @@
 from abc import ABCMeta
-import collections
+from contextlib import contextmanager
 import copy
 import re
+import threading
 from six import string_types
 
+try:
+    from collections.abc import Iterable
+except ImportError:  # Python 2
+    from collections import Iterable
+
 
 def get_call_repr(func_name, *args, **kwargs):
     args_expr = ", ".join([repr(arg) for arg in args])
@@ -30,56 +36,161 @@ class Node:
         return copy.copy(self)
 
 
+_local = threading.local()
+
+
+def is_enabled():
+    """
+    Whether policy rules built on the current thread carry ASTs
+    """
+    return getattr(_local, 'enabled', True)
+
+
+def enable():
+    """
+    Have policy rules built on the current thread from here on carry ASTs
+    (the default)
+    """
+    _local.enabled = True
+
+
+def disable():
+    """
+    Stop building ASTs for policy rules on the current thread, e.g. in
+    production where they are never looked at. Rules built while disabled
+    have `ast = None`, and so do the context frames reported with errors.
+    """
+    _local.enabled = False
+
+
+@contextmanager
+def enabled_as(enabled):
+    """
+    Builds ASTs for policy rules on the current thread within the `with`
+    block only if `enabled`, restoring the setting on the way out
+    """
+    was_enabled = is_enabled()
+    _local.enabled = enabled
+    try:
+        yield
+    finally:
+        _local.enabled = was_enabled
+
+
 def flatten(l):
     for el in l:
-        if isinstance(el, collections.Iterable) and not isinstance(el, string_types):
+        if isinstance(el, Iterable) and not isinstance(el, string_types):
             for sub in flatten(el):
                 yield sub
         else:
             yield el
 
 
-class Binding(Node):
-    def __new__(cls, *operands):
-        operands = flatten([
-            operand if not isinstance(operand, cls) else operand.operands
-            for operand in operands
-        ])
-        return super(Binding, cls).__new__(cls, operands)
+def bind(left, right):
+    """
+    Returns the AST for binding two ASTs, unless ASTs are disabled
+    """
+    if not is_enabled():
+        return None
+    return Binding(left, right)
+
 
+class Binding(Node):
+    """
+    Binding is built in constant time; the (flat) list of operands is only
+    worked out on first access, iteratively, so that long chains of binds
+    cost O(n) in total.
+    """
     def __init__(self, *operands):
-        self.operands = operands
+        self._operands = operands
+        self._flattened = None
+
+    @property
+    def operands(self):
+        if self._flattened is None:
+            flattened = []
+            pending = [iter(self._operands)]
+            while pending:
+                for operand in pending[-1]:
+                    if isinstance(operand, Binding):
+                        if operand._flattened is not None:
+                            flattened.extend(operand._flattened)
+                        else:
+                            pending.append(iter(operand._operands))
+                            break
+                    elif (
+                            isinstance(operand, Iterable) and
+                            not isinstance(operand, string_types)
+                    ):
+                        pending.append(iter(operand))
+                        break
+                    else:
+                        flattened.append(operand)
+                else:
+                    pending.pop()
+            self._flattened = tuple(flattened)
+        return self._flattened
 
     def __repr__(self):
         return " >> ".join([repr(operand) for operand in self.operands])
 
 
 class PolicyRuleFunc(Node):
+    """
+    `name` may be given as a function returning the name, in which case it
+    is called on first access.
+    """
     def __init__(self, name):
-        self.name = name
+        self._name = name
+
+    @property
+    def name(self):
+        if callable(self._name):
+            self._name = self._name()
+        return self._name
 
     def __repr__(self):
         return self.name
 
 
+class Rendered(Node):
+    """
+    Stands in for some AST by its repr, e.g. once the AST has left the
+    process that built it.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+
 class PolicyRuleFuncCall(Node):
     def __init__(self, func, args, kwargs, result=None):
         self.func = func
-        self.args = [
+        self._args = args
+        self._kwargs = kwargs
+        self.result = result
+
+    @property
+    def args(self):
+        return [
             getattr(arg, 'ast', arg)
-            for arg in args
+            for arg in self._args
         ]
-        self.kwargs = {
+
+    @property
+    def kwargs(self):
+        return {
             k: getattr(v, 'ast', v)
-            for k, v in kwargs.items()
+            for k, v in self._kwargs.items()
         }
-        self.result = result
 
     def with_result(self, result):
         return PolicyRuleFuncCall(
             self.func,
-            self.args,
-            self.kwargs,
+            self._args,
+            self._kwargs,
             result
         )
 
@@ -0,0 +1,281 @@
+"""
+`calcifer.caching` module
+
+Small, bounded caches for values that are expensive to recompute and
+requested over and over again while running policies.
+
+Caches share a small interface (`get`, `set`, `clear`, `len()` and
+`hits`/`misses` counters), so that e.g. `Context.memoized_apply` may keep
+its results in-process (`LRUCache`) or in a file shared by several
+worker processes (`SQLiteCache`).
+"""
+from collections import OrderedDict
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from six.moves import cPickle as pickle
+
+from calcifer.interning import SCALAR_TYPES
+
+
+class LRUCache(object):
+    """
+    A mapping that holds at most `maxsize` entries, evicting the least
+    recently used entry when full. With a `ttl` (in seconds), entries
+    also expire that long after they are set.
+    """
+    # whether entries outlive the process, see `SQLiteCache`
+    shared = False
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entries = self._entries
+        try:
+            value = entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        if self.ttl is not None:
+            value, expires = value
+            if expires <= self.clock():
+                self.misses += 1
+                return default
+            value = (value, expires)
+        # re-insert as most recently used
+        entries[key] = value
+        self.hits += 1
+        if self.ttl is not None:
+            return value[0]
+        return value
+
+    def set(self, key, value):
+        entries = self._entries
+        entries.pop(key, None)
+        if self.ttl is not None:
+            value = (value, self.clock() + self.ttl)
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<LRUCache {}/{} hits={} misses={}>".format(
+            len(self), self.maxsize, self.hits, self.misses
+        )
+
+
+class SQLiteCache(object):
+    """
+    A cache kept in a SQLite database file, shared by all the processes
+    (and threads) that open it. With a `ttl` (in seconds), entries expire
+    that long after they are set.
+
+    Values are pickled. Keys are stored by `key_digest`, so they must be
+    built from values whose repr is the same in every process, as the
+    keys made by `freeze` from plain data are. `Context.memoized_apply`
+    keys results by the module and qualified name of the function, so
+    functions sharing a SQLiteCache must be uniquely named, module-level
+    functions (not lambdas or closures).
+    """
+    shared = True
+
+    def __init__(self, path, table='memo', ttl=None, clock=time.time):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # connections can be shared by neither threads nor forked processes
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(self.path)
+            local.connection.execute(
+                "CREATE TABLE IF NOT EXISTS {} ("
+                "key TEXT PRIMARY KEY, value BLOB, expires REAL"
+                ")".format(self.table)
+            )
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key, default=None):
+        row = self.connection.execute(
+            "SELECT value, expires FROM {} WHERE key = ?".format(self.table),
+            (key_digest(key),)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= self.clock()):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(bytes(row[0]))
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = self.clock() + self.ttl
+        connection = self.connection
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO {} (key, value, expires) "
+                "VALUES (?, ?, ?)".format(self.table),
+                (
+                    key_digest(key),
+                    sqlite3.Binary(pickle.dumps(value, -1)),
+                    expires,
+                )
+            )
+
+    def clear(self):
+        connection = self.connection
+        with connection:
+            connection.execute("DELETE FROM {}".format(self.table))
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return self.connection.execute(
+            "SELECT 1 FROM {} WHERE key = ?".format(self.table),
+            (key_digest(key),)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM {}".format(self.table)
+        ).fetchone()[0]
+
+    def __repr__(self):
+        return "<SQLiteCache {!r} hits={} misses={}>".format(
+            self.path, self.hits, self.misses
+        )
+
+
+class FrozenTag(object):
+    """
+    Marks the type of container that `freeze` made a tuple or frozenset of
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<{}>".format(self.name)
+
+
+FROZEN_DICT = FrozenTag('dict')
+FROZEN_LIST = FrozenTag('list')
+
+
+def freeze(obj):
+    """
+    Returns a hashable equivalent of `obj`: dicts, lists and sets within
+    it become frozensets and tuples. Freezing two equal objects gives
+    equal results, so the result may key a cache.
+    """
+    obj_type = type(obj)
+    if obj_type in SCALAR_TYPES:
+        return obj
+    if obj_type is tuple:
+        return tuple([freeze(item) for item in obj])
+    if isinstance(obj, dict):
+        return (FROZEN_DICT, frozenset([
+            (key, freeze(value)) for key, value in obj.items()
+        ]))
+    if isinstance(obj, list):
+        return (FROZEN_LIST, tuple([freeze(item) for item in obj]))
+    if isinstance(obj, tuple):
+        return tuple([freeze(item) for item in obj])
+    if isinstance(obj, set):
+        return frozenset(obj)
+    return obj
+
+
+def canonical_repr(obj):
+    """
+    A repr of `obj` in which the items of sets come in sorted order
+    """
+    if isinstance(obj, frozenset):
+        return "{{{}}}".format(", ".join(sorted(
+            canonical_repr(item) for item in obj
+        )))
+    if isinstance(obj, tuple):
+        return "({})".format(", ".join(canonical_repr(item) for item in obj))
+    return repr(obj)
+
+
+def key_digest(key):
+    """
+    A digest of a (frozen) cache key that is the same in every process
+    """
+    return hashlib.sha1(canonical_repr(key).encode('utf-8')).hexdigest()
+
+
+def make_memo():
+    """
+    Returns a new cache for `Context.memoized_apply`, as configured by
+    `use_memo`
+    """
+    return memo_factory()
+
+
+def use_memo(factory):
+    """
+    Have `Context.memoized_apply` keep results in caches made by
+    `factory()`, e.g. `lambda: SQLiteCache("memo.db")` to share them
+    between processes. The default is an `LRUCache()` per function.
+    """
+    global memo_factory
+    memo_factory = factory
+
+
+memo_factory = LRUCache
+
+
+def lru_cached(maxsize=1024):
+    """
+    Decorator caching the results of a function of one hashable argument.
+    The cache is available as `.cache` on the decorated function.
+    """
+    def decorator(func):
+        cache = LRUCache(maxsize)
+        missing = object()
+
+        @functools.wraps(func)
+        def cached(arg):
+            result = cache.get(arg, missing)
+            if result is missing:
+                result = func(arg)
+                cache.set(arg, result)
+            return result
+        cached.cache = cache
+        return cached
+    return decorator
@@ -0,0 +1,313 @@
+"""
+`calcifer.columnar` module
+
+Columnar validation of batches of request objects.
+
+Most records in a bulk import pass the leaf checks of a policy
+(`require()`, `forbid()` and `whitelist_values()` on selected nodes), and
+for such records running the policy changes nothing but filling in the
+selected scopes. A `ColumnarPlan` finds these checks in the policy's
+contexts, evaluates each one over the column of nodes it checks across
+the whole batch (with NumPy, if installed), and only runs the policy rules
+for the records that fail or fork on some check.
+
+Policies are only planned if their contexts (and those of their included
+policies) consist of nothing but `select`s, plain subcontexts and leaf
+checks; `ColumnarPlan.for_policy` returns None for any other policy, and
+for policies that bind the request object.
+"""
+import six
+
+from calcifer.contexts.base import BaseContext
+from calcifer.operators import ValueIndex, determined_value
+from calcifer.partial import parse_scope
+from calcifer.tree import DictPolicyNode, ListPolicyNode, UNKNOWN, node_at
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class LeafCheck(object):
+    """
+    A leaf check of the node at `path`, evaluated over a column of nodes
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def passes(self, nodes):
+        """
+        Returns, for each node, whether the check passes without changing
+        the node or forking
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self.path)
+
+
+class ExistsCheck(LeafCheck):
+    """
+    Passes for nodes that are present. Selecting a missing scope fills it
+    (and its parents) in, which may change what checks of its parents see;
+    the rules run for records with such scopes missing.
+    """
+    def passes(self, nodes):
+        return as_mask([node is not UNKNOWN for node in nodes])
+
+
+class RequireCheck(LeafCheck):
+    def passes(self, nodes):
+        return as_mask([bool(node.value) for node in nodes])
+
+
+class ForbidCheck(LeafCheck):
+    def passes(self, nodes):
+        return as_mask([node.value is None for node in nodes])
+
+
+class WhitelistCheck(LeafCheck):
+    def __init__(self, path, values):
+        super(WhitelistCheck, self).__init__(path)
+        self.index = ValueIndex(values)
+
+    def passes(self, nodes):
+        values = []
+        for node in nodes:
+            determined, value = determined_value(node)
+            if not determined:
+                # forks, or fails to match
+                return self._passes_one_by_one(nodes)
+            values.append(value)
+
+        unique = self.unique_strings()
+        if numpy is not None and unique is not None and all(
+                isinstance(value, six.string_types) for value in values
+        ):
+            return numpy.isin(numpy.array(values), numpy.array(unique))
+        return as_mask([
+            len(self.index.matching(value)) == 1 for value in values
+        ])
+
+    def _passes_one_by_one(self, nodes):
+        passes = []
+        for node in nodes:
+            determined, value = determined_value(node)
+            passes.append(
+                determined and len(self.index.matching(value)) == 1
+            )
+        return as_mask(passes)
+
+    def unique_strings(self):
+        """
+        The permitted values, if they are all distinct strings
+        """
+        if not hasattr(self, '_unique_strings'):
+            values = list(self.index.values)
+            self._unique_strings = None
+            if all(
+                    isinstance(value, six.string_types) for value in values
+            ) and len(set(values)) == len(values):
+                self._unique_strings = values
+        return self._unique_strings
+
+
+LEAF_CHECKS = {
+    "require": RequireCheck,
+    "forbid": ForbidCheck,
+}
+
+
+def as_mask(passes):
+    if numpy is not None:
+        return numpy.array(passes, dtype=bool)
+    return passes
+
+
+def all_pass(masks, size):
+    if not masks:
+        return [True] * size
+    if numpy is not None:
+        return list(numpy.logical_and.reduce(masks))
+    return [all(passes) for passes in zip(*masks)]
+
+
+class ContextAnalysis(object):
+    """
+    The leaf checks and selected paths of a policy's contexts, in the order
+    the policy runs them. `analyzable` is cleared on anything else.
+    """
+    def __init__(self):
+        self.checks = []
+        self.selected_paths = []
+        self.analyzable = True
+
+    def add_context(self, ctx, path=(), value_path=None):
+        """
+        Adds a context that runs at `path`, and gets the value of the node
+        at `value_path` (or some other value, for None)
+        """
+        if not self.analyzable:
+            return
+
+        if ctx.selected_scope is not None:
+            if not isinstance(ctx.selected_scope, six.string_types):
+                self.analyzable = False
+                return
+            if not ctx.selected_scope:
+                steps = path
+            else:
+                is_absolute, steps = parse_scope(ctx.selected_scope)
+                if not is_absolute:
+                    steps = path + steps
+            path = value_path = steps
+            self.selected_paths.append(path)
+            # `regarding` passes its node to each item
+            item_value_path = path
+        elif ctx.runs_in_turn:
+            # `policies` passes nothing to its items, nor do the checks
+            # within it get the value of the node at `path`
+            value_path = item_value_path = None
+        else:
+            self.analyzable = False
+            return
+
+        for item in ctx.items:
+            if not isinstance(item, BaseContext):
+                self.analyzable = False
+                return
+            if not item.items:
+                # empty contexts are left out (see `_warrants_inclusion`)
+                continue
+
+            leaf_check = item.get_leaf_check()
+            if leaf_check is None:
+                self.add_context(item, path, item_value_path)
+                continue
+
+            kind, values = leaf_check
+            if kind == "whitelist" and ValueIndex.indexable(values):
+                self.checks.append(WhitelistCheck(path, values))
+            elif value_path is not None and kind in LEAF_CHECKS:
+                # `require()` and `forbid()` check the value of their context
+                self.checks.append(LEAF_CHECKS[kind](value_path))
+            else:
+                self.analyzable = False
+                return
+
+
+class ColumnarPlan(object):
+    """
+    The leaf checks and selected paths of a policy, see `for_policy`
+    """
+    def __init__(self, checks, selected_paths):
+        self.checks = checks
+        self.selected_paths = selected_paths
+        # records checked by columns / records the policy rules ran for
+        self.checked = 0
+        self.interpreted = 0
+
+    @classmethod
+    def for_policy(cls, policy):
+        """
+        Returns the ColumnarPlan for a policy, or None if it cannot be
+        planned
+        """
+        if policy.uses_ref:
+            return None
+
+        analysis = ContextAnalysis()
+        cls._analyze(policy, analysis)
+        if not analysis.analyzable or not analysis.checks:
+            return None
+
+        checks = analysis.checks
+        selected_paths = analysis.selected_paths
+        paths = [check.path for check in checks] + selected_paths
+        if any(path[:1] == ('context',) for path in paths):
+            # the rules push onto and pop from the context stack
+            return None
+
+        checked_paths = set(check.path for check in checks)
+        for selected_path in set(selected_paths):
+            if any(
+                    selected_path[:len(path)] == path
+                    for path in checked_paths
+                    if len(path) < len(selected_path)
+            ):
+                checks.append(ExistsCheck(selected_path))
+        return cls(checks, selected_paths)
+
+    @classmethod
+    def _analyze(cls, policy, analysis):
+        analysis.add_context(policy.get_method_context())
+        if getattr(policy, 'parent', None):
+            for included in policy.get_paired_included_policies():
+                cls._analyze(included, analysis)
+
+    def passing(self, partials):
+        """
+        Returns, for each partial, whether it passes every leaf check
+        """
+        roots = [partial.root_node for partial in partials]
+        masks = [
+            check.passes([node_at(root, check.path) for root in roots])
+            for check in self.checks
+        ]
+        return all_pass(masks, len(partials))
+
+    def final_partial(self, partial):
+        """
+        The final partial of running the policy on a partial that passes
+        every leaf check, or None if the policy rules should run for it
+        """
+        if not isinstance(partial.root_node, DictPolicyNode):
+            return None
+
+        context = partial.root_node["context"]
+        if context is UNKNOWN:
+            # the context stack the rules push onto and pop from
+            _, partial = partial.set_value([], "/context")
+        elif not isinstance(context, ListPolicyNode):
+            return None
+
+        for path in self.selected_paths:
+            try:
+                _, partial = partial.select_path(path, set_path=False)
+            except Exception:  # pylint: disable=broad-except
+                # e.g. selecting under a leaf; the rules report it
+                return None
+        return partial
+
+    def run(self, policy, objs):
+        """
+        Runs `policy` for each of `objs`, returning the list of results for
+        each in order, the same as `policy.run` would
+        """
+        objs = list(objs)
+        partials = [policy.initial_partial(obj) for obj in objs]
+
+        finals = [None] * len(objs)
+        for idx, passes in enumerate(self.passing(partials)):
+            if passes:
+                finals[idx] = self.final_partial(partials[idx])
+
+        interpreted = iter(policy.run_many([
+            obj for obj, final in zip(objs, finals) if final is None
+        ]))
+
+        results = []
+        for final in finals:
+            if final is None:
+                self.interpreted += 1
+                results.append(next(interpreted))
+            else:
+                self.checked += 1
+                results.append([policy.resolve(final)])
+        return results
+
+    def __repr__(self):
+        return "<ColumnarPlan checks={!r} checked={} interpreted={}>".format(
+            self.checks, self.checked, self.interpreted
+        )
@@ -1,22 +1,27 @@
 import copy
 import functools
 import logging
+from pymonad import List
 
-from calcifer.operators import (
-    wrap_context, catch_attempt, trace, collect, unit, policies, regarding,
-    fail, args_receiver,
-)
+from calcifer import asts, caching, optimize
+from calcifer.operators import operators_for
 from calcifer.monads import (
     PolicyRule, PolicyRuleFunc, get_call_repr,
 )
 
 logger = logging.getLogger(__name__)
 
+# stands in for results missing from a memo
+MISSING = object()
+
 
-def ctx_apply(f, ctx_args):
+def ctx_apply(f, ctx_args, operators=None):
     """
     Creates a promise to call `f` with some values corresponding to
     the contextual values (or regular values) in `ctx_args`
+
+    :param operators: the operators (see `calcifer.operators.operators_for`)
+        to build the promise with; defaults to those for List
     """
     if not ctx_args:
         return f
@@ -37,7 +42,9 @@ def ctx_apply(f, ctx_args):
     if not missing:
         return f(*values)
 
-    receive = args_receiver(values)
+    if operators is None:
+        operators = operators_for(List)
+    receive = operators.args_receiver(values)
 
     apply_rule = None
     for idx, policy_rule in missing:
@@ -202,7 +209,35 @@ class BaseContext(object):
 
     Once we have this, we can come very close to writing policies as if they
     were just regular operations on python variables.
+
+    Policy rules are built with the operators for the context's `monad`
+    class attribute (List by default). Subclasses with `monad = Stream`
+    build policies that produce their results lazily.
     """
+    monad = List
+
+    # subclasses of context classes made by `for_monad`
+    monad_variants = {}
+
+    # set on contexts that read the context stack (see `trace`)
+    traces_context = False
+
+    # the wrapper given to contexts made without one (see `runs_in_turn`)
+    default_wrapper = None
+
+    # the constant scope of contexts made by `select`
+    selected_scope = None
+
+    # see `mark_leaf_check`
+    leaf_check = None
+
+    # operators that only read and write the node they are applied to,
+    # never the context stack (see `observes_context`)
+    node_operators = (
+        'set_value', 'append_value', 'require_value', 'forbid_value',
+        'permit_values',
+    )
+
     def __init__(self, wrapper=None, *ctx_args, **kwargs):
         self.items = []
         self.ctx_name = kwargs.get('name', None)
@@ -210,14 +245,45 @@ class BaseContext(object):
 
         if wrapper is None:
             wrapper = self.__class__.get_default_wrapper()
+            self.default_wrapper = wrapper
 
         self.wrapper = wrapper
         self.ctx_args = ctx_args
 
-    @staticmethod
-    def get_default_wrapper():
+        # the finalized policy rule, cached until the context changes
+        self._finalized = None
+        self._finalized_for = None
+        # contexts whose finalized policy rules include this one's
+        self._dependents = []
+        # items applying `node_operators`
+        self._node_items = []
+        for ctx_arg in ctx_args:
+            self._track(ctx_arg)
+
+    @classmethod
+    def get_default_wrapper(cls):
+        policies = operators_for(cls.monad).policies
         return lambda policy_rules: policies(*policy_rules)
 
+    @property
+    def operators(self):
+        return operators_for(self.monad)
+
+    @classmethod
+    def for_monad(cls, m):
+        """
+        Returns this context class, or a subclass of it, that builds
+        policy rules for the monad `m`
+        """
+        if m is cls.monad:
+            return cls
+        key = (cls, m)
+        variant = BaseContext.monad_variants.get(key)
+        if variant is None:
+            variant = type(cls.__name__, (cls,), {'monad': m})
+            BaseContext.monad_variants[key] = variant
+        return variant
+
     @staticmethod
     def is_policy_rule(value):
         return isinstance(value, PolicyRule)
@@ -230,6 +296,36 @@ class BaseContext(object):
     def value(self):
         return ContextualValue(self)
 
+    @property
+    def runs_in_turn(self):
+        """
+        Whether the context just runs its items in turn, as contexts made
+        without a wrapper or ctx_args do
+        """
+        return self.wrapper is self.default_wrapper and not self.ctx_args
+
+    def mark_leaf_check(self, kind, values=None):
+        """
+        Marks the context as the leaf check `kind` (e.g. "require") of the
+        node at its scope, for as long as nothing else is appended to it.
+        See `calcifer.columnar`.
+        """
+        self.leaf_check = (kind, values)
+        self._leaf_check_items = list(self.items)
+
+    def get_leaf_check(self):
+        """
+        Returns the (kind, values) leaf check the context still is, if any
+        """
+        if self.leaf_check is None:
+            return None
+        items = self._leaf_check_items
+        if len(items) != len(self.items) or any(
+                item is not marked for item, marked in zip(self.items, items)
+        ):
+            return None
+        return self.leaf_check
+
     def append(self, item, *args):
         """
         Append a policy operation to the Context.
@@ -240,23 +336,78 @@ class BaseContext(object):
         """
         if not args:
             self.items.append(item)
+            self._track(item)
         else:
-            self.items.append(
-                wrap_ctx_values(
-                    lambda args: ctx_apply(item, args),
-                    args
-                )
+            applied = wrap_ctx_values(
+                lambda args: ctx_apply(item, args, self.operators),
+                args
             )
+            self.items.append(applied)
+            operators = self.operators
+            if any(
+                    item is getattr(operators, name)
+                    for name in self.node_operators
+            ):
+                self._node_items.append(applied)
+        self.invalidate()
         return self
 
+    def pop(self):
+        """
+        Removes and returns the last item appended to the Context
+        """
+        item = self.items.pop()
+        if isinstance(item, BaseContext) and self in item._dependents:
+            item._dependents.remove(self)
+        self._node_items = [
+            node_item for node_item in self._node_items
+            if node_item is not item
+        ]
+        self.invalidate()
+        return item
+
+    def _track(self, item):
+        """
+        Have `item`, if it is a Context, invalidate this one when it changes
+        """
+        if isinstance(item, BaseContext):
+            item._dependents.append(self)
+
+    def invalidate(self):
+        """
+        Discards the cached finalized policy rule of this Context and of
+        the Contexts that include it
+        """
+        self._finalized = None
+
+        # a context is only finalized with everything it includes, so
+        # the walk stops at contexts that are already invalid
+        dependents = list(self._dependents)
+        while dependents:
+            ctx = dependents.pop()
+            if ctx._finalized is not None:
+                ctx._finalized = None
+                dependents.extend(ctx._dependents)
+
     def finalize(self):
         """
         Performs all syntactic manipulations to subcontexts and contained
         policy rules and returns a single policy rule aggregate.
+
+        The result is cached until the Context, or one within it, changes.
         """
+        finalized_for = (optimize.is_enabled(), asts.is_enabled())
+        if (
+                self._finalized is not None and
+                self._finalized_for == finalized_for
+        ):
+            return self._finalized
+
         finalized_items, finalized_error_handler = self.get_finalized_items()
         wrapped = self.wrap(finalized_items, finalized_error_handler)
 
+        self._finalized = wrapped
+        self._finalized_for = finalized_for
         return wrapped
 
     def get_finalized_items(self):
@@ -305,16 +456,42 @@ class BaseContext(object):
             )
         return item
 
+    def observes_context(self):
+        """
+        Whether this context, or any within it, reads the context stack.
+        Policy rules other than applications of `node_operators` (those of
+        included policies, e.g.) cannot be looked into, and might.
+        """
+        if self.traces_context:
+            return True
+        for item in self.items:
+            if hasattr(item, 'observes_context'):
+                if item.observes_context():
+                    return True
+            elif not any(item is node_item for node_item in self._node_items):
+                return True
+        return False
+
     def wrap(self, items, error_handler):
+        operators = self.operators
+
+        # nobody will see a frame that has no error handler and is popped
+        # before anything within traces the context stack
+        push_frame = bool(self.ctx_name) and (
+            bool(error_handler) or
+            not optimize.is_enabled() or
+            self.observes_context()
+        )
+
         def make_action(ctx_wrapper, ctx_name, num_ctx_args):
             @functools.wraps(ctx_wrapper)
             def action(items):
                 error_handler = items[0]
                 ctx_args = items[1:num_ctx_args + 1]
                 items = items[num_ctx_args + 1:]
-                wrapped = ctx_apply(ctx_wrapper(items), ctx_args)
+                wrapped = ctx_apply(ctx_wrapper(items), ctx_args, operators)
 
-                if ctx_name:
+                if push_frame:
                     if error_handler:
                         ctx_frame = ContextFrame(
                             ctx_name, wrapped.ast, error_handler
@@ -324,7 +501,7 @@ class BaseContext(object):
                             ctx_name, wrapped.ast
                         )
 
-                    wrapped = wrap_context(ctx_frame, wrapped)
+                    wrapped = operators.wrap_context(ctx_frame, wrapped)
                 return wrapped
             return action
 
@@ -374,6 +551,8 @@ class BaseContext(object):
         return sub
 
     def attempt_catch(self):
+        catch_attempt = self.operators.catch_attempt
+
         def attempt_wrapper(policy_rules):
             return catch_attempt(policy_rules[0], *policy_rules[1:])
 
@@ -383,24 +562,31 @@ class BaseContext(object):
         return attempt_ctx, catch
 
     def trace(self, value=None):
+        unit = self.operators.unit
+        trace = self.operators.trace
+
         def trace_for_policy_rules(policy_rules):
             def trace_for_true_value(true_value):
                 return unit(true_value) >> trace(*policy_rules)
             return trace_for_true_value
 
-        return self.subctx(trace_for_policy_rules, value)
+        trace_ctx = self.subctx(trace_for_policy_rules, value)
+        trace_ctx.traces_context = True
+        return trace_ctx
 
     def or_catch(self):
         """
         Rebuild items so that the last thing was actually done in an
         attempt/catch context
         """
-        last = self.items.pop()
+        last = self.pop()
         attempt_ctx, catch_ctx = self.attempt_catch()
         attempt_ctx.append(last)
         return catch_ctx
 
     def apply(self, func, *args):
+        collect = self.operators.collect
+
         def apply_for_policy_rules(policy_rules):
             @functools.wraps(func)
             def apply_for_true_args(*true_args):
@@ -419,42 +605,56 @@ class BaseContext(object):
         )
         return apply_ctx
 
-    def memoized_apply(self, func, *args):
-        class MemoKey(object):
-            def __init__(self, *true_args):
-                self.true_args = true_args
-
-            def __lt__(self, other):
-                return self.true_args < other.true_args
-
-            def __hash__(self):
-                return make_hash(self.true_args)
-
-            def __eq__(self, other):
-                return self.true_args == other.true_args
+    def memoized_apply(self, func, *args, **kwargs):
+        """
+        Like `apply`, but remembers the results of `func` by its args
 
-            def __repr__(self):
-                return "<MemoKey {}>".format(
-                    get_call_repr(*self.true_args)
-                )
+        :kwarg memo: Optional, the cache to keep results in (see
+            `calcifer.caching`). By default, each function gets a cache of
+            its own, `func.memo`, made by `caching.make_memo()`. Results
+            in a `shared` cache are keyed by the function's module and
+            qualified name, the same in every process.
+        """
+        memo = kwargs.get('memo')
+        if memo is None:
+            memo = getattr(func, 'memo', None)
+        if memo is None:
+            memo = caching.make_memo()
+            try:
+                func.memo = memo
+            except AttributeError:  # e.g. builtins
+                pass
+
+        # functions sharing a memo must not share keys: in-process, two
+        # lambdas (or closures) of one scope share their names
+        if getattr(memo, 'shared', False):
+            func_key = (
+                getattr(func, '__module__', None),
+                getattr(func, '__qualname__', getattr(func, '__name__', None)),
+            )
+        else:
+            func_key = func
 
         @functools.wraps(func)
         def memoized_func(*true_args):
-            if not hasattr(func, 'memo'):
-                func.memo = {}
-            key = MemoKey(*true_args)
-            if key in func.memo:
-                logger.debug("Found memo key: %r", key)
-                return func.memo[key]
-            result = func(*true_args)
-            logger.debug("Adding memo key: %r", key)
-            logger.debug("Existing memo keys: %r", func.memo.keys())
-            func.memo[key] = result
+            key = (func_key, caching.freeze(true_args))
+            try:
+                result = memo.get(key, MISSING)
+            except TypeError:  # unhashable args
+                return func(*true_args)
+
+            if result is MISSING:
+                result = func(*true_args)
+                logger.debug("Adding memo key: %r", key)
+                memo.set(key, result)
             return result
 
         return self.apply(memoized_func, *args)
 
     def check(self, func, *func_args):
+        collect = self.operators.collect
+        policies = self.operators.policies
+
         def make_check_wrapper(func):
             def check_wrapper(policy_rules):
                 @functools.wraps(func)
@@ -475,6 +675,8 @@ class BaseContext(object):
         return subctx
 
     def scope_item_subctx(self, parent, child, name=None):
+        regarding = self.operators.regarding
+
         def scope_item_subctx_for_policy_rules(policy_rules):
             def scope_item_subctx_for_true_relations(true_parent, true_child):
                 return regarding(
@@ -488,6 +690,8 @@ class BaseContext(object):
         return subctx
 
     def scope_subctx(self, scope, name=None):
+        regarding = self.operators.regarding
+
         def scope_subctx_for_policy_rules(policy_rules):
             def scope_subctx_for_true_scope(true_scope):
                 return regarding(true_scope, *policy_rules)
@@ -498,10 +702,12 @@ class BaseContext(object):
         return subctx
 
     def select(self, scope):
-        return self.scope_subctx(scope, 'select("{}")'.format(scope))
+        subctx = self.scope_subctx(scope, 'select("{}")'.format(scope))
+        subctx.selected_scope = scope
+        return subctx
 
     def fail(self):
-        self.append(fail())
+        self.append(self.operators.fail())
         return self
 
     def __repr__(self):
@@ -523,6 +729,21 @@ class ContextFrame(object):
         # you get a new object but you're not copying that AST
         return ContextFrame(self.name, self.policy_ast, self.error_handler)
 
+    def __getstate__(self):
+        # error handlers are policy rules (closures) and only mean anything
+        # while the policy runs; the AST travels as its repr.
+        policy_ast = self.policy_ast
+        if policy_ast is not None:
+            policy_ast = asts.Rendered(repr(policy_ast))
+        return {
+            'name': self.name,
+            'policy_ast': policy_ast,
+            'error_handler': None,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
 
 # from http://stackoverflow.com/questions/5884066/hashing-a-python-dictionary
 def make_hash(o):
@@ -536,8 +757,5 @@ def make_hash(o):
     elif not isinstance(o, dict):
         return hash(o)
 
-    new_o = copy.deepcopy(o)
-    for k, v in new_o.items():
-        new_o[k] = make_hash(v)
-
-    return hash(tuple(frozenset(sorted(new_o.items()))))
+    hashed_items = [(k, make_hash(v)) for k, v in o.items()]
+    return hash(tuple(frozenset(sorted(hashed_items))))
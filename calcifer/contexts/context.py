@@ -1,11 +1,7 @@
 import logging
 
-from calcifer.operators import (
-    set_value, permit_values, require_value, append_value,
-    forbid_value, children, each, collect, unless_errors,
-)
 from calcifer.contexts.policies import (
-    add_error
+    make_add_error
 )
 from calcifer.contexts.base import BaseContext
 
@@ -31,6 +27,8 @@ class Context(BaseContext):
         if not self.error_handler:
             error_handler_ctx = self.__class__(name="error_handler")
             self.error_handler = error_handler_ctx
+            self._track(error_handler_ctx)
+            self.invalidate()
         return self.error_handler
 
     def require(self, *args):
@@ -54,7 +52,9 @@ class Context(BaseContext):
             "Value is required."
         )
 
-        subctx.append(require_value, value).or_error()
+        subctx.append(self.operators.require_value, value).or_error()
+        if not args:
+            subctx.mark_leaf_check("require")
         return subctx
 
     def forbid(self, *args):
@@ -66,14 +66,16 @@ class Context(BaseContext):
         else:
             value = self.value
         subctx = self.named_subctx("forbid")
-        subctx.append(forbid_value, value).or_error()
+        subctx.append(self.operators.forbid_value, value).or_error()
+        if not args:
+            subctx.mark_leaf_check("forbid")
         return subctx
 
     def set_value(self, value):
         """
         Sets the value for the current node
         """
-        self.append(set_value, value)
+        self.append(self.operators.set_value, value)
         return self
 
     def append_value(self, value):
@@ -81,7 +83,7 @@ class Context(BaseContext):
         Appends value to the current node, assuming the node
         to be a list if not defined
         """
-        self.append(append_value, value)
+        self.append(self.operators.append_value, value)
         return self
 
     def whitelist_values(self, values):
@@ -90,12 +92,13 @@ class Context(BaseContext):
         does not match
         """
         subctx = self.named_subctx("whitelist_values")
-        subctx.append(permit_values, values).or_error()
+        subctx.append(self.operators.permit_values, values).or_error()
 
         error_ctx = subctx.error_ctx()
         error_ctx.select("code").set_value("INVALID_VALUE_SELECTION")
         error_ctx.select("values").set_value(values)
 
+        subctx.mark_leaf_check("whitelist", values)
         return subctx
 
     def fail_early(self):
@@ -103,6 +106,7 @@ class Context(BaseContext):
         Returns a new context that checks node "/errors" and short-circuits
         if any errors exist.
         """
+        unless_errors = self.operators.unless_errors
         return self.subctx(
             lambda policy_rules: unless_errors(*policy_rules)
         )
@@ -117,7 +121,7 @@ class Context(BaseContext):
         """
         Create a blank error
         """
-        self.append(add_error, {})
+        self.append(make_add_error(self.monad), {})
 
     @property
     def last_error(self):
@@ -141,59 +145,19 @@ class Context(BaseContext):
 
         context
             The contextual traceback
-        """
-
-        catch_ctx = self.or_catch()
 
-        subctx = catch_ctx.subctx()
-        subctx.add_error()
-        # prepare error
-
-        # include provided value in error
-        provided_value_ctx = subctx.apply(
-            lambda true_trace_obj: true_trace_obj['value'],
-            catch_ctx.value
-        )
-        provided_value_ctx.last_error.select("value").set_value(provided_value_ctx.value)
-
-        # include scope
-        scope_ctx = subctx.apply(
-            lambda true_trace_obj: true_trace_obj['scope'],
-            catch_ctx.value
-        )
-        scope_ctx.last_error.select("scope").set_value(scope_ctx.value)
-
-        # include context frameset itself
-        ctxes_ctx = subctx.apply(
-            lambda true_trace_obj: true_trace_obj['context'],
-            catch_ctx.value
-        )
-        ctxes_ctx.last_error.select("context").set_value(ctxes_ctx.value)
-
-        # for each frame in the context, allow the ctx frame to specify
-        # an error handler policy rule that will be:
-
-        # for each ctx frame,
-        ctx_list_ctx = subctx.last_error.select("context")
-
-        def for_ctx_list(ctx_list):
-            return ctx_list
-        ctx_list_ctx.apply(for_ctx_list, ctx_list_ctx.value)
-
-        frame_ctx = ctx_list_ctx.last_error.select("context").each()
-        frame_ctx.select("context").apply
-        ctx_frame = frame_ctx.value
-
-        # checking for error_handler,
-        error_handler_ctx = frame_ctx.check(
-            lambda true_frame: true_frame.error_handler,
-            ctx_frame
-        )
+        Each frame in the context that has an error handler (see
+        `error_ctx`) then runs it on the error.
+        """
+        or_error = self.operators.or_error
 
-        # append the error handler as a policy rule
-        error_handler_ctx.last_error.append(
-            error_handler_ctx.value
+        last = self.pop()
+        error_ctx = self.subctx(
+            lambda policy_rules: or_error(*policy_rules)
         )
+        # errors record the context stack
+        error_ctx.traces_context = True
+        error_ctx.append(last)
 
         return self
 
@@ -202,6 +166,8 @@ class Context(BaseContext):
         Return the context with the list of scopes that are direct children
         of the current node
         """
+        children = self.operators.children
+        collect = self.operators.collect
         children_ctx = self.subctx(
             lambda policy_rules: (
                 children() >> collect(*policy_rules)
@@ -216,7 +182,12 @@ class Context(BaseContext):
 
         :kwarg ref: An injectable reference object that has matching children
             nodes (same structure dict or list)
+        :kwarg parallel: Run the policy for each child on its own and combine
+            the results, for children independent of one another (see
+            `calcifer.operators.each`)
         """
+        each = self.operators.each
+
         def with_policy_rules(policy_rules):
             def with_true_children(true_children):
                 return each(
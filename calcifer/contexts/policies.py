@@ -1,7 +1,18 @@
-from calcifer.operators import (
-    regarding, append_value,
-)
+from pymonad import List
 
+from calcifer.monads import memoize_for_monad
+from calcifer.operators import operators_for
 
-def add_error(error):
-    return regarding("/errors", append_value(error))
+
+@memoize_for_monad
+def make_add_error(m):
+    operators = operators_for(m)
+
+    def add_error(error):
+        return operators.regarding(
+            "/errors", operators.append_value(error)
+        )
+    return add_error
+
+
+add_error = make_add_error(List)
@@ -0,0 +1,132 @@
+"""
+`calcifer.dedup` module
+
+Different paths through a non-deterministic policy often arrive at the
+same result, e.g. two `permit_values` alternatives that both match a value
+that was already set. Left alone, every later rule runs once per copy, and
+nested alternatives multiply the copies geometrically.
+
+Branch deduplication collapses results that have equal values, equal
+policy trees and equal paths, comparing trees by their structural hash
+(see `calcifer.tree`). It is off by default; when enabled, policy rules
+drop duplicates before binding their results onward.
+
+Like branch limits (see `calcifer.limits`), deduplication applies to the
+policy rules run on the thread that enabled it.
+"""
+import threading
+
+from calcifer.tree import PolicyNode
+
+_local = threading.local()
+
+
+def is_enabled():
+    """
+    Whether policy rules deduplicate branches on the current thread
+    """
+    return getattr(_local, 'enabled', False)
+
+
+def enable():
+    """
+    Have policy rules run on the current thread drop duplicate branches
+    before binding their results
+    """
+    _local.enabled = True
+
+
+def disable():
+    """
+    Stop deduplicating branches on the current thread (the default)
+    """
+    _local.enabled = False
+
+
+class DedupCounter(object):
+    """
+    Counts the branches seen by deduplication and how many were merged
+    into an equivalent branch
+    """
+    def __init__(self):
+        self.branches = 0
+        self.merged = 0
+
+    def reset(self):
+        self.branches = 0
+        self.merged = 0
+
+    def __repr__(self):
+        return "<DedupCounter branches={} merged={}>".format(
+            self.branches, self.merged
+        )
+
+
+counter = DedupCounter()
+
+
+def _same(obj, other):
+    if obj is other:
+        return True
+    if (
+            isinstance(obj, PolicyNode) and isinstance(other, PolicyNode) and
+            obj._interned and other._interned
+    ):
+        # interned nodes are canonical, and only identical if the same
+        return False
+    return type(obj) is type(other) and obj == other
+
+
+class BranchKey(object):
+    """
+    Identifies a (value, partial) result by its value, path and tree
+    """
+    __slots__ = ('value', 'path', 'root', '_hash')
+
+    def __init__(self, value, partial):
+        self.value = value
+        self.path = partial.abs_path
+        self.root = partial.root_node
+        # raises TypeError for unhashable values or definitions
+        self._hash = hash((value, self.path, self.root))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return (
+            self._hash == other._hash and
+            self.path == other.path and
+            _same(self.root, other.root) and
+            _same(self.value, other.value)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def unique_branches(results, ignore_values=False, counter=counter):
+    """
+    Lazily yields the (value, partial) results that are not equivalent to
+    an earlier one. Results that cannot be hashed are always kept.
+
+    :param ignore_values: compare partials only, for callers that discard
+        the values of the results
+    """
+    seen = set()
+    for result in results:
+        counter.branches += 1
+        value, partial = result
+        if ignore_values:
+            value = None
+        try:
+            key = BranchKey(value, partial)
+        except TypeError:
+            yield result
+            continue
+
+        if key in seen:
+            counter.merged += 1
+            continue
+        seen.add(key)
+        yield result
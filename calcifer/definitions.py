@@ -1,9 +1,22 @@
 from abc import ABCMeta, abstractmethod
 
+from calcifer.interning import InternTable, is_scalar, same_scalar
+
+definitions_table = InternTable()
+
 
 class Definition:
     __metaclass__ = ABCMeta
 
+    _interned = False
+
+    def interned(self):
+        """
+        Returns the canonical instance of this definition, or the
+        definition itself if it cannot be interned
+        """
+        return self
+
     @abstractmethod
     def get_template(self):
         pass
@@ -35,19 +48,64 @@ class Value(Definition):
             "Value(value={})"
         ).format(self.value)
 
+    def interned(self):
+        if self._interned or not is_scalar(self._value):
+            return self
+        canonical = definitions_table.intern(
+            self, hash(self), Value._same
+        )
+        canonical._interned = True
+        return canonical
+
+    @staticmethod
+    def _same(definition, other):
+        return (
+            type(definition) is type(other) and
+            same_scalar(definition.value, other.value)
+        )
+
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             isinstance(other, Value) and other.value == self.value
         )
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((Value, self._value))
+
+
+class FrozenParams(dict):
+    """
+    The params of a Field, which cannot change once the field is made
+    (fields are hashed by them, e.g. when interned)
+    """
+    def __init__(self, *args, **kwargs):
+        if getattr(self, '_made', False):
+            self._immutable()
+        super(FrozenParams, self).__init__(*args, **kwargs)
+        self._made = True
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Field params are immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenParams, (dict(self),))
+
 
 class Field(Definition):
     def __init__(self, field_type=None, **params):
-        self._params = params
         if field_type:
-            self._params['type'] = field_type
+            params['type'] = field_type
         if 'required' not in params:
-            self._params['required'] = False
+            params['required'] = False
+        self._params = FrozenParams(params)
 
     @property
     def params(self):
@@ -58,7 +116,7 @@ class Field(Definition):
         return self._params.get('value')
 
     def get_template(self):
-        return self.params
+        return dict(self.params)
 
     def match(self, value):
         if 'value' in self.params:
@@ -72,7 +130,36 @@ class Field(Definition):
         args = ['{}={}'.format(k, v) for k, v in self.params.items()]
         return "Field({})".format(", ".join(args))
 
+    def interned(self):
+        if self._interned:
+            return self
+        if not all(is_scalar(value) for value in self._params.values()):
+            return self
+        canonical = definitions_table.intern(
+            self, hash(self), Field._same
+        )
+        canonical._interned = True
+        return canonical
+
+    @staticmethod
+    def _same(definition, other):
+        if type(definition) is not type(other):
+            return False
+        params, other_params = definition.params, other.params
+        return len(params) == len(other_params) and all(
+            key in other_params and same_scalar(value, other_params[key])
+            for key, value in params.items()
+        )
+
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             isinstance(other, Field) and other.params == self.params
         )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((Field, frozenset(self._params.items())))
@@ -0,0 +1,75 @@
+"""
+`calcifer.executor` module
+
+Policy runs are pure CPU work, so this module provides a way to spread a
+batch of request objects across a pool of processes.
+
+Policy rules themselves are closures and do not survive pickling. Instead,
+each worker receives the policy (pickled by the location of its method,
+see `calcifer.policy`) and compiles it locally, once per chunk of request
+objects. Only the request objects and the resolved results cross process
+boundaries.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+
+def run_chunk(policy, objs):
+    """
+    Worker entry point: run `policy` for a chunk of request objects
+    """
+    return list(policy.run_many(objs))
+
+
+def chunked(objs, chunksize):
+    objs = iter(objs)
+    while True:
+        chunk = list(islice(objs, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PolicyExecutor(object):
+    """
+    Runs policies over batches of request objects in a process pool.
+
+    :param workers: number of worker processes (defaults to the number of
+        processors on the machine)
+    :param chunksize: number of request objects sent to a worker at a time.
+        Each chunk pays for one compile of the policy on the worker side.
+
+    Usage::
+
+        with PolicyExecutor(workers=8) as executor:
+            for results in executor.run(policy, objs):
+                ...
+    """
+    default_chunksize = 32
+
+    def __init__(self, workers=None, chunksize=None):
+        if chunksize is None:
+            chunksize = self.__class__.default_chunksize
+        self.chunksize = chunksize
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    def run(self, policy, objs):
+        """
+        Yields the list of results for each request object, in order
+        """
+        chunk_results = self.pool.map(
+            run_chunk, repeat(policy), chunked(objs, self.chunksize)
+        )
+        for results in chunk_results:
+            for result in results:
+                yield result
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        return False
@@ -0,0 +1,368 @@
+"""
+`calcifer.incremental` module
+
+Incremental re-validation of request objects that change a little at a
+time, e.g. a form re-submitted after each field edit.
+
+An `IncrementalPolicy` runs the top-level items of a policy (each
+`select`, subcontext and included policy of its method) one at a time,
+and remembers for each what it read and what it wrote:
+
+- the paths it peeked at or selected, as recorded by a `ReadLog` for the
+  operators built on them (`select`, `regarding`, `each`, `match`, ...),
+  with the nodes the item's input had there;
+- the changes it made to the tree, for each branch it produced.
+
+When an item later runs on a partial with the same nodes at every path
+it read, the recorded changes are applied instead of running its rules.
+Items that read a changed field run again, as do the items after them
+that read what those changed. Errors are appended without reading the
+errors before them, so an error coming or going does not make the items
+after it run again. The request object is compared rather than diffed:
+callers pass the whole object each time.
+
+Policies that bind the request object, or whose method context does not
+just run its items in turn (`endpoint_policy`, e.g.), are not run
+incrementally; `IncrementalPolicy.run` falls back to `BasePolicy.run` for
+them.
+"""
+import logging
+
+from calcifer.monads import (
+    policy_rule_funcM as policy_rule_func, from_iterable, policyM,
+    run_rule_func,
+)
+from calcifer.partial import Partial, ReadLog
+from calcifer.tree import (
+    DictPolicyNode, LeafPolicyNode, ListPolicyNode, UnknownPolicyNode,
+    UNKNOWN, changed_steps, node_at,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def list_length(node):
+    if isinstance(node, ListPolicyNode):
+        return len(node.nodes)
+    return 0
+
+
+def node_shape(node, appended=False):
+    """
+    What selecting through `node` depends on: its kind, and for lists,
+    their length (selecting past the end fills in the list). For a list
+    only appended to, whether there is one, or nothing yet.
+    """
+    if appended and isinstance(node, (ListPolicyNode, UnknownPolicyNode)):
+        return (ListPolicyNode, None)
+    if isinstance(node, ListPolicyNode):
+        return (ListPolicyNode, len(node.nodes))
+    return (type(node), None)
+
+
+def observe(root, path, selected, appended=()):
+    """
+    What an item reading `path` of the tree `root` sees: the node there,
+    and if it selects the path, the shape of the nodes along the way
+    """
+    if not selected:
+        return node_at(root, path)
+
+    shapes = []
+    node = root
+    for depth, step in enumerate(path):
+        shapes.append(node_shape(node, path[:depth] in appended))
+        if isinstance(node, (DictPolicyNode, ListPolicyNode)):
+            node = node[step]
+        else:
+            node = UNKNOWN
+    return tuple(shapes), node
+
+
+class Relocated(object):
+    """
+    A path past the end of the list at `base`, `offset` steps past its
+    length and then down `rest`
+    """
+    def __init__(self, base, offset, rest):
+        self.base = base
+        self.offset = offset
+        self.rest = rest
+
+    def resolve(self, lengths):
+        return self.base + (lengths[self.base] + self.offset,) + self.rest
+
+    def __repr__(self):
+        return "Relocated({!r}, {!r}, {!r})".format(
+            self.base, self.offset, self.rest
+        )
+
+
+def relocate(path, lengths):
+    """
+    `path`, made relative to the length of the appended list it goes past
+    the end of, if any. `lengths` maps the paths of the lists to their
+    lengths.
+    """
+    for base, length in lengths.items():
+        depth = len(base)
+        if len(path) > depth and path[:depth] == base:
+            return Relocated(base, path[depth] - length, path[depth + 1:])
+    return path
+
+
+def resolve(path, lengths):
+    if isinstance(path, Relocated):
+        return path.resolve(lengths)
+    return path
+
+
+def reads_list(path, base, length):
+    """
+    Whether reading or writing `path` depends on more of the list at
+    `base` than its length
+    """
+    depth = len(base)
+    if path[:depth] != base[:len(path)]:
+        return False
+    if len(path) <= depth:
+        return True
+    step = path[depth]
+    return not isinstance(step, int) or step < length
+
+
+def child_or_none(node, step):
+    if isinstance(node, DictPolicyNode):
+        return node.nodes.get(step)
+    if isinstance(node, ListPolicyNode) and step < len(node.nodes):
+        return node.nodes[step]
+    return None
+
+
+def tree_writes(before, after, path=(), writes=None):
+    """
+    Returns the list of (path, node) changes that make the tree `before`
+    into `after`, going down as far as the two differ (by identity).
+    `before` is None where there was no node at all.
+    """
+    if writes is None:
+        writes = []
+    if after is before:
+        return writes
+
+    steps = None
+    if isinstance(after, LeafPolicyNode) and after == before:
+        # e.g. a context frame, popped and pushed again
+        return writes
+    if isinstance(after, (DictPolicyNode, ListPolicyNode)):
+        if before is None or isinstance(before, UnknownPolicyNode):
+            # filled in by selecting a scope below it
+            steps = after.keys
+            before = None
+            if not steps:
+                steps = None
+        elif not (
+                isinstance(after, ListPolicyNode) and
+                isinstance(before, ListPolicyNode) and
+                len(after.nodes) < len(before.nodes)
+        ):
+            # None for a different kind of node, written whole
+            steps = changed_steps(before, after)
+
+    if steps is None:
+        writes.append((path, after))
+        return writes
+
+    for step in steps:
+        tree_writes(
+            child_or_none(before, step), after[step], path + (step,), writes
+        )
+    return writes
+
+
+def apply_writes(partial, writes):
+    """
+    Returns `partial` with the recorded changes `writes` made to its tree
+    """
+    zipper = partial.zipper
+    for path, node in writes:
+        zipper = zipper.move_to(path).set_node(node)
+    return Partial.from_zipper(zipper.move_to(partial.abs_path))
+
+
+class ItemRun(object):
+    """
+    A recorded run of a top-level item: the paths it read, what it saw
+    there, and the changes it made for each of its branches.
+
+    An item that appends to a list without reading any more of it (see
+    `Partial.append_index`) applies to partials with lists of any length
+    there; its reads and writes past the end of the list are kept
+    relative to its length.
+    """
+    def __init__(self, reads, seen, branch_writes, appended):
+        self.reads = reads
+        self.seen = seen
+        self.branch_writes = branch_writes
+        self.appended = appended
+
+    @classmethod
+    def record(cls, read_log, partial, finals):
+        root = partial.root_node
+        reads = [(path, False) for path in read_log.peeked]
+        reads += [(path, True) for path in read_log.selected]
+        branch_writes = [
+            tree_writes(root, final.root_node) for final in finals
+        ]
+
+        lengths = {}
+        for base in read_log.appended:
+            length = list_length(node_at(root, base))
+            if not any(
+                    reads_list(path, base, length) for path, _ in reads
+            ) and not any(
+                    reads_list(path, base, length)
+                    for writes in branch_writes for path, _ in writes
+            ):
+                lengths[base] = length
+
+        seen = [
+            observe(root, path, selected, lengths)
+            for path, selected in reads
+        ]
+        reads = [
+            (relocate(path, lengths), selected) for path, selected in reads
+        ]
+        branch_writes = [
+            [(relocate(path, lengths), node) for path, node in writes]
+            for writes in branch_writes
+        ]
+        return cls(reads, seen, branch_writes, tuple(lengths))
+
+    def lengths_in(self, partial):
+        """
+        The lengths of the lists the item appends to, in `partial`
+        """
+        root = partial.root_node
+        return {
+            base: list_length(node_at(root, base)) for base in self.appended
+        }
+
+    def applies_to(self, partial, lengths):
+        """
+        Whether the item sees the same nodes in `partial` as it did
+        """
+        root = partial.root_node
+        for (path, selected), seen in zip(self.reads, self.seen):
+            observed = observe(
+                root, resolve(path, lengths), selected, lengths
+            )
+            if observed is not seen and observed != seen:
+                return False
+        return True
+
+    def replay(self, partial, lengths):
+        return [
+            apply_writes(partial, [
+                (resolve(path, lengths), node) for path, node in writes
+            ])
+            for writes in self.branch_writes
+        ]
+
+
+class IncrementalPolicy(object):
+    """
+    Runs a policy incrementally, reusing the recorded runs of its
+    top-level items across calls to `run` (see module docs)
+
+    :param max_runs: the number of recorded runs kept for each item, e.g.
+        one for each branch it runs on
+    """
+    def __init__(self, policy, max_runs=16):
+        self.policy = policy
+        self.max_runs = max_runs
+        self.item_runs = {}
+        # items run / items reused, over all runs
+        self.ran = 0
+        self.reused = 0
+        self.policy_rule = self._compile()
+
+    def _compile(self):
+        ctx = None
+        if not self.policy.uses_ref:
+            ctx = self.policy.get_context()
+        if ctx is None or not ctx.runs_in_turn:
+            logger.debug("not running %r incrementally", self.policy)
+            return None
+        ctx.wrapper = self.items_in_turn(ctx.monad)
+        return ctx.finalize()
+
+    def items_in_turn(self, m):
+        """
+        The context wrapper running the policy's items in turn, like
+        `policies` does, through `run_item`
+        """
+        prune = policyM(m).prune
+        run_item = self.run_item
+
+        @policy_rule_func(m)
+        def incremental_policies(*rule_funcs):
+            def for_initial_partial(initial_partial):
+                initial_path = initial_partial.abs_path
+                partials = [initial_partial]
+                for idx, rule_func in enumerate(rule_funcs):
+                    next_partials = []
+                    for partial in partials:
+                        _, scoped_partial = partial.select_path(
+                            initial_path, set_path=True
+                        )
+                        next_partials += run_item(
+                            idx, rule_func, scoped_partial
+                        )
+                    m_results = prune(from_iterable(m, [
+                        (None, partial) for partial in next_partials
+                    ]), ignore_values=True)
+                    partials = [partial for _, partial in m_results]
+                return from_iterable(m, [
+                    (None, partial) for partial in partials
+                ])
+            return for_initial_partial
+
+        return lambda policy_rules: incremental_policies(*policy_rules)
+
+    def run_item(self, idx, rule_func, partial):
+        """
+        Returns the final partials of the top-level item `idx` run on
+        `partial`, replaying a recorded run if one applies
+        """
+        item_runs = self.item_runs.setdefault(idx, [])
+        for run_idx, item_run in enumerate(item_runs):
+            lengths = item_run.lengths_in(partial)
+            if item_run.applies_to(partial, lengths):
+                self.reused += 1
+                if run_idx:
+                    item_runs.insert(0, item_runs.pop(run_idx))
+                return item_run.replay(partial, lengths)
+
+        self.ran += 1
+        with ReadLog() as read_log:
+            finals = [
+                final for _, final in run_rule_func(rule_func, None, partial)
+            ]
+        item_runs.insert(0, ItemRun.record(read_log, partial, finals))
+        del item_runs[self.max_runs:]
+        return finals
+
+    def run(self, obj):
+        """
+        Run the policy against a request object, returning the list of
+        resolved results, the same as `BasePolicy.run` would
+        """
+        if self.policy_rule is None:
+            return self.policy.run(obj)
+        return self.policy.run_plan(self.policy_rule, obj)
+
+    def __repr__(self):
+        return "<IncrementalPolicy {!r} ran={} reused={}>".format(
+            self.policy, self.ran, self.reused
+        )
@@ -0,0 +1,83 @@
+"""
+`calcifer.interning` module
+
+Hash-consing for immutable values: an `InternTable` hands back a single
+canonical instance for every group of equivalent values, so that the
+many near-identical policy trees kept alive by the non-deterministic
+search share their nodes and definitions instead of duplicating them.
+
+The table only holds weak references, so canonical instances disappear
+once nothing else refers to them.
+"""
+import weakref
+
+import six
+
+# types whose values may be interned; `type(value) in SCALAR_TYPES` is
+# checked exactly, so that e.g. True and 1 never share an instance
+SCALAR_TYPES = frozenset(
+    six.string_types + six.integer_types +
+    (six.text_type, six.binary_type, bool, float, type(None))
+)
+
+
+def is_scalar(value):
+    return type(value) in SCALAR_TYPES
+
+
+def same_scalar(value, other):
+    return type(value) is type(other) and value == other
+
+
+class InternTable(object):
+    """
+    A weak-valued hash-cons table. Entries are bucketed by a hash and
+    told apart by a `same(existing, candidate)` predicate, which may be
+    stricter than `==`.
+    """
+    def __init__(self):
+        self._buckets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, obj, obj_hash, same):
+        """
+        Returns the canonical instance equivalent to `obj`, registering
+        `obj` as canonical if there is none yet
+        """
+        bucket = self._buckets.get(obj_hash)
+        if bucket is None:
+            bucket = self._buckets[obj_hash] = []
+        else:
+            for ref in bucket:
+                existing = ref()
+                if existing is not None and same(existing, obj):
+                    self.hits += 1
+                    return existing
+
+        self.misses += 1
+        bucket.append(weakref.ref(obj, self._make_remover(obj_hash)))
+        return obj
+
+    def _make_remover(self, obj_hash):
+        buckets = self._buckets
+
+        def remove(ref):
+            bucket = buckets.get(obj_hash)
+            if bucket is None:
+                return
+            try:
+                bucket.remove(ref)
+            except ValueError:
+                pass
+            if not bucket:
+                del buckets[obj_hash]
+        return remove
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def __repr__(self):
+        return "<InternTable {} hits={} misses={}>".format(
+            len(self), self.hits, self.misses
+        )
@@ -0,0 +1,137 @@
+"""
+`calcifer.limits` module
+
+Caps the number of live branches of a non-deterministic policy run.
+
+Independent whitelists multiply the branches of a policy: a run with ten
+fields of ten permitted values each has 10**10 of them. A `BranchLimit`
+bounds the results of every bind to `max_branches`, keeping the branches
+chosen by its strategy and recording what it dropped, so that callers can
+tell a truncated run from a complete one.
+
+Limits apply to the policy rules run on the current thread, within
+`with branch_limit:` (see `BasePolicy.run`).
+"""
+from itertools import islice
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def keep_first(results, max_branches):
+    """
+    Truncation strategy keeping the first `max_branches` results
+    """
+    return results[:max_branches]
+
+
+def rank_by(key, reverse=False):
+    """
+    Returns a truncation strategy keeping the `max_branches` results
+    ranked best by `key(value, partial)` (lowest first, unless `reverse`)
+    """
+    def rank(results, max_branches):
+        ranked = sorted(
+            results, key=lambda result: key(*result), reverse=reverse
+        )
+        return ranked[:max_branches]
+    return rank
+
+
+def current():
+    """
+    Returns the innermost active BranchLimit, or None
+    """
+    limits = getattr(_local, 'limits', None)
+    if not limits:
+        return None
+    return limits[-1]
+
+
+class BranchLimit(object):
+    """
+    Bounds the results of each bind to `max_branches`.
+
+    :param strategy: called as `strategy(results, max_branches)` with the
+        list of (value, partial) results when there are too many, returns
+        those to keep. Defaults to `keep_first`.
+
+    With `keep_first`, lazy results (e.g. of the `Stream` monad) are only
+    produced up to the first branch over the limit, and the rest are never
+    run; `dropped` then counts that one branch rather than all the rest.
+    Other strategies rank all of the results, so they produce the whole
+    stream of them at every bind that goes over the limit.
+    """
+    def __init__(self, max_branches, strategy=None):
+        if max_branches < 1:
+            raise ValueError("max_branches must be at least 1")
+        self.max_branches = max_branches
+        self.strategy = strategy or keep_first
+        self.truncations = 0
+        self.dropped = 0
+
+    @property
+    def truncated(self):
+        return self.truncations > 0
+
+    def truncate(self, results):
+        """
+        Returns the results to keep: `results` itself if it is a list
+        within the limit, otherwise a list
+        """
+        max_branches = self.max_branches
+        if isinstance(results, list):
+            if len(results) <= max_branches:
+                return results
+        else:
+            iterator = iter(results)
+            results = list(islice(iterator, max_branches + 1))
+            if len(results) <= max_branches:
+                return results
+            if self.strategy is not keep_first:
+                # ranking needs all of them
+                results.extend(iterator)
+
+        kept = list(self.strategy(results, max_branches))
+        self.truncations += 1
+        self.dropped += len(results) - len(kept)
+        logger.debug(
+            "truncated %d branches to %d", len(results), len(kept)
+        )
+        return kept
+
+    def __enter__(self):
+        limits = getattr(_local, 'limits', None)
+        if limits is None:
+            limits = _local.limits = []
+        limits.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.limits.pop()
+
+    def __repr__(self):
+        return "<BranchLimit max_branches={} truncations={} dropped={}>".format(
+            self.max_branches, self.truncations, self.dropped
+        )
+
+
+class LimitedResults(list):
+    """
+    The results of a run under a BranchLimit, flagged as `truncated` if
+    the limit caused any branches to be dropped
+    """
+    def __init__(self, results, branch_limit):
+        super(LimitedResults, self).__init__(results)
+        self.branch_limit = branch_limit
+
+    @property
+    def truncated(self):
+        return self.branch_limit.truncated
+
+    @property
+    def dropped(self):
+        return self.branch_limit.dropped
@@ -24,16 +24,43 @@ any number of templates, including zero. This is realized as:
 """
 from abc import ABCMeta
 import copy
+import functools
 import inspect
+import itertools
 import logging
-from pymonad import Monad, List
+from pymonad import Monad, Monoid, List
+from six.moves import map as lazy_map, zip_longest
 
-from calcifer import asts
+from calcifer import asts, dedup, limits
 from calcifer.asts import get_call_repr  # pylint: disable=unused-import
 
 logger = logging.getLogger(__name__)
 
 
+def memoize_for_monad(make_class):
+    """
+    Decorator for per-monad factories, such as the class factories below,
+    so that each base monad `m` gets exactly one class. (Classes are
+    expensive to create, and each new class makes `isinstance` checks that
+    much slower.)
+
+    The undecorated factory remains available as `.uncached`
+    """
+    classes = {}
+
+    @functools.wraps(make_class)
+    def for_monad(m):
+        try:
+            return classes[m]
+        except KeyError:
+            cls = make_class(m)
+            classes[m] = cls
+            return cls
+    for_monad.uncached = make_class
+    return for_monad
+
+
+@memoize_for_monad
 def stateT(m):
     class StateT(Monad):
         """
@@ -62,9 +89,17 @@ def stateT(m):
                     return m_new_result
 
                 run_func = self.run
-                return run_func(state) >> for_state_result
+                return self.prune(run_func(state)) >> for_state_result
             return newState
 
+        @staticmethod
+        def prune(m_result):
+            """
+            Hook for discarding redundant results of the internal monad
+            before they are bound
+            """
+            return m_result
+
         @property
         def run(self):
             return self.value
@@ -100,23 +135,233 @@ class Identity(Monad):
         return super(Identity, self).amap(function)
 
 
+class Stream(Monad, Monoid):
+    """
+    A lazy counterpart to pymonad's List for non-deterministic computation.
+
+    A Stream draws its values from an iterator only as they are consumed,
+    and keeps the values it has produced so it may be iterated more than
+    once. StateT over Stream explores branches of a policy only as far as
+    its results are consumed: callers that need just the first result
+    never pay for the rest.
+    """
+    def __init__(self, iterable=()):  # pylint: disable=super-init-not-called
+        self._source = iter(iterable)
+        self._produced = []
+
+    @classmethod
+    def from_iterable(cls, iterable):
+        return cls(iterable)
+
+    def __iter__(self):
+        produced = self._produced
+        idx = 0
+        while True:
+            if idx == len(produced):
+                if self._source is None:
+                    return
+                try:
+                    produced.append(next(self._source))
+                except StopIteration:
+                    self._source = None
+                    return
+            yield produced[idx]
+            idx += 1
+
+    def getValue(self):
+        """
+        Returns the list of all values (exhausting the stream)
+        """
+        return list(self)
+
+    @classmethod
+    def unit(cls, value):
+        return cls((value,))
+
+    @staticmethod
+    def mzero():
+        return Stream()
+
+    def mplus(self, other):
+        return Stream(itertools.chain(self, other))
+
+    def bind(self, function):
+        return Stream(itertools.chain.from_iterable(lazy_map(function, self)))
+
+    def fmap(self, function):
+        return Stream(lazy_map(function, self))
+
+    def amap(self, functorValue):
+        return Stream(itertools.chain.from_iterable(
+            functorValue.fmap(function) for function in self
+        ))
+
+    def __eq__(self, other):
+        # compares only as far as the first difference, so comparing
+        # with mzero() produces at most one value
+        missing = object()
+        for mine, theirs in zip_longest(self, other, fillvalue=missing):
+            if mine is missing or theirs is missing or mine != theirs:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __bool__(self):
+        for _ in self:
+            return True
+        return False
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        values = ", ".join([repr(value) for value in self._produced])
+        if self._source is not None:
+            values = values + ", ..." if values else "..."
+        return "Stream([{}])".format(values)
+
+
+def from_iterable(m, values):
+    """
+    Returns the monadic (non-deterministic) value for the choice between
+    `values`
+    """
+    if hasattr(m, 'from_iterable'):
+        return m.from_iterable(values)
+    if issubclass(m, List):
+        return List(*values)
+
+    monad = m.mzero()
+    for value in values:
+        monad = monad.mplus(m.unit(value))
+    return monad
+
+
+class BindChain(object):
+    """
+    The run function of a policy rule built by binding: a `head` run
+    function followed by a sequence of bind steps, each a function of a
+    (value, state) result returning new monadic results.
+
+    Binding extends the chain in constant time, as a linked list that is
+    flattened once, when the chain is first run. Running the chain steps
+    through it in a loop instead of nesting one closure per bind, so the
+    Python stack stays flat however long the chain.
+    """
+    __slots__ = ('m', 'head', 'prune', 'previous', 'step', '_steps')
+
+    def __init__(self, m, head, prune, previous=None, step=None):
+        self.m = m
+        self.head = head
+        self.prune = prune
+        self.previous = previous
+        self.step = step
+        self._steps = () if previous is None else None
+
+    def then(self, step, ignore_values=False):
+        """
+        Returns the chain extended with `step`. With `ignore_values`, the
+        step only depends on the state of the results it is bound to.
+        """
+        return BindChain(
+            self.m, self.head, self.prune,
+            previous=self, step=(step, ignore_values)
+        )
+
+    @property
+    def steps(self):
+        if self._steps is None:
+            tail = []
+            chain = self
+            while chain._steps is None:
+                tail.append(chain.step)
+                chain = chain.previous
+            self._steps = chain._steps + tuple(reversed(tail))
+        return self._steps
+
+    def __call__(self, state):
+        if issubclass(self.m, Stream):
+            return Stream(self.iter_results(state))
+
+        prune = self.prune
+        m_results = self.head(state)
+        for step, ignore_values in self.steps:
+            m_results = prune(m_results, ignore_values) >> step
+        return m_results
+
+    def iter_results(self, state):
+        """
+        Lazily yields the results of the chain, depth first, keeping
+        the partially explored results of each step on an explicit stack
+        """
+        steps = self.steps
+        prune = self.prune
+        last = len(steps)
+
+        def explore(m_results, depth):
+            if depth < last:
+                m_results = prune(m_results, steps[depth][1])
+            return iter(m_results)
+
+        stack = [explore(self.head(state), 0)]
+        while stack:
+            depth = len(stack) - 1
+            try:
+                result = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                continue
+
+            if depth == last:
+                yield result
+            else:
+                step, _ = steps[depth]
+                stack.append(explore(step(result), depth + 1))
+
+
 class BasePolicyRule(object):
-    pass
+    # the number of policy rules built so far (see `calcifer.optimize`)
+    built = 0
+
+
+def run_rule_func(rule_func, value, state):
+    """
+    Runs the policy rule `rule_func(value)` (or the policy rule
+    `rule_func`) on `state`, like `(unit(value) >> rule_func).run(state)`
+    without building the intermediate policy rules and their ASTs
+    """
+    if isinstance(rule_func, BasePolicyRule):
+        return rule_func.run(state)
+    if isinstance(rule_func, BasePolicyRuleFunc):
+        rule_func = rule_func.rule_func
+
+    for_partial = rule_func(value)
+    if isinstance(for_partial, BasePolicyRule):
+        return for_partial.run(state)
+    return for_partial(state)
 
 
+@memoize_for_monad
 def policyM(m):
     class PolicyRule(BasePolicyRule, stateT(m)):
         def __init__(
                 self, for_partial, context=None,
                 ast=None,
         ):
-            if ast is None:
-                ast = getattr(for_partial, 'ast', None)
+            if not asts.is_enabled():
+                ast = None
+            else:
+                if ast is None:
+                    ast = getattr(for_partial, 'ast', None)
 
-            if context is not None:
-                ast = context.with_result(ast)
+                if context is not None:
+                    ast = context.with_result(ast)
 
             self.ast = ast
+            BasePolicyRule.built += 1
             super(PolicyRule, self).__init__(for_partial)
 
         def __repr__(self):
@@ -130,22 +375,48 @@ def policyM(m):
         def __deepcopy__(self, memo):
             return copy.copy(self)
 
-        def _bind_policy_rule(self, rule):
-            def for_operands(left, right):
-                def combined_for_partial(initial_partial):
-                    m_results = left.run(initial_partial)
-
-                    def for_m_result(m_result):
-                        _, partial = m_result
-                        return right.run(partial)
-                    return m_results >> for_m_result
-                return combined_for_partial
+        @staticmethod
+        def prune(m_results, ignore_values=False):
+            """
+            Drops duplicate branches, if enabled (see `calcifer.dedup`),
+            and the branches over the active limit, if any (see
+            `calcifer.limits`)
+            """
+            if not hasattr(m_results, '__iter__'):
+                return m_results
+            if isinstance(m_results, list) and len(m_results) < 2:
+                return m_results
+
+            if dedup.is_enabled():
+                m_results = from_iterable(
+                    m, dedup.unique_branches(m_results, ignore_values)
+                )
 
-            new_ast = asts.Binding(self.ast, rule.ast)
+            branch_limit = limits.current()
+            if branch_limit is not None:
+                kept = branch_limit.truncate(m_results)
+                if kept is not m_results:
+                    m_results = from_iterable(m, kept)
+            return m_results
+
+        def _extend(self, step, ignore_values, ast):
+            chain = self.value
+            if not isinstance(chain, BindChain):
+                chain = BindChain(m, chain, PolicyRule.prune)
             return PolicyRule(
-                for_operands(self, rule), ast=new_ast
+                chain.then(step, ignore_values), ast=ast
             )
 
+        def _bind_policy_rule(self, rule):
+            right_run = rule.run
+
+            def for_m_result(m_result):
+                _, partial = m_result
+                return right_run(partial)
+
+            new_ast = asts.bind(self.ast, rule.ast)
+            return self._extend(for_m_result, True, new_ast)
+
         def bind(self, rule_func):
             if isinstance(rule_func, BasePolicyRule):
                 return self._bind_policy_rule(rule_func)
@@ -153,20 +424,16 @@ def policyM(m):
             if not isinstance(rule_func, BasePolicyRuleFunc):
                 rule_func = policy_rule_funcM(m)(rule_func)
 
-            try:
-                binding = super(PolicyRule, self).bind(rule_func)
-            except:
-                logger.debug(
-                    "error binding `%r` to rule_func `%r`",
-                    self, rule_func
-                )
-                raise
+            # call through to the function, rather than build a PolicyRule
+            # (and its AST) that would be run once and thrown away
+            make_for_partial = rule_func.rule_func
 
-            new_ast = asts.Binding(self.ast, rule_func.ast)
+            def for_state_result(result):
+                value, state = result
+                return run_rule_func(make_for_partial, value, state)
 
-            return PolicyRule(
-                binding.value, ast=new_ast
-            )
+            new_ast = asts.bind(self.ast, rule_func.ast)
+            return self._extend(for_state_result, False, new_ast)
 
         def __rshift__(self, function):
             """
@@ -188,53 +455,71 @@ class BasePolicyRuleFunc:
     __metaclass__ = ABCMeta
 
 
-def policy_rule_funcM(m, rule_func_name=None):
-    def decorator(rule_func):
-        class PolicyRuleFunc(BasePolicyRuleFunc):
-            def __init__(self, rule_func, rule_func_name=None):
-                if rule_func_name is None:
-                    if hasattr(rule_func, 'ast'):
-                        rule_func_name = repr(rule_func.ast)
-                    else:
-                        rule_func_name = rule_func.__name__
-                if rule_func_name == '<lambda>':
-                    rule_func_name = (
-                        '<lambda {}:>'
-                    ).format(
-                        ", ".join(inspect.getargspec(rule_func).args)  # pylint: disable=deprecated-method
-                    )
-
-                if rule_func.__doc__:
-                    # this is janky but it works.
-                    # if someone goes through the trouble of writing a
-                    # docstring for a rule func, it should be accessible
-                    # with `help()` and nicely readable.
-                    self.__class__.__doc__ = rule_func.__doc__
-                    self.__class__.__name__ = (
-                        "<PolicyRuleFunc {}>".format(rule_func_name)
-                    )
-
-                self.ast = asts.PolicyRuleFunc(rule_func_name)
-                self.rule_func = rule_func
-                self.rule_func_name = rule_func_name
-
-            def __call__(self, *args, **kwargs):
-                for_partial = self.rule_func(*args, **kwargs)
-                if isinstance(for_partial, BasePolicyRule):
-                    for_partial = for_partial.run
+def get_rule_func_name(rule_func):
+    if hasattr(rule_func, 'ast'):
+        return repr(rule_func.ast)
+
+    rule_func_name = rule_func.__name__
+    if rule_func_name == '<lambda>':
+        rule_func_name = (
+            '<lambda {}:>'
+        ).format(
+            ", ".join(inspect.getargspec(rule_func).args)  # pylint: disable=deprecated-method
+        )
+    return rule_func_name
+
+
+@memoize_for_monad
+def policy_rule_func_classM(m):
+    PolicyRule = policyM(m)
+
+    class PolicyRuleFunc(BasePolicyRuleFunc):
+        def __init__(self, rule_func, rule_func_name=None):
+            if rule_func_name is None:
+                def rule_func_name():
+                    return get_rule_func_name(rule_func)
+
+            # the name is worked out on first use
+            self.ast = asts.PolicyRuleFunc(rule_func_name)
+            self.rule_func = rule_func
+
+        @property
+        def rule_func_name(self):
+            return self.ast.name
 
+        def __call__(self, *args, **kwargs):
+            for_partial = self.rule_func(*args, **kwargs)
+            if isinstance(for_partial, BasePolicyRule):
+                for_partial = for_partial.run
+
+            if asts.is_enabled():
                 func_call_ast = asts.PolicyRuleFuncCall(
                     self.ast, args, kwargs
                 )
-                return policyM(m)(
-                    for_partial, context=func_call_ast
-                )
+            else:
+                func_call_ast = None
+            return PolicyRule(
+                for_partial, context=func_call_ast
+            )
+
+        def __repr__(self):
+            return "<PolicyRuleFunc {}>".format(self.rule_func_name)
+
+    return PolicyRuleFunc
+
+
+def policy_rule_funcM(m, rule_func_name=None):
+    def decorator(rule_func):
+        PolicyRuleFunc = policy_rule_func_classM(m)
+        policy_rule_func = PolicyRuleFunc(rule_func, rule_func_name)
 
-            def __repr__(self):
-                return "<PolicyRuleFunc {}>".format(self.rule_func_name)
+        if rule_func.__doc__:
+            # if someone goes through the trouble of writing a
+            # docstring for a rule func, it should be accessible
+            # (e.g. with `inspect.getdoc()`), without a class per rule func
+            policy_rule_func.__doc__ = rule_func.__doc__
 
-        rule_func = PolicyRuleFunc(rule_func, rule_func_name)
-        return rule_func
+        return policy_rule_func
     return decorator
 
 
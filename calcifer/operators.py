@@ -5,13 +5,18 @@ These are provided as building blocks for specifying Premium Command Policies
 for the purposes of template generation and command validation.
 """
 import copy
+from itertools import product
 import logging
 from pymonad import List
 
-from calcifer.tree import PolicyNode
+from calcifer.definitions import Field, Value
+from calcifer.partial import ReadLog
+from calcifer.tree import ListPolicyNode, PolicyNode, changed_steps, node_at
+from calcifer import optimize
 from calcifer.monads import (
     policy_rule_funcM as policy_rule_func,
-    get_call_repr, PolicyRule
+    get_call_repr, memoize_for_monad, from_iterable, policyM, run_rule_func,
+    BasePolicyRule, PolicyRule, Stream, policy_rule_func_classM,
 )
 
 logger = logging.getLogger(__name__)
@@ -21,6 +26,7 @@ logger = logging.getLogger(__name__)
 # Partial Operators
 #
 
+@memoize_for_monad
 def make_unit(m):
     @policy_rule_func(m)
     def unit(value):
@@ -38,6 +44,7 @@ def make_unit(m):
 unit = make_unit(List)
 
 
+@memoize_for_monad
 def make_unit_value(m):
     @policy_rule_func(m)
     def unit_value(node):
@@ -61,6 +68,7 @@ def make_unit_value(m):
 unit_value = make_unit_value(List)
 
 
+@memoize_for_monad
 def make_set_value(m):
     @policy_rule_func(m)
     def set_value(value):
@@ -81,6 +89,7 @@ def make_set_value(m):
 set_value = make_set_value(List)
 
 
+@memoize_for_monad
 def make_select(m):
     @policy_rule_func(m)
     def select(scope, set_path=False):
@@ -107,6 +116,7 @@ def make_select(m):
 select = make_select(List)
 
 
+@memoize_for_monad
 def make_scope(m):
     @policy_rule_func(m)
     def scope():
@@ -124,6 +134,7 @@ def make_scope(m):
 scope = make_scope(List)
 
 
+@memoize_for_monad
 def make_get_node(m):
     @policy_rule_func(m)
     def get_node():
@@ -133,7 +144,7 @@ def make_get_node(m):
         :returns: PolicyRule (Node *v*)
         """
         def for_partial(partial):
-            return m.unit(partial.select(""))
+            return m.unit((partial.peek(""), partial))
         return for_partial
     return get_node
 
@@ -141,6 +152,7 @@ def make_get_node(m):
 get_node = make_get_node(List)
 
 
+@memoize_for_monad
 def make_children(m):
     @policy_rule_func(m)
     def children():
@@ -151,7 +163,7 @@ def make_children(m):
         :returns: PolicyRule [scope]
         """
         def for_partial(partial):
-            node, _ = partial.select("")
+            node = partial.peek("")
             if not hasattr(node, 'keys'):
                 return m.unit(([], partial))
 
@@ -164,6 +176,7 @@ def make_children(m):
 children = make_children(List)
 
 
+@memoize_for_monad
 def make_get_value(m):
     get_node = make_get_node(m)
     unit_value = make_unit_value(m)
@@ -183,6 +196,7 @@ def make_get_value(m):
 get_value = make_get_value(List)
 
 
+@memoize_for_monad
 def make_append_value(m):
     get_value = make_get_value(m)
     set_value = make_set_value(m)
@@ -214,6 +228,7 @@ def make_append_value(m):
 append_value = make_append_value(List)
 
 
+@memoize_for_monad
 def make_pop_value(m):
     get_value = make_get_value(m)
     set_value = make_set_value(m)
@@ -237,6 +252,7 @@ def make_pop_value(m):
 pop_value = make_pop_value(List)
 
 
+@memoize_for_monad
 def make_define_as(m):
     @policy_rule_func(m)
     def define_as(node):
@@ -266,6 +282,7 @@ def make_define_as(m):
 define_as = make_define_as(List)
 
 
+@memoize_for_monad
 def make_check(m):
     @policy_rule_func(m)
     def check(func):
@@ -287,8 +304,11 @@ check = make_check(List)
 # Control Structures
 #
 
+@memoize_for_monad
 def make_collect(m):
     unit = make_unit(m)
+    PolicyRuleFunc = policy_rule_func_classM(m)
+    prune = policyM(m).prune
 
     def collect(*rule_funcs):
         """
@@ -296,19 +316,25 @@ def make_collect(m):
         func that accepts some value, provides that to each function,
         resetting the scope each time.
         """
+        optimizing = optimize.is_enabled()
+
         def for_incoming_value(incoming_value):
             def for_initial_partial(initial_partial):
-                initial_scope = initial_partial.scope
+                initial_path = initial_partial.abs_path
 
                 m_results = m.unit((incoming_value, initial_partial))
 
                 def for_rule_func(rule_func):
                     def for_m_result(m_result):
                         _, partial = m_result
-                        _, scoped_partial = partial.select(
-                            initial_scope, set_path=True
+                        _, scoped_partial = partial.select_path(
+                            initial_path, set_path=True
                         )
 
+                        if optimizing:
+                            return run_rule_func(
+                                rule_func, incoming_value, scoped_partial
+                            )
                         rule = unit(incoming_value) >> rule_func
                         m_results = rule.run(scoped_partial)
                         return m_results
@@ -316,23 +342,26 @@ def make_collect(m):
 
                 for rule_func in rule_funcs:
                     for_m_result = for_rule_func(rule_func)
-                    m_results = m_results >> for_m_result
+                    m_results = prune(m_results, ignore_values=True) >> for_m_result
                 return m_results
             return for_initial_partial
 
         if not rule_funcs:
             rule_funcs = [unit]
 
-        collect_func_name = get_call_repr('collect', *rule_funcs)
-        return policy_rule_func(m, collect_func_name)(for_incoming_value)
+        def collect_func_name():
+            return get_call_repr('collect', *rule_funcs)
+        return PolicyRuleFunc(for_incoming_value, collect_func_name)
     return collect
 
 
 collect = make_collect(List)
 
 
+@memoize_for_monad
 def make_policies(m):
     unit = make_unit(m)
+    prune = policyM(m).prune
 
     @policy_rule_func(m)
     def policies(*rule_funcs):
@@ -341,18 +370,26 @@ def make_policies(m):
         applies each in turn, keeping scope constant for each. (By resetting
         the path each time)
         """
+        optimizing = optimize.is_enabled()
+        if optimizing:
+            rule_funcs = flatten_policies(rule_funcs)
+            if len(rule_funcs) == 1 and isinstance(rule_funcs[0], BasePolicyRule):
+                return rule_funcs[0]
+
         def for_initial_partial(initial_partial):
-            initial_scope = initial_partial.scope
+            initial_path = initial_partial.abs_path
 
             m_results = m.unit((None, initial_partial))
 
             def for_rule_func(rule_func):
                 def for_m_result(m_result):
                     _, partial = m_result
-                    _, scoped_partial = partial.select(
-                        initial_scope, set_path=True
+                    _, scoped_partial = partial.select_path(
+                        initial_path, set_path=True
                     )
 
+                    if optimizing:
+                        return run_rule_func(rule_func, None, scoped_partial)
                     rule = unit(None) >> rule_func
                     m_results = rule.run(scoped_partial)
                     return m_results
@@ -360,41 +397,54 @@ def make_policies(m):
 
             for rule_func in rule_funcs:
                 for_m_result = for_rule_func(rule_func)
-                m_results = m_results >> for_m_result
+                m_results = prune(m_results, ignore_values=True) >> for_m_result
             return m_results
+
+        # for `flatten_policies`
+        for_initial_partial.policy_rules = rule_funcs
         return for_initial_partial
     return policies
 
 
+def flatten_policies(rule_funcs):
+    """
+    Splices the rules of nested `policies(...)` rules into `rule_funcs`.
+    `policies` resets the scope before each rule, so a nested `policies`
+    starts from the same scope whether nested or spliced.
+    """
+    flattened = []
+    for rule_func in rule_funcs:
+        nested = getattr(rule_func, 'value', None)
+        if isinstance(rule_func, BasePolicyRule) and hasattr(nested, 'policy_rules'):
+            flattened.extend(nested.policy_rules)
+        else:
+            flattened.append(rule_func)
+    return flattened
+
+
 policies = make_policies(List)
 
 
+@memoize_for_monad
 def make_regarding(m):
     policies = make_policies(m)
     select = make_select(m)
     unit_value = make_unit_value(m)
 
-    @policy_rule_func(m)
-    def regarding(selector, *rule_funcs):
-        """
-        Given a selector and a list of functions that generate policy rules,
-        returns a single policy rule that, for each rule function:
-
-        1. sets the scope to the selector / retrieves the node there
-        3. passes the node to the rule_func to generate a policy rule
-        4. applies the policy rule at the new scope
-
-        In addition, regarding checks the current scope and restores it when
-        it's done.
-        """
+    def make_regarding_step(select_node):
         @policy_rule_func(m)
-        def regarding_step(rule_func):
+        def regarding_step(selector, rule_func, keeps_value=True):
             def for_partial(partial):
-                original_scope = partial.scope
-                node, inner_partial = partial.select(selector, set_path=True)
-                value = node.value
-                if not value:
-                    value = node
+                original_path = partial.abs_path
+                node, inner_partial = select_node(partial, selector)
+
+                if isinstance(rule_func, PolicyRule) and not keeps_value:
+                    # `policies` drops the value; the node may be large
+                    value = None
+                else:
+                    value = node.value
+                    if not value:
+                        value = node
 
                 if isinstance(rule_func, PolicyRule):
                     results = rule_func.run(inner_partial)
@@ -403,16 +453,49 @@ def make_regarding(m):
 
                 def for_result(result):
                     _, partial = result
-                    _, rescoped_partial = partial.select(
-                        original_scope, set_path=True
+                    _, rescoped_partial = partial.select_path(
+                        original_path, set_path=True
                     )
                     return value, rescoped_partial
 
                 return results.fmap(for_result)
             return for_partial
+        return regarding_step
+
+    def select_scope(partial, selector):
+        return partial.select(selector, set_path=True)
+
+    def stay(partial, selector):  # pylint: disable=unused-argument
+        # already there
+        return partial.peek(""), partial
+
+    select_step = make_regarding_step(select_scope)
+    stay_step = make_regarding_step(stay)
+
+    @policy_rule_func(m)
+    def regarding(selector, *rule_funcs):
+        """
+        Given a selector and a list of functions that generate policy rules,
+        returns a single policy rule that, for each rule function:
+
+        1. sets the scope to the selector / retrieves the node there
+        3. passes the node to the rule_func to generate a policy rule
+        4. applies the policy rule at the new scope
+
+        In addition, regarding checks the current scope and restores it when
+        it's done.
+        """
+        regarding_step = select_step
+        if not selector and optimize.is_enabled():
+            regarding_step = stay_step
 
         if rule_funcs:
-            op = policies(*[regarding_step(rule_func) for rule_func in rule_funcs])
+            # only the last step's value is kept
+            last = len(rule_funcs) - 1
+            op = policies(*[
+                regarding_step(selector, rule_func, idx == last)
+                for idx, rule_func in enumerate(rule_funcs)
+            ])
         else:
             op = select(selector, set_path=False) >> unit_value
 
@@ -424,8 +507,211 @@ def make_regarding(m):
 regarding = make_regarding(List)
 
 
+def error_nodes(partial):
+    # not `peek`: counting errors is not a read of the rules being run
+    errors = node_at(partial.root_node, ("errors",))
+    if isinstance(errors, ListPolicyNode):
+        return errors.nodes
+    return ()
+
+
+def child_changes(partial, child_partial, step):
+    """
+    For the final partial of running a child's rules from `partial` (at
+    the parent node), returns the child's new node, or None if the child
+    changed anything else (besides adding errors)
+    """
+    path = partial.abs_path
+    if child_partial.abs_path != path:
+        return None
+
+    node, child_node = partial.root_node, child_partial.root_node
+    for depth in range(len(path) + 1):
+        changed = changed_steps(node, child_node)
+        if changed is None:
+            return None
+        if depth == len(path):
+            changed.discard(step)
+        else:
+            changed.discard(path[depth])
+        if depth == 0:
+            if "errors" in changed:
+                errors = error_nodes(partial)
+                child_errors = error_nodes(child_partial)
+                if len(child_errors) < len(errors) or any(
+                        idx < len(errors)
+                        for idx in changed_steps(
+                            partial.peek("/errors"),
+                            child_partial.peek("/errors")
+                        ) or ()
+                ):
+                    return None
+                changed.discard("errors")
+            if "context" in changed and (
+                    partial.peek("/context") == child_partial.peek("/context")
+            ):
+                changed.discard("context")
+        if changed:
+            return None
+        if depth < len(path):
+            node, child_node = node[path[depth]], child_node[path[depth]]
+
+    return child_node[step]
+
+
+def reads_others(read_log, path, step, base_errors):
+    """
+    Whether the reads in `read_log` of a child's rules, run at the parent
+    node `path`, depend on what other children write: the errors, besides
+    their number and the `base_errors` on, which the child added itself,
+    or the nodes of other children (directly, or by peeking at a node
+    above them)
+    """
+    depth = len(path)
+    for read_path in read_log.peeked | read_log.selected:
+        if read_path[:1] == ("errors",):
+            if len(read_path) < 2 or not isinstance(read_path[1], int) or (
+                    read_path[1] < base_errors
+            ):
+                return True
+            continue
+        if len(read_path) > depth:
+            if read_path[:depth] == path and read_path[depth] != step:
+                return True
+        elif read_path in read_log.peeked and (
+                path[:len(read_path)] == read_path
+        ):
+            return True
+    return False
+
+
+def merge_children(partial, children):
+    """
+    Sets each child's node in `partial` (at the parent node), and appends
+    the errors the children added, in the order running the children in
+    turn would have added them
+
+    :param children: (step, child node, errors per rule) for each child
+    """
+    node = partial.zipper.node
+    for step, child_node, _ in children:
+        node = node.set_child(step, child_node)
+    _, merged = partial.set_node(node)
+
+    new_errors = [
+        error
+        for step_errors in zip(*[errors for _, _, errors in children])
+        for errors in step_errors
+        for error in errors
+    ]
+    if not new_errors:
+        return merged
+
+    errors = merged.peek("/errors")
+    if not isinstance(errors, ListPolicyNode):
+        errors = ListPolicyNode()
+    for error in new_errors:
+        errors = errors.set_child(len(errors.nodes), error)
+    _, merged = merged.set_value(errors, "/errors")
+    return merged
+
+
+@memoize_for_monad
 def make_each(m):
     unit = make_unit(m)
+    regarding = make_regarding(m)
+    prune = policyM(m).prune
+    PolicyRuleFunc = policy_rule_func_classM(m)
+    # the children's branches are combined by iterating them
+    iterable_monad = issubclass(m, (List, Stream))
+
+    @policy_rule_func(m)
+    def each_step(key, rule_func):
+        return regarding(key, rule_func)
+
+    @policy_rule_func(m)
+    def each_ref_step(key, ref_value, rule_func):
+        return regarding(key, unit(ref_value) >> rule_func)
+
+    def run_child(partial, step, child_rules):
+        """
+        Runs the rules for one child from `partial`, returning (child
+        node, errors added by each rule) for each branch, or None if the
+        child reads or writes what other children might write
+        """
+        base_errors = len(error_nodes(partial))
+        branches = [(partial, ())]
+        read_log = ReadLog()
+        for rule in child_rules:
+            next_branches = []
+            for child_partial, counts in branches:
+                with read_log:
+                    m_results = list(prune(
+                        rule.run(child_partial), ignore_values=True
+                    ))
+                if reads_others(
+                        read_log, partial.abs_path, step, base_errors
+                ):
+                    return None
+                for _, result in m_results:
+                    counts_after = counts + (len(error_nodes(result)),)
+                    next_branches.append((result, counts_after))
+            branches = next_branches
+
+        children = []
+        for child_partial, counts in branches:
+            child_node = child_changes(partial, child_partial, step)
+            if child_node is None:
+                return None
+            errors = error_nodes(child_partial)
+            starts = (base_errors,) + counts[:-1]
+            children.append((child_node, [
+                [errors[idx] for idx in range(start, end)]
+                for start, end in zip(starts, counts)
+            ]))
+        return children
+
+    @policy_rule_func(m)
+    def each_independently(keys, steps):
+        """
+        Runs the steps for each key from the same partial, instead of one
+        after another, and combines the branches of all the keys. Falls
+        back to running the steps in turn if some child changes more than
+        its own node and "/errors", or reads "/errors" or the nodes of
+        other children (see `reads_others`).
+        """
+        def for_partial(partial):
+            path = partial.abs_path
+            child_paths = [partial.scope_path(key) for key in keys]
+            if path[:1] in (("errors",), ("context",)) or any(
+                    len(child_path) != len(path) + 1 or
+                    child_path in (("errors",), ("context",))
+                    for child_path in child_paths
+            ):
+                return regarding("", *steps).run(partial)
+
+            all_children = []
+            for idx, child_path in enumerate(child_paths):
+                step = child_path[-1]
+                children = run_child(partial, step, steps[idx::len(keys)])
+                if children is None:
+                    return regarding("", *steps).run(partial)
+                all_children.append([
+                    (step, child_node, errors)
+                    for child_node, errors in children
+                ])
+
+            node = partial.peek("")
+            value = node.value or node
+
+            def combined():
+                for children in product(*all_children):
+                    yield value, merge_children(partial, children)
+
+            return prune(
+                from_iterable(m, combined()), ignore_values=True
+            )
+        return for_partial
 
     def each(*rule_funcs, **kwargs):
         """
@@ -436,29 +722,39 @@ def make_each(m):
         `each` optionally takes a named argument `ref=dict()` to provide
         a built-in lookup for some reference dictionary. If ref is
         provided, `rule_func(ref[key])` is called instead.
+
+        With `parallel=True`, the rule funcs run for each key on its own,
+        and the branches of all the keys are combined afterwards, so the
+        branches of one child are not explored once per branch of the
+        others. Only for children whose rules do not read what the rules
+        of other children write; rules that read "/errors" (e.g. in
+        `fail_early`) or the nodes of other children, or that write
+        outside their own child, make `each` run the keys in turn
+        instead.
         """
         ref_obj = kwargs.get('ref')
+        parallel = kwargs.get('parallel', False) and iterable_monad
 
         def for_keys(keys):
-
-            @policy_rule_func(m)
-            def each_step(key, rule_func):
-                if ref_obj is not None:
-                    value = ref_obj.get(key)
-                    return (
-                        regarding(key, unit(value) >> rule_func)
-                    )
-                return regarding(key, rule_func)
-
-            steps = [
-                each_step(key, rule_func)
-                for rule_func in rule_funcs
-                for key in keys
-            ]
+            if ref_obj is not None:
+                steps = [
+                    each_ref_step(key, ref_obj.get(key), rule_func)
+                    for rule_func in rule_funcs
+                    for key in keys
+                ]
+            else:
+                steps = [
+                    each_step(key, rule_func)
+                    for rule_func in rule_funcs
+                    for key in keys
+                ]
+            if parallel and keys:
+                return each_independently(list(keys), steps)
             return regarding("", *steps)
 
-        each_rule_func_name = get_call_repr("each", *rule_funcs, **kwargs)
-        return policy_rule_func(m, each_rule_func_name)(for_keys)
+        def each_rule_func_name():
+            return get_call_repr("each", *rule_funcs, **kwargs)
+        return PolicyRuleFunc(for_keys, each_rule_func_name)
     return each
 
 
@@ -469,6 +765,7 @@ each = make_each(List)
 # Non-Determinism Rules
 #
 
+@memoize_for_monad
 def make_fail(m):
     @policy_rule_func(m)
     def fail():
@@ -481,6 +778,7 @@ def make_fail(m):
 fail = make_fail(List)
 
 
+@memoize_for_monad
 def make_match(m):
     @policy_rule_func(m)
     def match(compare_to):
@@ -506,25 +804,105 @@ def make_match(m):
 match = make_match(List)
 
 
+class ValueIndex(object):
+    """
+    The positions of a list of permitted values, by value, so that the
+    permitted values equal to a given one are found without comparing it
+    against every one of them. The index is built on first use.
+    """
+    def __init__(self, values):
+        self.values = values
+        self._positions = None
+        # positions of values that cannot be indexed
+        self._unhashable = None
+
+    @staticmethod
+    def indexable(values):
+        return isinstance(values, (list, tuple, set, frozenset))
+
+    def _build(self):
+        self._positions = {}
+        self._unhashable = []
+        for position, value in enumerate(self.values):
+            try:
+                self._positions.setdefault(value, []).append(position)
+            except TypeError:
+                self._unhashable.append(position)
+
+    def matching(self, value):
+        """
+        Returns the permitted values equal to `value`, in order
+        """
+        values = self.values
+        if isinstance(values, (set, frozenset)):
+            try:
+                return [value] if value in values else []
+            except TypeError:
+                return []
+
+        if self._positions is None:
+            self._build()
+        try:
+            positions = self._positions.get(value, [])
+        except TypeError:
+            return [other for other in values if value == other]
+
+        if self._unhashable:
+            positions = sorted(positions + [
+                position for position in self._unhashable
+                if value == values[position]
+            ])
+        return [values[position] for position in positions]
+
+
+def determined_value(node):
+    """
+    Returns (True, value) if a node can only match `value`, and
+    (False, None) if matching may change it
+    """
+    definition = getattr(node, 'definition', None)
+    if isinstance(definition, Value):
+        return True, definition.value
+    if isinstance(definition, Field) and 'value' in definition.params:
+        return True, definition.params['value']
+    return False, None
+
+
+@memoize_for_monad
 def make_permit_values(m):
-    match = make_match(m)
-
     @policy_rule_func(m)
     def permit_values(permitted_values):
         """
         Given a list of allowed values, matches the current partial against
         each, forking the non-deterministic computation.
+
+        Nodes that already hold a value only look it up among the allowed
+        values (if given as a list, tuple or set, which is then indexed and
+        should not change); only undetermined nodes fork.
         """
-        def for_partial(partial):
-            def for_value(value):
-                rule = match(value)
-                return rule.run(partial)
+        index = None
+        if ValueIndex.indexable(permitted_values):
+            index = ValueIndex(permitted_values)
 
-            monad = m.mzero()
-            for value in permitted_values:
-                monad = monad.mplus(for_value(value))
+        def for_partial(partial):
+            if index is not None:
+                determined, value = determined_value(partial.peek(""))
+                if determined:
+                    matching = index.matching(value)
+                    if len(matching) == 1:
+                        return m.unit((matching[0], partial))
+                    return from_iterable(m, [
+                        (permitted_value, partial)
+                        for permitted_value in matching
+                    ])
+
+            def for_value(permitted_value):
+                matches, new_partial = partial.match(permitted_value)
+                if matches:
+                    return m.unit((permitted_value, new_partial))
+                return m.mzero()
 
-            return monad
+            return from_iterable(m, permitted_values) >> for_value
         return for_partial
     return permit_values
 
@@ -532,10 +910,12 @@ def make_permit_values(m):
 permit_values = make_permit_values(List)
 
 
+@memoize_for_monad
 def make_attempt(m):
     mzero = m.mzero
     unit = make_unit(m)
     collect = make_collect(m)
+    PolicyRuleFunc = policy_rule_func_classM(m)
 
     def attempt(*rules):
         """
@@ -553,18 +933,21 @@ def make_attempt(m):
                     return m.unit((value, initial_partial))
                 return result
             return for_partial
-        attempt_rule_func_name = get_call_repr("attempt", *rules)
-        return policy_rule_func(m, attempt_rule_func_name)(for_value)
+        def attempt_rule_func_name():
+            return get_call_repr("attempt", *rules)
+        return PolicyRuleFunc(for_value, attempt_rule_func_name)
     return attempt
 
 
 attempt = make_attempt(List)
 
 
+@memoize_for_monad
 def make_catch_attempt(m):
     mzero = m.mzero
     unit = make_unit(m)
     collect = make_collect(m)
+    PolicyRuleFunc = policy_rule_func_classM(m)
 
     def catch_attempt(catch_rule, *rules):
         """
@@ -584,19 +967,79 @@ def make_catch_attempt(m):
                     return alternative
                 return result
             return for_partial
-        attempt_rule_func_name = get_call_repr("attempt", catch_rule, *rules)
-        return policy_rule_func(m, attempt_rule_func_name)(for_value)
+        def attempt_rule_func_name():
+            return get_call_repr("attempt", catch_rule, *rules)
+        return PolicyRuleFunc(for_value, attempt_rule_func_name)
     return catch_attempt
 
 
 catch_attempt = make_catch_attempt(List)
 
 
+@memoize_for_monad
+def make_or_error(m):
+    mzero = m.mzero
+    unit = make_unit(m)
+    collect = make_collect(m)
+    policies = make_policies(m)
+    regarding = make_regarding(m)
+    set_value = make_set_value(m)
+    PolicyRuleFunc = policy_rule_func_classM(m)
+
+    def record_error(value, partial):
+        scope = partial.scope
+        provided_value = partial.scope_value
+        frames = partial.peek("/context").value or []
+
+        # appends the error without rebuilding (or reading) the others
+        error_path = "/errors/{}".format(partial.append_index("/errors"))
+
+        rules = [
+            regarding(error_path, set_value({})),
+            regarding(error_path + "/value", set_value(provided_value)),
+            regarding(error_path + "/scope", set_value(scope)),
+            regarding(error_path + "/context", set_value(frames)),
+        ]
+        rules.extend(
+            regarding(error_path, frame.error_handler)
+            for frame in frames
+            if getattr(frame, 'error_handler', None)
+        )
+        return (policies(*rules) >> unit(value)).run(partial)
+
+    def or_error(*rules):
+        """
+        Like `catch_attempt`, runs a list of policy rule[_func]s, but on
+        monadic failure appends an error to "/errors" instead, with the
+        `value` and `scope` of the current node, and the `context` stack.
+        Each context frame with an error handler then runs it on the error.
+        """
+        attempt_rule = collect(*rules)
+
+        def for_value(value):
+            def for_partial(initial_partial):
+                result = run_rule_func(attempt_rule, value, initial_partial)
+
+                if result == mzero():
+                    return record_error(value, initial_partial)
+                return result
+            return for_partial
+        def or_error_rule_func_name():
+            return get_call_repr("or_error", *rules)
+        return PolicyRuleFunc(for_value, or_error_rule_func_name)
+    return or_error
+
+
+or_error = make_or_error(List)
+
+
 #
 # Context Operators
 #
 
+@memoize_for_monad
 def make_push_context(m):
+    regarding = make_regarding(m)
     append_value = make_append_value(m)
 
     @policy_rule_func(m)
@@ -611,8 +1054,11 @@ def make_push_context(m):
 push_context = make_push_context(List)
 
 
+@memoize_for_monad
 def make_pop_context(m):
     unit = make_unit(m)
+    regarding = make_regarding(m)
+    pop_value = make_pop_value(m)
 
     @policy_rule_func(m)
     def pop_context(passthru):
@@ -627,6 +1073,7 @@ def make_pop_context(m):
 pop_context = make_pop_context(List)
 
 
+@memoize_for_monad
 def make_wrap_context(m):
     push_context = make_push_context(m)
     pop_context = make_pop_context(m)
@@ -644,6 +1091,7 @@ def make_wrap_context(m):
 wrap_context = make_wrap_context(List)
 
 
+@memoize_for_monad
 def make_require_value(m):
     @policy_rule_func(m)
     def require_value(node):
@@ -672,6 +1120,7 @@ def make_require_value(m):
 require_value = make_require_value(List)
 
 
+@memoize_for_monad
 def make_forbid_value(m):
     @policy_rule_func(m)
     def forbid_value(node):
@@ -697,19 +1146,21 @@ def make_forbid_value(m):
 forbid_value = make_forbid_value(List)
 
 
+@memoize_for_monad
 def make_unless_errors(m):
     policies = make_policies(m)
 
+    @policy_rule_func(m)
+    def unless_errors_step(rule):
+        def for_partial(partial):
+            errors = partial.peek("/errors").value
+            if errors:
+                return m.unit((None, partial))
+            return rule.run(partial)
+        return for_partial
+
     @policy_rule_func(m)
     def unless_errors(*rules):
-        @policy_rule_func(m)
-        def unless_errors_step(rule):
-            def for_partial(partial):
-                errors = partial.root.get('errors', None)
-                if errors:
-                    return m.unit((None, partial))
-                return rule.run(partial)
-            return for_partial
         return policies(*[unless_errors_step(rule) for rule in rules])
     return unless_errors
 
@@ -717,50 +1168,51 @@ def make_unless_errors(m):
 unless_errors = make_unless_errors(List)
 
 
+@memoize_for_monad
 def make_trace(m):
     unit = make_unit(m)
     policies = make_policies(m)
 
+    @policy_rule_func(m)
+    def trace_step(rule_func):
+        def for_partial(partial):
+            # collect information
+            path = partial.abs_path
+            scope = partial.scope
+            value = partial.scope_value
+            context = partial.peek("/context").value
+
+            # build obj that gets passed to rule_func
+            trace_obj = {
+                "scope": scope,
+                "value": value,
+                "context": context,
+            }
+
+            # run rule_func
+            if isinstance(rule_func, PolicyRule):
+                rule = rule_func
+            else:
+                rule = rule_func(trace_obj)
+            results = rule.run(partial)
+
+            # rescope partial for next step
+            def for_result(result):
+                value, partial = result
+                _, rescoped_partial = partial.select_path(
+                    path, set_path=True
+                )
+                return value, rescoped_partial
+
+            return results.fmap(for_result)
+        return for_partial
+
     @policy_rule_func(m)
     def trace(*rule_funcs):
         """
         Collates the current scope, the current node's value,
         and the current policy context and returns it as a dict
         """
-        @policy_rule_func(m)
-        def trace_step(rule_func):
-            def for_partial(partial):
-                # collect information
-                scope = partial.scope
-                value = partial.scope_value
-                context_node, _ = partial.select("/context")
-                context = context_node.value
-
-                # build obj that gets passed to rule_func
-                trace_obj = {
-                    "scope": scope,
-                    "value": value,
-                    "context": context,
-                }
-
-                # run rule_func
-                if isinstance(rule_func, PolicyRule):
-                    rule = rule_func
-                else:
-                    rule = rule_func(trace_obj)
-                results = rule.run(partial)
-
-                # rescope partial for next step
-                def for_result(result):
-                    value, partial = result
-                    _, rescoped_partial = partial.select(
-                        scope, set_path=True
-                    )
-                    return value, rescoped_partial
-
-                return results.fmap(for_result)
-            return for_partial
-
         if not rule_funcs:
             rule_funcs = [unit]
 
@@ -773,6 +1225,7 @@ def make_trace(m):
 trace = make_trace(List)
 
 
+@memoize_for_monad
 def make_args_receiver(m):
     unit = make_unit(m)
 
@@ -788,3 +1241,49 @@ def make_args_receiver(m):
 
 
 args_receiver = make_args_receiver(List)
+
+
+class Operators(object):
+    """
+    The full set of operators, made for some monad `m`. Use
+    `operators_for(m)` to get the (shared) set for a monad.
+    """
+    def __init__(self, m):
+        self.monad = m
+
+        self.unit = make_unit(m)
+        self.unit_value = make_unit_value(m)
+        self.set_value = make_set_value(m)
+        self.select = make_select(m)
+        self.scope = make_scope(m)
+        self.get_node = make_get_node(m)
+        self.children = make_children(m)
+        self.get_value = make_get_value(m)
+        self.append_value = make_append_value(m)
+        self.pop_value = make_pop_value(m)
+        self.define_as = make_define_as(m)
+        self.check = make_check(m)
+        self.collect = make_collect(m)
+        self.policies = make_policies(m)
+        self.regarding = make_regarding(m)
+        self.each = make_each(m)
+        self.fail = make_fail(m)
+        self.match = make_match(m)
+        self.permit_values = make_permit_values(m)
+        self.attempt = make_attempt(m)
+        self.catch_attempt = make_catch_attempt(m)
+        self.or_error = make_or_error(m)
+        self.push_context = make_push_context(m)
+        self.pop_context = make_pop_context(m)
+        self.wrap_context = make_wrap_context(m)
+        self.require_value = make_require_value(m)
+        self.forbid_value = make_forbid_value(m)
+        self.unless_errors = make_unless_errors(m)
+        self.trace = make_trace(m)
+        self.args_receiver = make_args_receiver(m)
+
+    def __repr__(self):
+        return "<Operators for {}>".format(self.monad.__name__)
+
+
+operators_for = memoize_for_monad(Operators)
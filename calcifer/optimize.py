@@ -0,0 +1,122 @@
+"""
+`calcifer.optimize` module
+
+Policy rules are closures, so the rule tree of a finalized context cannot
+be rewritten after the fact. Instead, the operators and contexts optimise
+the rules they build while this module is enabled (the default, see
+`is_enabled`):
+
+- `policies` splices the rules of nested `policies(...)` into its own,
+  and a `policies` of a single rule is that rule
+- `policies` and `collect` run each rule function directly, instead of
+  building `unit(value) >> rule_func` for every branch at every step
+- `regarding("", ...)` (e.g. from `each`) skips selecting the scope it is
+  already at
+- named contexts without an error handler only push their frame on the
+  context stack if something inside them may trace it
+
+`explain(policy)` reports the number of policy rules built to compile
+(and run) a policy, without and with these optimisations.
+
+Like deduplication (see `calcifer.dedup`), the setting applies to the
+rules built on the thread that changed it.
+"""
+from contextlib import contextmanager
+import copy
+import logging
+import threading
+
+from calcifer.monads import BasePolicyRule
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def is_enabled():
+    """
+    Whether operators and contexts optimise the policy rules they build on
+    the current thread
+    """
+    return getattr(_local, 'enabled', True)
+
+
+def enable():
+    """
+    Have operators and contexts optimise the policy rules they build on
+    the current thread (the default)
+    """
+    _local.enabled = True
+
+
+def disable():
+    """
+    Stop optimising policy rules on the current thread, e.g. to compare
+    against the optimised rules
+    """
+    _local.enabled = False
+
+
+@contextmanager
+def enabled_as(enabled):
+    """
+    Optimises policy rules built on the current thread within the `with`
+    block only if `enabled`, restoring the setting on the way out
+    """
+    was_enabled = is_enabled()
+    _local.enabled = enabled
+    try:
+        yield
+    finally:
+        _local.enabled = was_enabled
+
+
+def count_rules(func, *args, **kwargs):
+    """
+    Returns (the number of policy rules built by the call, its result)
+    """
+    before = BasePolicyRule.built
+    result = func(*args, **kwargs)
+    return BasePolicyRule.built - before, result
+
+
+class RuleCounts(object):
+    """
+    The numbers of policy rules built to compile and run a policy, with
+    the optimisations (`after`) and without (`before`)
+    """
+    def __init__(self, policy):
+        self.policy = policy
+        self.compiled = {}
+        self.ran = {}
+
+    def __repr__(self):
+        lines = ["rule counts for {!r}".format(self.policy)]
+        for stage, counts in [("compile", self.compiled), ("run", self.ran)]:
+            if not counts:
+                continue
+            lines.append("  {:<8} before: {:>7}  after: {:>7}".format(
+                stage, counts['before'], counts['after']
+            ))
+        return "\n".join(lines)
+
+
+def explain(policy, obj=None):
+    """
+    Compiles `policy` (and runs it on `obj`, if given) with and without
+    the optimisations, logging and returning the RuleCounts
+    """
+    counts = RuleCounts(policy)
+    for stage, enabled in [('before', False), ('after', True)]:
+        with enabled_as(enabled):
+            new_self = policy.derive(ref=obj)
+            compiled, plan = count_rules(new_self.compile)
+            counts.compiled[stage] = compiled
+            if obj is not None:
+                ran, _ = count_rules(
+                    new_self.run_plan, plan, copy.deepcopy(obj)
+                )
+                counts.ran[stage] = ran
+
+    logger.debug("%r", counts)
+    return counts
@@ -10,47 +10,112 @@ The data structure has two parts:
 
 Operations are provided on Partial that allow the manipulation of either
 the policy tree or the pointer, or both.
+
+The pointer is kept as a tuple of steps (its "path"); scope strings are
+tokenized into steps through a bounded cache, since policies select the
+same few scopes over and over.
+
+A Partial holds a zipper focused on its current scope. Updates replace
+the focused node without rebuilding the tree, and moving to another scope
+only climbs to the common prefix of the two paths; the root is rebuilt
+lazily, when something asks for it.
+
+Within `with ReadLog():`, the paths partials `peek` at and `select` on
+the current thread are recorded (see `calcifer.incremental`).
 """
+import threading
+
+from calcifer.caching import lru_cached
 from calcifer.tree import (
-    PolicyNode, UnknownPolicyNode, LeafPolicyNode
+    PolicyNode, UnknownPolicyNode, LeafPolicyNode, UNKNOWN,
+    DictPolicyNode, ListPolicyNode, node_at,
 )
 from calcifer.zipper import Zipper
 
+_local = threading.local()
+
+
+def maybe_coerce_to_int(step):
+    try:
+        return int(step)
+    except ValueError:
+        return step
+
+
+@lru_cached(maxsize=4096)
+def parse_scope(scope):
+    """
+    Tokenizes a scope string, returning (is_absolute, steps)
+
+    :Examples:
+    >>> parse_scope("/foo/0")
+    (True, ('foo', 0))
+    >>> parse_scope("bar")
+    (False, ('bar',))
+    """
+    if scope[:1] == '/':
+        scope = scope[1:]
+        if not scope:
+            return True, ()
+        return True, tuple(
+            maybe_coerce_to_int(step) for step in scope.split('/')
+        )
+    return False, tuple(
+        maybe_coerce_to_int(step) for step in scope.split('/')
+    )
+
 
 class Partial(object):
     def __init__(self, root=None, path=None):
         if root is None:
-            root = UnknownPolicyNode()
+            root = UNKNOWN
         if path is None:
-            path = []
+            path = ()
 
         self.zipper = Zipper([], root).select(path)
 
+    @classmethod
+    def from_zipper(cls, zipper):
+        partial = cls.__new__(cls)
+        partial.zipper = zipper
+        return partial
+
     @staticmethod
     def from_obj(obj):
         return Partial(
             root=PolicyNode.from_obj(obj)
         )
 
+    @property
+    def root_node(self):
+        """
+        The root of the policy tree (selecting the path may have
+        filled in the tree given to the constructor)
+        """
+        return self.zipper.root.node
+
+    @property
+    def abs_path(self):
+        return self.zipper.abs_path
+
     @property
     def root(self):
-        return self.zipper.root.node.value
+        return self.root_node.value
 
     @property
     def path(self):
-        return self.zipper.path
+        return list(self.abs_path)
 
     @property
     def scope(self):
-        return "/{}".format("/".join([str(step) for step in self.zipper.path]))
+        return "/{}".format("/".join([str(step) for step in self.abs_path]))
 
     @property
     def scope_value(self):
-        node, _ = self.select(self.scope, set_path=False)
-        return node.value
+        return self.peek("").value
 
     def get_template(self):
-        return self.zipper.root.node.get_template()
+        return self.root_node.get_template()
 
     @staticmethod
     def sub_scope(parent_abs='/', child_rel=''):
@@ -65,51 +130,95 @@ class Partial(object):
 
         return '/'.join(rels)
 
-    def select(self, scope, set_path=True):
+    def scope_path(self, scope):
         """
-        Select a node at a given scope, possibly setting the path on a newly returned
-        partial.
+        Converts a scope to an absolute path (a tuple of steps).
 
         Cases:
             - If scope begins with "/", it's an absolute path
             - Otherwise, scope is a relative path, and the existing path should be subscoped
         """
-        old_scope = self.scope
-        old_path = self.zipper.path
-
         if not scope:
-            scope = old_scope
-        elif scope[0] != '/':
-            scope = self.sub_scope(old_scope, scope)
+            return self.abs_path
 
-        # scope should be absolute
-        # convert scope to path
+        is_absolute, steps = parse_scope(scope)
+        if is_absolute:
+            return steps
+        return self.abs_path + steps
 
-        # remove leading slash
-        scope = scope[1:]
-        if scope:
-            selected_path = scope.split("/")  # to remove leading slash
+    def peek(self, scope=""):
+        """
+        Look up the node at a given scope, without building a new partial
+        or filling in the tree along the way (as `select` does).
+        Returns an UnknownPolicyNode if there is no node at that scope.
+        """
+        read_log = getattr(_local, 'read_log', None)
+        if not scope:
+            if read_log is not None:
+                read_log.peeked.add(self.abs_path)
+            return self.zipper.node
+
+        path = self.scope_path(scope)
+        if read_log is not None:
+            read_log.peeked.add(path)
+        depth = len(self.abs_path)
+        if path[:depth] == self.abs_path:
+            # below the current scope, no need to go through the root
+            node = self.zipper.node
+            path = path[depth:]
         else:
-            selected_path = []
+            node = self.root_node
 
-        def maybe_coerce_to_int(step):
-            try:
-                return int(step)
-            except ValueError:
-                return step
+        for step in path:
+            if not isinstance(node, (DictPolicyNode, ListPolicyNode)):
+                return UnknownPolicyNode()
+            node = node[step]
+        return node
+
+    def select(self, scope, set_path=True):
+        """
+        Select a node at a given scope, possibly setting the path on a newly returned
+        partial.
 
-        selected_path = [
-            maybe_coerce_to_int(step) for step in selected_path
-        ]
+        See `scope_path` for how scopes are interpreted.
+        """
+        path = self.scope_path(scope)
+        read_log = getattr(_local, 'read_log', None)
+        if read_log is not None:
+            read_log.selected.add(path)
+        return self.select_path(path, set_path=set_path)
 
-        new_zipper = self.zipper.root.select(selected_path)
+    def select_path(self, path, set_path=True):
+        """
+        `select` for an absolute path (tuple of steps) instead of a scope
+        """
+        if path == self.abs_path:
+            # nothing to fill in, nowhere to go
+            return self.zipper.node, self
 
-        if set_path:
-            new_path = selected_path
-        else:
-            new_path = old_path
+        new_zipper = self.zipper.move_to(path)
+        node = new_zipper.node
 
-        return new_zipper.node, Partial(new_zipper.root.node, new_path)
+        if not set_path:
+            new_zipper = new_zipper.move_to(self.abs_path)
+
+        return node, Partial.from_zipper(new_zipper)
+
+    def append_index(self, scope):
+        """
+        The index of a child appended to the list at a given scope: its
+        length, or 0 if there is no list there. Rules that append to a list
+        without reading it (as `or_error` does "/errors") read its length
+        this way, rather than the whole list.
+        """
+        path = self.scope_path(scope)
+        read_log = getattr(_local, 'read_log', None)
+        if read_log is not None:
+            read_log.appended.add(path)
+        node = node_at(self.root_node, path)
+        if isinstance(node, ListPolicyNode):
+            return len(node.nodes)
+        return 0
 
     def define_as(self, definition):
         existing_value = self.scope_value
@@ -119,31 +228,28 @@ class Partial(object):
                 return (None, self)
             definition = new_definition
 
-        new_zipper = self.zipper.set_node(LeafPolicyNode(definition))
-        partial = Partial(new_zipper.root.node, self.path)
-        return definition, partial
+        new_zipper = self.zipper.set_node(LeafPolicyNode(definition).interned())
+        return definition, Partial.from_zipper(new_zipper)
 
     def set_value(self, value, selector=None):
         partial = self
         if selector is not None:
             _, partial = partial.select(selector)
         new_zipper = partial.zipper.set_node(PolicyNode.from_obj(value))
+        if selector is not None:
+            new_zipper = new_zipper.move_to(self.abs_path)
 
-        return (
-            value, Partial(new_zipper.root.node, path=self.path)
-        )
+        return value, Partial.from_zipper(new_zipper)
 
     def set_node(self, node):
         new_zipper = self.zipper.set_node(node)
 
-        return (
-            node, Partial(new_zipper.root.node, path=self.path)
-        )
+        return node, Partial.from_zipper(new_zipper)
 
     def match(self, value):
-        node, new_self = self.select("")
+        node = self.peek("")
         matches, new_node = node.match(value)
-        _, new_partial = new_self.set_node(new_node)
+        _, new_partial = self.set_node(new_node)
         if matches:
             return True, new_partial
 
@@ -151,3 +257,40 @@ class Partial(object):
 
     def __repr__(self):
         return "Partial(root={}, path={})".format(self.root, self.path)
+
+
+class ReadLog(object):
+    """
+    The absolute paths read by partials on the current thread, within
+    `with read_log:`. `peeked` are the paths of nodes looked at,
+    `selected` those of nodes selected, which also fills in the tree
+    along the way, and `appended` those of lists only the length of
+    which was read (see `append_index`). Moving between scopes
+    (`select_path`) is not a read. A log entered within another passes
+    its reads on to it on exit.
+    """
+    def __init__(self):
+        self.peeked = set()
+        self.selected = set()
+        self.appended = set()
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = getattr(_local, 'read_log', None)
+        _local.read_log = self
+        return self
+
+    def __exit__(self, *exc_info):
+        outer = self._outer
+        _local.read_log = outer
+        self._outer = None
+        if outer is not None:
+            # the reads within are reads of the outer log's rules too
+            outer.peeked |= self.peeked
+            outer.selected |= self.selected
+            outer.appended |= self.appended
+
+    def __repr__(self):
+        return "<ReadLog peeked={} selected={}>".format(
+            len(self.peeked), len(self.selected)
+        )
@@ -0,0 +1,444 @@
+"""
+`calcifer.persistent` module
+
+Immutable collections with structural sharing, backing the policy tree
+(see `calcifer.tree`).
+
+Every update returns a new collection and leaves the original untouched,
+copying only the path from the root of the collection's internal trie to
+the updated entry. Updating a collection of width n costs O(log32 n), and
+all unchanged parts are shared between the old and the new versions. This
+matters because the non-deterministic search keeps many near-identical
+policy trees alive at once.
+
+- `PersistentVector` is a 32-way trie indexed by position.
+- `PersistentMap` is a hash array mapped trie (HAMT), paired with a
+  PersistentVector of its keys so that it iterates in insertion order,
+  like `dict`.
+"""
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:  # Python 2
+    from collections import Mapping, Sequence
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+#
+# Vector
+#
+
+def _vector_set(node, shift, idx, value):
+    """
+    Path-copying assignment of position `idx` (which may be one past the
+    end of the trie) below `node`
+    """
+    node = list(node)
+    slot = (idx >> shift) & MASK
+    if shift:
+        child = node[slot] if slot < len(node) else ()
+        value = _vector_set(child, shift - BITS, idx, value)
+
+    if slot == len(node):
+        node.append(value)
+    else:
+        node[slot] = value
+    return tuple(node)
+
+
+def _vector_changed(node, other, shift, offset, changed):
+    """
+    Appends to `changed` the positions at which the tries `node` and
+    `other` (of the same depth) hold different objects, skipping shared
+    subtries
+    """
+    if node is other:
+        return
+    if not shift:
+        for idx in range(max(len(node), len(other))):
+            if idx >= len(node) or idx >= len(other) or (
+                    node[idx] is not other[idx]
+            ):
+                changed.append(offset + idx)
+        return
+    for slot in range(max(len(node), len(other))):
+        child = node[slot] if slot < len(node) else ()
+        other_child = other[slot] if slot < len(other) else ()
+        _vector_changed(
+            child, other_child, shift - BITS, offset + (slot << shift), changed
+        )
+
+
+def _vector_iter(node, shift):
+    if not shift:
+        for value in node:
+            yield value
+        return
+    for child in node:
+        for value in _vector_iter(child, shift - BITS):
+            yield value
+
+
+class PersistentVector(Sequence):
+    __slots__ = ('_root', '_shift', '_size')
+
+    def __init__(self, values=()):
+        self._root = ()
+        self._shift = 0
+        self._size = 0
+        for value in values:
+            self._append(value)
+
+    @classmethod
+    def _make(cls, root, shift, size):
+        vector = cls.__new__(cls)
+        vector._root = root
+        vector._shift = shift
+        vector._size = size
+        return vector
+
+    def _append(self, value):
+        # in-place, only for use while constructing
+        if self._size == WIDTH << self._shift:
+            self._root = (self._root,)
+            self._shift += BITS
+        self._root = _vector_set(self._root, self._shift, self._size, value)
+        self._size += 1
+
+    def append(self, value):
+        vector = self._make(self._root, self._shift, self._size)
+        vector._append(value)
+        return vector
+
+    def set(self, idx, value):
+        """
+        Returns a new vector with `value` at position `idx`. `idx` may be
+        at most the current length (i.e., appending).
+        """
+        if idx < 0:
+            idx += self._size
+        if idx == self._size:
+            return self.append(value)
+        if not 0 <= idx < self._size:
+            raise IndexError(idx)
+        if self[idx] is value:
+            return self
+
+        root = _vector_set(self._root, self._shift, idx, value)
+        return self._make(root, self._shift, self._size)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return PersistentVector(list(self)[idx])
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError(idx)
+
+        node = self._root
+        shift = self._shift
+        while shift:
+            node = node[(idx >> shift) & MASK]
+            shift -= BITS
+        return node[idx & MASK]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return _vector_iter(self._root, self._shift)
+
+    def changed(self, other):
+        """
+        Returns the positions at which this vector and another one hold
+        different objects (by identity). Only the parts of the two that
+        are not shared are compared.
+        """
+        if self._shift != other._shift:
+            return [
+                idx for idx in range(max(len(self), len(other)))
+                if idx >= len(self) or idx >= len(other) or
+                self[idx] is not other[idx]
+            ]
+        changed = []
+        _vector_changed(self._root, other._root, self._shift, 0, changed)
+        return changed
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Sequence) or len(self) != len(other):
+            return False
+        return all(mine == theirs for mine, theirs in zip(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (PersistentVector, (list(self),))
+
+    def __repr__(self):
+        return "PersistentVector({!r})".format(list(self))
+
+
+#
+# Map
+#
+
+class _Bitmap(object):
+    """
+    HAMT node: `entries` holds, in slot order, the slots flagged in
+    `bitmap`; each is either a (hash, key, value) leaf or a child node
+    """
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision(object):
+    """
+    HAMT node for (key, value) pairs whose keys share the same hash
+    """
+    __slots__ = ('hash', 'items')
+
+    def __init__(self, key_hash, items):
+        self.hash = key_hash
+        self.items = items
+
+
+_EMPTY_NODE = _Bitmap(0, ())
+
+
+def _entry_hash(entry):
+    if isinstance(entry, _Collision):
+        return entry.hash
+    return entry[0]
+
+
+def _merge(shift, entry, other_entry):
+    """
+    Builds the node holding two entries with different hashes
+    """
+    entry_slot = (_entry_hash(entry) >> shift) & MASK
+    other_slot = (_entry_hash(other_entry) >> shift) & MASK
+    if entry_slot == other_slot:
+        return _Bitmap(
+            1 << entry_slot, (_merge(shift + BITS, entry, other_entry),)
+        )
+    if entry_slot > other_slot:
+        entry, other_entry = other_entry, entry
+    return _Bitmap(
+        (1 << entry_slot) | (1 << other_slot), (entry, other_entry)
+    )
+
+
+def _map_items(node):
+    if isinstance(node, tuple):
+        yield node[1], node[2]
+    elif isinstance(node, _Collision):
+        for item in node.items:
+            yield item
+    else:
+        for entry in node.entries:
+            for item in _map_items(entry):
+                yield item
+
+
+def _map_changed(node, other, changed):
+    """
+    Adds to `changed` the keys for which the HAMT nodes `node` and `other`
+    (at the same level) hold different objects, skipping shared subtries
+    """
+    if node is other:
+        return
+    if isinstance(node, _Bitmap) and isinstance(other, _Bitmap):
+        for slot in range(WIDTH):
+            bit = 1 << slot
+            entry = other_entry = None
+            if node.bitmap & bit:
+                entry = node.entries[popcount(node.bitmap & (bit - 1))]
+            if other.bitmap & bit:
+                other_entry = other.entries[popcount(other.bitmap & (bit - 1))]
+            if entry is other_entry:
+                continue
+            if entry is not None and other_entry is not None and not (
+                    isinstance(entry, tuple) or isinstance(other_entry, tuple)
+            ):
+                _map_changed(entry, other_entry, changed)
+                continue
+            _items_changed(
+                _map_items(entry) if entry is not None else (),
+                _map_items(other_entry) if other_entry is not None else (),
+                changed
+            )
+        return
+    _items_changed(_map_items(node), _map_items(other), changed)
+
+
+def _items_changed(items, other_items, changed):
+    items = dict(items)
+    other_items = dict(other_items)
+    for key, value in items.items():
+        if other_items.get(key, _EMPTY_NODE) is not value:
+            changed.add(key)
+    for key in other_items:
+        if key not in items:
+            changed.add(key)
+
+
+def _map_get(node, key_hash, key, default):
+    shift = 0
+    while True:
+        if isinstance(node, _Collision):
+            if node.hash == key_hash:
+                for item_key, item_value in node.items:
+                    if item_key is key or item_key == key:
+                        return item_value
+            return default
+
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not node.bitmap & bit:
+            return default
+        entry = node.entries[popcount(node.bitmap & (bit - 1))]
+        if isinstance(entry, tuple):
+            if entry[0] == key_hash and (entry[1] is key or entry[1] == key):
+                return entry[2]
+            return default
+        node = entry
+        shift += BITS
+
+
+def _map_set(node, shift, key_hash, key, value):
+    """
+    Returns (new node, whether the key is new)
+    """
+    if isinstance(node, _Collision):
+        if node.hash != key_hash:
+            # push the collision node one level down
+            node = _Bitmap(1 << ((node.hash >> shift) & MASK), (node,))
+            return _map_set(node, shift, key_hash, key, value)
+
+        items = list(node.items)
+        for idx, (item_key, item_value) in enumerate(items):
+            if item_key is key or item_key == key:
+                if item_value is value:
+                    return node, False
+                items[idx] = (key, value)
+                return _Collision(key_hash, tuple(items)), False
+        items.append((key, value))
+        return _Collision(key_hash, tuple(items)), True
+
+    bit = 1 << ((key_hash >> shift) & MASK)
+    idx = popcount(node.bitmap & (bit - 1))
+    leaf = (key_hash, key, value)
+
+    if not node.bitmap & bit:
+        entries = node.entries[:idx] + (leaf,) + node.entries[idx:]
+        return _Bitmap(node.bitmap | bit, entries), True
+
+    entry = node.entries[idx]
+    added = True
+    if isinstance(entry, tuple):
+        if entry[0] == key_hash and (entry[1] is key or entry[1] == key):
+            if entry[2] is value:
+                return node, False
+            new_entry = leaf
+            added = False
+        elif entry[0] == key_hash:
+            new_entry = _Collision(key_hash, (entry[1:], (key, value)))
+        else:
+            new_entry = _merge(shift + BITS, entry, leaf)
+    else:
+        new_entry, added = _map_set(entry, shift + BITS, key_hash, key, value)
+        if new_entry is entry:
+            return node, False
+
+    entries = node.entries[:idx] + (new_entry,) + node.entries[idx + 1:]
+    return _Bitmap(node.bitmap, entries), added
+
+
+class PersistentMap(Mapping):
+    __slots__ = ('_root', '_keys')
+
+    def __init__(self, items=()):
+        self._root = _EMPTY_NODE
+        self._keys = PersistentVector()
+        if hasattr(items, 'items'):
+            items = items.items()
+        for key, value in items:
+            self._root, added = _map_set(
+                self._root, 0, hash(key), key, value
+            )
+            if added:
+                self._keys = self._keys.append(key)
+
+    def set(self, key, value):
+        """
+        Returns a new map with `key` set to `value`
+        """
+        root, added = _map_set(self._root, 0, hash(key), key, value)
+        if root is self._root:
+            return self
+
+        new_map = PersistentMap.__new__(PersistentMap)
+        new_map._root = root
+        new_map._keys = self._keys.append(key) if added else self._keys
+        return new_map
+
+    def get(self, key, default=None):
+        return _map_get(self._root, hash(key), key, default)
+
+    def __getitem__(self, key):
+        missing = _EMPTY_NODE
+        value = _map_get(self._root, hash(key), key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        missing = _EMPTY_NODE
+        return _map_get(self._root, hash(key), key, missing) is not missing
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def changed(self, other):
+        """
+        Returns the set of keys for which this map and another one hold
+        different objects (by identity), including keys only one of them
+        has. Only the parts of the two that are not shared are compared.
+        """
+        changed = set()
+        _map_changed(self._root, other._root, changed)
+        return changed
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return super(PersistentMap, self).__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # the trie holds the hashes of the keys, which need not be the same
+        # in another process (see PYTHONHASHSEED); rebuild it there instead
+        return (PersistentMap, (list(self.items()),))
+
+    def __repr__(self):
+        return "PersistentMap({!r})".format(dict(self.items()))
@@ -1,16 +1,75 @@
 import copy
+import importlib
+from itertools import islice
 import logging
+import pickle
 
+from calcifer import asts, optimize
+from calcifer.caching import LRUCache
+from calcifer.columnar import ColumnarPlan
 from calcifer.contexts import Context
+from calcifer.dedup import unique_branches
+from calcifer.executor import PolicyExecutor
+from calcifer.incremental import IncrementalPolicy
+from calcifer.limits import BranchLimit, LimitedResults, current as current_limit
+from calcifer.monads import Stream
 from calcifer.partial import Partial
-from calcifer.operators import unless_errors
+from calcifer.tree import DictPolicyNode
 
 logger = logging.getLogger(__name__)
 
 
+def locate_method(method):
+    """
+    Returns a (module name, qualified name) pair by which a policy method
+    may be found again, e.g. in another process
+    """
+    qualname = getattr(method, '__qualname__', method.__name__)
+    if '<locals>' in qualname:
+        raise pickle.PicklingError(
+            "Policy method {!r} is not defined at module or class "
+            "level".format(method)
+        )
+    return method.__module__, qualname
+
+
+def find_method(location):
+    """
+    Inverse of `locate_method`. Attributes are looked up without invoking
+    descriptors, so that the lookup does not rebind any policy's parent.
+    """
+    module_name, qualname = location
+    found = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        found = vars(found)[name]
+    if isinstance(found, BasePolicy):
+        return found.method
+    return found
+
+
+class PolicyPlan(object):
+    """
+    A compiled policy: the finalized policy rule for some policy binding
+    (method, `using()` args and includes), built once and run many times.
+    """
+    def __init__(self, policy_rule, key=None):
+        self.policy_rule = policy_rule
+        self.key = key
+
+    def run(self, partial):
+        return self.policy_rule.run(partial)
+
+    def __repr__(self):
+        return "<PolicyPlan {!r}>".format(self.policy_rule)
+
+
 class BasePolicy(object):
     ctx_class = Context
 
+    # compiled plans, shared by all policies and keyed by `plan_key`; the
+    # least recently used are dropped, for policies made on the fly
+    plans = LRUCache(maxsize=512)
+
     def __init__(self, *args, **kwargs):
         if len(args) == 1 and callable(args[0]):
             method = args[0]
@@ -18,6 +77,8 @@ class BasePolicy(object):
 
         self.includes = kwargs.get('includes', [])
         self.bind_ref = kwargs.get('bind_ref', False)
+        self.cache_plan = kwargs.get('cache_plan', False)
+        self.dedup = kwargs.get('dedup', False)
         self.args = []
 
     def __call__(self, method):
@@ -26,14 +87,47 @@ class BasePolicy(object):
         return self
 
     def __get__(self, obj, cls=None):
-        self.parent = obj
-        return self
+        return self.derive(parent=obj)
 
-    def using(self, *args):
-        new_self = copy.deepcopy(self)
-        new_self.args = args
+    def derive(self, **changes):
+        """
+        Returns a copy of this policy binding with `changes` to its
+        attributes, e.g. `parent`, `ref`, `args` or `includes`.
+
+        Bindings share everything else with the policy they derive from
+        (the parent object especially), so deriving one is O(1). Derive a
+        new binding rather than changing one in place.
+        """
+        new_self = self.__class__.__new__(self.__class__)
+        new_self.__dict__.update(self.__dict__)
+        new_self.__dict__.update(changes)
         return new_self
 
+    def __deepcopy__(self, memo):
+        new_self = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_self
+        new_self.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return new_self
+
+    def __getstate__(self):
+        """
+        Policies pickle their method by location and leave out the request
+        object. The parent (if any) must itself be picklable.
+        """
+        state = dict(self.__dict__)
+        state.pop('ref', None)
+        if 'method' in state:
+            state['method'] = locate_method(state['method'])
+        return state
+
+    def __setstate__(self, state):
+        if 'method' in state:
+            state['method'] = find_method(state['method'])
+        self.__dict__.update(state)
+
+    def using(self, *args):
+        return self.derive(args=args)
+
     def get_included_policy(self, policy_name):
         return getattr(self.parent, policy_name)
 
@@ -55,32 +149,296 @@ class BasePolicy(object):
 
         return Partial.from_obj(obj)
 
-    def run(self, obj):
-        new_self = copy.deepcopy(self)
+    def run(self, obj, limit=None, max_branches=None, strategy=None):
+        """
+        Run the policy against a request object, returning the list of
+        resolved results.
+
+        :param limit: Optional, the maximum number of results to produce.
+            With a limit, the policy is built on the lazy `Stream` monad, so
+            that it stops exploring once enough results are found.
+        :param max_branches: Optional, the maximum number of branches kept
+            alive at each step of the policy. With a cap, `run` returns
+            `LimitedResults`, flagged `truncated` if branches were dropped.
+        :param strategy: Optional, chooses the branches kept under
+            `max_branches` (see `calcifer.limits`)
+        """
+        if max_branches is not None:
+            branch_limit = BranchLimit(max_branches, strategy)
+            with branch_limit:
+                results = self.run(obj, limit=limit)
+            if branch_limit.truncated:
+                logger.warning(
+                    "Policy %r dropped %d branches over max_branches=%d",
+                    self, branch_limit.dropped, max_branches
+                )
+            return LimitedResults(results, branch_limit)
+
+        new_self = self.derive(ref=obj)
+        if limit is None:
+            plan = new_self.get_plan()
+            return new_self.run_plan(plan, obj)
+
+        plan = new_self.get_plan(monad=Stream)
+        return list(islice(new_self.iter_plan(plan, obj), limit))
+
+    def run_first(self, obj):
+        """
+        Returns the first resolved result for the request object, or None
+        if the policy has no results. Only as much of the policy is
+        explored as it takes to find the first result.
+        """
+        results = self.run(obj, limit=1)
+        if not results:
+            return None
+        return results[0]
+
+    def run_iter(self, obj):
+        """
+        Like `run`, but yields the resolved results as they are produced.
+        With a `ctx_class` whose monad is `Stream`, the policy's branches
+        are only explored as far as the results are consumed.
+        """
+        new_self = self.derive(ref=obj)
+        plan = new_self.get_plan()
+
+        for result in new_self.iter_plan(plan, obj):
+            yield result
+
+    def run_many(self, objs):
+        """
+        Run the policy for each of `objs`, yielding the list of results for
+        each in order. Unless the policy binds the request object, the
+        policy is copied and compiled only once for the whole batch.
+        """
+        plan = None
+        if not self.uses_ref:
+            plan = self.get_plan()
 
-        new_self.ref = obj
-        ctx = new_self.context
-        policy_rule = ctx.finalize()
+        for obj in objs:
+            new_self = self.derive(ref=obj)
+            if plan is None:
+                yield new_self.run_plan(new_self.compile(), obj)
+            else:
+                yield new_self.run_plan(plan, obj)
 
-        partial = new_self.initial_partial(obj)
-        results = [
-            new_self.resolve(final) for _, final in policy_rule.run(partial)
-        ]
+    def run_batch(self, objs):
+        """
+        Like `run_many`, but returns the list of results for all of `objs`
+        at once. Where the policy allows it, its leaf checks are evaluated
+        column by column over the batch, and its rules only run for the
+        records that fail them (see `calcifer.columnar`).
+        """
+        plan = ColumnarPlan.for_policy(self)
+        if plan is None:
+            return list(self.run_many(objs))
 
+        results = plan.run(self, objs)
+        logger.debug("%r", plan)
         return results
 
+    def incremental(self, max_runs=16):
+        """
+        Returns an `IncrementalPolicy` running the policy on request objects
+        that change a little at a time, e.g. a form after each field edit,
+        re-running only the rules that read what changed.
+
+        See `calcifer.incremental`
+        """
+        return IncrementalPolicy(self, max_runs=max_runs)
+
+    def run_parallel(self, objs, workers=None, chunksize=None):
+        """
+        Run the policy for each of `objs` across a pool of `workers`
+        processes, returning the list of results for each in order.
+
+        See `calcifer.executor.PolicyExecutor`
+        """
+        with PolicyExecutor(workers=workers, chunksize=chunksize) as executor:
+            return list(executor.run(self, objs))
+
+    def run_plan(self, plan, obj):
+        """
+        Run a compiled plan against a request object and resolve each
+        final partial
+        """
+        return list(self.iter_plan(plan, obj))
+
+    def iter_plan(self, plan, obj):
+        """
+        Lazily run a compiled plan against a request object, yielding each
+        resolved final partial. With `dedup=True`, equivalent final
+        partials are only resolved once (see `calcifer.dedup`).
+        """
+        partial = self.initial_partial(obj)
+        results = plan.run(partial)
+        if self.dedup:
+            results = unique_branches(results, ignore_values=True)
+
+        branch_limit = current_limit()
+        if branch_limit is not None:
+            results = branch_limit.truncate(results)
+        for _, final in results:
+            yield self.resolve(final)
+
     def include(self, other):
-        new_self = copy.deepcopy(self)
-        new_self.includes.append(other)
-        return new_self
+        return self.derive(includes=list(self.includes) + [other])
 
     @staticmethod
     def resolve(final):
         return final
 
+    def get_included_policies(self):
+        policies = []
+        for policy_or_name in self.includes:
+            if isinstance(policy_or_name, str) and hasattr(self, 'parent'):
+                policy = self.get_included_policy(policy_or_name)
+            else:
+                policy = policy_or_name
+            policies.append(policy)
+        return policies
+
+    @property
+    def uses_ref(self):
+        """
+        Whether the policy rule depends on the request object, either
+        directly (`bind_ref=True`) or through some included policy
+        """
+        if self.bind_ref:
+            return True
+        if not getattr(self, 'parent', None):
+            return False
+        return any(
+            policy.uses_ref for policy in self.get_included_policies()
+        )
+
+    @property
+    def plan_key(self):
+        """
+        Identifies the policy binding a compiled plan was built for, or
+        None if the binding cannot be cached (it depends on the request
+        object, or its args are unhashable)
+        """
+        if self.uses_ref:
+            return None
+
+        includes = []
+        for policy_or_name in self.includes:
+            if isinstance(policy_or_name, BasePolicy):
+                policy_key = policy_or_name.plan_key
+                if policy_key is None:
+                    return None
+                includes.append(policy_key)
+            else:
+                includes.append(policy_or_name)
+
+        key = (
+            self.__class__,
+            getattr(self, 'method', None),
+            type(getattr(self, 'parent', None)),
+            tuple(self.args),
+            tuple(includes),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get_plan_key(self, monad=None):
+        """
+        The key for the plan compiled for `monad`, see `plan_key`, with
+        the optimisations and ASTs enabled or not on the current thread
+        """
+        key = self.plan_key
+        if key is None:
+            return None
+        return key + (monad, optimize.is_enabled(), asts.is_enabled())
+
+    def compile(self, monad=None):
+        """
+        Build the context for the policy and finalize it into a plan
+
+        :param monad: Optional, the monad to build the policy rules for,
+            instead of the `ctx_class` default
+        """
+        return PolicyPlan(
+            self.get_context(monad).finalize(),
+            key=self.get_plan_key(monad)
+        )
+
+    def get_plan(self, monad=None):
+        """
+        Retrieve the compiled plan for the policy. With `cache_plan=True`,
+        plans are compiled once per policy binding and reused by later
+        runs; policies that bind the request object are always compiled
+        fresh.
+
+        Caching assumes the policy method builds the same rules for a given
+        binding, i.e. it does not depend on anything but its args.
+        """
+        if not self.cache_plan:
+            return self.compile(monad)
+
+        key = self.get_plan_key(monad)
+        if key is None:
+            return self.compile(monad)
+
+        plans = BasePolicy.plans
+        plan = plans.get(key)
+        if plan is None:
+            logger.debug("compiling plan for key: %r", key)
+            plan = self.compile(monad)
+            plans.set(key, plan)
+        return plan
+
+    def invalidate_plans(self):
+        """
+        Discard any compiled plans for this policy's method, for all
+        args and includes
+        """
+        method = getattr(self, 'method', None)
+        plans = BasePolicy.plans
+        for key in plans.keys():
+            if key[1] is method:
+                plans.discard(key)
+
+    @staticmethod
+    def clear_plans():
+        """
+        Discard all compiled plans
+        """
+        BasePolicy.plans.clear()
+
     @property
     def context(self):
+        return self.get_context()
+
+    def get_context(self, monad=None, included=None):
+        """
+        Build the context for the policy, with its included policies
+        finalized into it
+
+        :param included: Optional, a dict in which finalized included
+            policies are shared by `plan_key`; see `finalize_included`
+        """
+        if included is None:
+            included = {}
+
+        ctx = self.get_method_context(monad)
+        if getattr(self, 'parent', None):
+            for policy in self.get_paired_included_policies():
+                ctx.append(policy.finalize_included(monad, included))
+        return ctx
+
+    def get_method_context(self, monad=None):
+        """
+        Build the context for the policy method alone, without its
+        included policies
+        """
         ctx_class = self.__class__.ctx_class
+        if monad is not None:
+            ctx_class = ctx_class.for_monad(monad)
         ctx = ctx_class(
             name=getattr(self.method, "__name__", None)
         )
@@ -93,19 +451,53 @@ class BasePolicy(object):
             # TODO this is a codesmell
             logger.debug("context name: %s", ctx.ctx_name)
             if ctx.ctx_name == 'endpoint_policy':
+                unless_errors = ctx.operators.unless_errors
                 ctx.wrapper = lambda policy_rules: unless_errors(*policy_rules)
-
-            includes = copy.copy(self.includes)
-            for policy_or_name in includes:
-                if isinstance(policy_or_name, str) and hasattr(self, 'parent'):
-                    policy = self.get_included_policy(policy_or_name)
-                else:
-                    policy = policy_or_name
-                self.pair_included_policy(policy)  # copy ref and args, e.g.
-                ctx.append(policy.context.finalize())
         return ctx
 
+    def get_paired_included_policies(self):
+        """
+        The included policies, each bound to this policy's ref and args
+        """
+        policies = []
+        for policy in self.get_included_policies():
+            policy = policy.derive()
+            self.pair_included_policy(policy)  # copy ref and args, e.g.
+            policies.append(policy)
+        return policies
+
+    def finalize_included(self, monad=None, included=None):
+        """
+        The finalized policy rule for this policy, as included in another.
+
+        Included policies with the same binding (see `plan_key`) and parent
+        share one finalized rule per `included` dict, so a policy included
+        in several places of a composed policy is only built once. With
+        `cache_plan=True`, the rule comes from the compiled plan.
+        """
+        key = self.get_plan_key(monad)
+        if key is None:
+            return self.get_context(monad, included).finalize()
+
+        key += (id(getattr(self, 'parent', None)),)
+        if included is not None and key in included:
+            return included[key]
+
+        if self.cache_plan:
+            policy_rule = self.get_plan(monad).policy_rule
+        else:
+            policy_rule = self.get_context(monad, included).finalize()
+
+        if included is not None:
+            included[key] = policy_rule
+        return policy_rule
+
 
 class DefaultPolicy(BasePolicy):
     def resolve(self, final):
-        return {k: v for k, v in final.root.items() if k != 'context'}
+        root = final.root_node
+        if not isinstance(root, DictPolicyNode):
+            return {k: v for k, v in final.root.items() if k != 'context'}
+        return {
+            k: node.value for k, node in root.nodes.items() if k != 'context'
+        }
@@ -8,14 +8,47 @@ which are known to exist but undefined beyond that.
 Ultimately, the policy tree contains *definitions*, a higher-level abstraction
 on "value": LeafPolicyNode uses the property `definition`, which may compare
 to specific values or generate a template for procuring the value.
+
+The tree is persistent: dict and list nodes are backed by the structure-
+sharing collections in `calcifer.persistent`, and "changing" a node means
+building a new one that shares all unchanged children (and most of its own
+internal structure) with the old.
+
+Nodes are also hash-consed: `interned()` returns the canonical instance of
+a node, shared by all structurally identical subtrees (see
+`calcifer.interning`). Nodes built from objects and the nodes derived from
+them are interned along the way, so that the branches of a search share
+their subtrees, compare by identity when identical, and hash in O(1).
+Interned nodes are immutable.
 """
 from abc import ABCMeta, abstractmethod
 import logging
 
+import six
+
 from calcifer.definitions import Value
+from calcifer.interning import InternTable
+from calcifer.persistent import PersistentMap, PersistentVector
 
 logger = logging.getLogger(__name__)
 
+nodes_table = InternTable()
+
+# cached in place of a structural hash when some definition is unhashable
+_UNHASHABLE = object()
+
+
+def _hashes_differ(node, other):
+    """
+    Whether two nodes are known to differ, judging by their cached hashes
+    """
+    node_hash, other_hash = node._hash, other._hash
+    return (
+        isinstance(node_hash, six.integer_types) and
+        isinstance(other_hash, six.integer_types) and
+        node_hash != other_hash
+    )
+
 
 class PolicyNode:
     """
@@ -23,6 +56,74 @@ class PolicyNode:
     """
     __metaclass__ = ABCMeta
 
+    _hash = None
+    _interned = False
+
+    def structural_hash(self):
+        """
+        Returns the hash of the subtree (cached), or None if some of its
+        definitions cannot be hashed
+        """
+        if self._hash is None:
+            self._hash = self._compute_hash()
+        if self._hash is _UNHASHABLE:
+            return None
+        return self._hash
+
+    def _compute_hash(self):
+        raise NotImplementedError
+
+    def _updated_hash(self, step, old_node, new_node):
+        """
+        Derives the hash of a copy of this (container) node, with
+        `new_node` in place of `old_node` at the given step
+        """
+        if self._hash is None or self._hash is _UNHASHABLE:
+            return None
+        new_hash = new_node.structural_hash()
+        if new_hash is None:
+            return _UNHASHABLE
+        node_hash = self._hash ^ hash((step, new_hash))
+        if old_node is not None:
+            node_hash ^= hash((step, old_node.structural_hash()))
+        return node_hash
+
+    def interned(self):
+        """
+        Returns the canonical instance of this node, or the node itself if
+        it cannot be interned
+        """
+        return self
+
+    def _intern(self):
+        canonical = nodes_table.intern(self, hash(self), type(self)._same)
+        canonical._interned = True
+        return canonical
+
+    def _intern_shallow(self):
+        """
+        Interns a container node if its children are interned already
+        """
+        if all(node._interned for node in self._children()):
+            return self._intern()
+        return self
+
+    def __hash__(self):
+        node_hash = self.structural_hash()
+        if node_hash is None:
+            raise TypeError("unhashable definition in {!r}".format(self))
+        return node_hash
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getstate__(self):
+        # cached hashes do not survive hash randomization across processes
+        state = dict(self.__dict__)
+        state.pop('_hash', None)
+        state.pop('_interned', None)
+        return state
+
     @abstractmethod
     def get_template(self):
         """
@@ -58,14 +159,15 @@ class PolicyNode:
     def choose(self, step):
         """
         Moves down the given step and returns:
-        (the chosen node, the new version of itself (list or dict), and a dict of the steps not taken)
+        (the chosen node, the new version of itself (list or dict))
         """
-        return (None, None, {})
+        return (None, None)
 
     @abstractmethod
-    def reconstruct(self, possible_steps):
+    def set_child(self, step, node):
         """
-        This method takes in a dictionary of possible steps that could be taken and returns a node object
+        Returns a new version of this node with `node` at the given step,
+        sharing all other children with this one
         """
         raise NotImplementedError
 
@@ -79,10 +181,10 @@ class PolicyNode:
         if isinstance(obj, PolicyNode):
             return obj
         if isinstance(obj, dict):
-            return DictPolicyNode(**obj)
+            return DictPolicyNode(**obj)._intern_shallow()
         if isinstance(obj, list):
-            return ListPolicyNode(*obj)
-        return LeafPolicyNode(Value(obj))
+            return ListPolicyNode(*obj)._intern_shallow()
+        return LeafPolicyNode(Value(obj)).interned()
 
 
 class UnknownPolicyNode(PolicyNode):
@@ -93,7 +195,7 @@ class UnknownPolicyNode(PolicyNode):
     def value(self):
         return None
 
-    def reconstruct(self, possible_steps):
+    def set_child(self, step, node):
         raise TypeError
 
     def get_template(self):
@@ -101,12 +203,10 @@ class UnknownPolicyNode(PolicyNode):
 
     def choose(self, step):
         if isinstance(step, int):
-            new_self = ListPolicyNode()
-            steps_not_taken = {k: UnknownPolicyNode() for k in range(step)}
+            new_self = ListPolicyNode().interned()
         else:
-            new_self = DictPolicyNode()
-            steps_not_taken = {}
-        return (UnknownPolicyNode(), new_self, steps_not_taken)
+            new_self = DictPolicyNode().interned()
+        return (UNKNOWN, new_self)
 
     def select(self, path=None):
         if not path:
@@ -118,10 +218,22 @@ class UnknownPolicyNode(PolicyNode):
 
         value, subpolicy = UnknownPolicyNode().select(rest)
 
-        return value, DictPolicyNode(**{first: subpolicy})
+        return value, DictPolicyNode().set_child(first, subpolicy)
 
     def match(self, value):
-        return True, LeafPolicyNode(Value(value))
+        return True, LeafPolicyNode(Value(value)).interned()
+
+    def _compute_hash(self):
+        return hash(UnknownPolicyNode)
+
+    def interned(self):
+        if self._interned:
+            return self
+        return self._intern()
+
+    @staticmethod
+    def _same(node, other):
+        return type(node) is type(other)
 
     def __repr__(self):
         return "UnknownPolicyNode()"
@@ -129,6 +241,8 @@ class UnknownPolicyNode(PolicyNode):
     def __eq__(self, other):
         return isinstance(other, UnknownPolicyNode)
 
+    __hash__ = PolicyNode.__hash__
+
 
 class LeafPolicyNode(PolicyNode):
     def __init__(self, definition=None):
@@ -142,10 +256,8 @@ class LeafPolicyNode(PolicyNode):
     def value(self):
         return self._definition.value
 
-    def reconstruct(self, possible_steps):
-        if possible_steps:
-            raise TypeError
-        return self.__class__(self._definition)
+    def set_child(self, step, node):
+        raise TypeError
 
     def get_template(self):
         return self.definition.get_template()
@@ -166,7 +278,32 @@ class LeafPolicyNode(PolicyNode):
 
     def match(self, value):
         matches, new_definition = self.definition.match(value)
-        return matches, LeafPolicyNode(new_definition)
+        if new_definition is self._definition:
+            return matches, self
+        return matches, LeafPolicyNode(new_definition).interned()
+
+    def _compute_hash(self):
+        try:
+            return hash((LeafPolicyNode, self._definition))
+        except TypeError:
+            return _UNHASHABLE
+
+    def interned(self):
+        if self._interned or self._definition is None:
+            return self
+        definition = self._definition.interned()
+        if not definition._interned:
+            return self
+        if definition is self._definition:
+            return self._intern()
+        return LeafPolicyNode(definition)._intern()
+
+    @staticmethod
+    def _same(node, other):
+        return (
+            type(node) is type(other) and
+            node._definition is other._definition
+        )
 
     def __repr__(self):
         return (
@@ -176,18 +313,32 @@ class LeafPolicyNode(PolicyNode):
         ).format(definition=self.definition)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             isinstance(other, LeafPolicyNode) and
+            not _hashes_differ(self, other) and
             other.definition == self.definition
         )
 
+    __hash__ = PolicyNode.__hash__
+
 
 class DictPolicyNode(PolicyNode):
     def __init__(self, **nodes):
-        self._nodes = {
-            k: PolicyNode.from_obj(v)
+        self._nodes = PersistentMap(
+            (k, PolicyNode.from_obj(v))
             for k, v in nodes.items()
-        }
+        )
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Builds the node directly from a PersistentMap of nodes
+        """
+        new_node = cls.__new__(cls)
+        new_node._nodes = nodes
+        return new_node
 
     @property
     def nodes(self):
@@ -204,14 +355,19 @@ class DictPolicyNode(PolicyNode):
             for name, node in self.nodes.items()
         }
 
-    def reconstruct(self, possible_steps):
-        return DictPolicyNode(**possible_steps)
+    def set_child(self, step, node):
+        nodes = self._nodes.set(step, node)
+        if nodes is self._nodes:
+            return self
+        new_node = DictPolicyNode.from_nodes(nodes)
+        new_node._hash = self._updated_hash(step, self._nodes.get(step), node)
+        if self._interned and node._interned:
+            return new_node._intern()
+        return new_node
 
     def choose(self, step):
-        chosen_node = self._nodes.get(step, UnknownPolicyNode())
-        new_self = self
-        steps_not_taken = {k: v for k, v in self._nodes.items() if k != step}
-        return chosen_node, new_self, steps_not_taken
+        chosen_node = self[step]
+        return chosen_node, self
 
     def get_template(self):
         return {
@@ -226,39 +382,89 @@ class DictPolicyNode(PolicyNode):
         rest = path[1:]
 
         node, new_first = self[first].select(rest)
-        new_nodes = {k: v for k, v in self.nodes.items()}
-        new_nodes[first] = new_first
 
-        return node, DictPolicyNode(**new_nodes)
+        return node, self.set_child(first, new_first)
 
     def match(self, value):
         return False, self
 
+    def _children(self):
+        return self._nodes.values()
+
+    def _compute_hash(self):
+        node_hash = hash(DictPolicyNode)
+        for step, node in self._nodes.items():
+            child_hash = node.structural_hash()
+            if child_hash is None:
+                return _UNHASHABLE
+            node_hash ^= hash((step, child_hash))
+        return node_hash
+
+    def interned(self):
+        if self._interned:
+            return self
+        nodes = self._nodes
+        for step, node in self._nodes.items():
+            canonical = node.interned()
+            if not canonical._interned:
+                return self
+            nodes = nodes.set(step, canonical)
+        if nodes is self._nodes:
+            return self._intern()
+        return DictPolicyNode.from_nodes(nodes)._intern()
+
+    @staticmethod
+    def _same(node, other):
+        nodes, other_nodes = node._nodes, other._nodes
+        return (
+            type(node) is type(other) and
+            len(nodes) == len(other_nodes) and
+            all(other_nodes.get(step) is child for step, child in nodes.items())
+        )
+
     def __setitem__(self, key, node):
-        self._nodes[key] = node
+        if self._interned:
+            raise TypeError("Interned nodes are immutable")
+        self._nodes = self._nodes.set(key, node)
+        self._hash = None
 
     def __getitem__(self, key):
-        if key not in self._nodes:
-            return UnknownPolicyNode()
-        return self._nodes[key]
+        node = self._nodes.get(key)
+        if node is None:
+            return UNKNOWN
+        return node
 
     def __repr__(self):
         args = ['{}={}'.format(k, v) for k, v in self.nodes.items()]
         return "DictPolicyNode({})".format(", ".join(args))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             isinstance(other, DictPolicyNode) and
+            not _hashes_differ(self, other) and
             other.nodes == self.nodes
         )
 
+    __hash__ = PolicyNode.__hash__
+
 
 class ListPolicyNode(PolicyNode):
     def __init__(self, *nodes):
-        self._nodes = [
+        self._nodes = PersistentVector(
             PolicyNode.from_obj(v)
             for v in nodes
-        ]
+        )
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Builds the node directly from a PersistentVector of nodes
+        """
+        new_node = cls.__new__(cls)
+        new_node._nodes = nodes
+        return new_node
 
     @property
     def nodes(self):
@@ -275,26 +481,27 @@ class ListPolicyNode(PolicyNode):
             for node in self.nodes
         ]
 
-    def reconstruct(self, possible_steps):
-        if not possible_steps:
-            return ListPolicyNode()
-        highest_key = sorted(possible_steps.keys(), reverse=True)[0]
-        return ListPolicyNode(*[
-            possible_steps.get(i, UnknownPolicyNode())
-            for i in range(highest_key + 1)
-        ])
+    def set_child(self, step, node):
+        step = int(step)
+        nodes = self._nodes
+        filled = len(nodes) < step
+        # populate the list with UnknownPolicyNodes up to step
+        while len(nodes) < step:
+            nodes = nodes.append(UNKNOWN)
+        old_node = nodes[step] if step < len(nodes) else None
+        nodes = nodes.set(step, node)
+        if nodes is self._nodes:
+            return self
+        new_node = ListPolicyNode.from_nodes(nodes)
+        if not filled:
+            new_node._hash = self._updated_hash(step, old_node, node)
+        if self._interned and node._interned:
+            return new_node._intern()
+        return new_node
 
     def choose(self, step):
-        if len(self._nodes) > step:
-            # We have the step for sure
-            chosen_node = self._nodes[step]
-        else:
-            # step does not exist yet, must populate list with UnknownPolicyNodes
-            chosen_node = UnknownPolicyNode()
-
-        new_self = self
-        steps_not_taken = {i: self._nodes[i] for i in range(len(self._nodes)) if i != step}
-        return chosen_node, new_self, steps_not_taken
+        chosen_node = self[step]
+        return chosen_node, self
 
     def get_template(self):
         return [
@@ -310,33 +517,101 @@ class ListPolicyNode(PolicyNode):
         rest = path[1:]
 
         node, new_first = self[first].select(rest)
-        new_nodes = [v for v in self.nodes]
-        new_nodes[first] = new_first
 
-        return node, ListPolicyNode(*new_nodes)
+        return node, self.set_child(first, new_first)
 
     def match(self, value):
         return False, self
 
+    def _children(self):
+        return self._nodes
+
+    def _compute_hash(self):
+        node_hash = hash(ListPolicyNode)
+        for step, node in enumerate(self._nodes):
+            child_hash = node.structural_hash()
+            if child_hash is None:
+                return _UNHASHABLE
+            node_hash ^= hash((step, child_hash))
+        return node_hash
+
+    def interned(self):
+        if self._interned:
+            return self
+        nodes = self._nodes
+        for step, node in enumerate(self._nodes):
+            canonical = node.interned()
+            if not canonical._interned:
+                return self
+            nodes = nodes.set(step, canonical)
+        if nodes is self._nodes:
+            return self._intern()
+        return ListPolicyNode.from_nodes(nodes)._intern()
+
+    @staticmethod
+    def _same(node, other):
+        nodes, other_nodes = node._nodes, other._nodes
+        return (
+            type(node) is type(other) and
+            len(nodes) == len(other_nodes) and
+            all(child is other_child
+                for child, other_child in zip(nodes, other_nodes))
+        )
+
     def __setitem__(self, key, node):
-        key = int(key)
-        sparsity = key - len(self._nodes) + 1
-        self._nodes.extend([UnknownPolicyNode()] * sparsity)
-        self._nodes[key] = node
+        if self._interned:
+            raise TypeError("Interned nodes are immutable")
+        self._nodes = self.set_child(key, node)._nodes
+        self._hash = None
 
     def __getitem__(self, key):
         try:
             key = int(key)
             return self._nodes[int(key)]
         except:
-            return UnknownPolicyNode()
+            return UNKNOWN
 
     def __repr__(self):
         args = ['{}'.format(v) for v in self.nodes]
         return "ListPolicyNode({})".format(", ".join(args))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             isinstance(other, ListPolicyNode) and
+            not _hashes_differ(self, other) and
             other.nodes == self.nodes
         )
+
+    __hash__ = PolicyNode.__hash__
+
+
+# the canonical unknown node, returned for missing children
+UNKNOWN = UnknownPolicyNode().interned()
+
+
+def changed_steps(node, other):
+    """
+    Returns the steps at which two dict (or two list) nodes have different
+    children (by identity), or None if they are not the same kind of node
+    """
+    if node is other:
+        return set()
+    if isinstance(node, DictPolicyNode) and isinstance(other, DictPolicyNode):
+        return node.nodes.changed(other.nodes)
+    if isinstance(node, ListPolicyNode) and isinstance(other, ListPolicyNode):
+        return set(node.nodes.changed(other.nodes))
+    return None
+
+
+def node_at(root, path):
+    """
+    The node at `path` under `root`, like `Partial.peek`
+    """
+    node = root
+    for step in path:
+        if not isinstance(node, (DictPolicyNode, ListPolicyNode)):
+            return UNKNOWN
+        node = node[step]
+    return node
@@ -1,7 +1,15 @@
 """
 HERE THERE BE DRAGONS
+
+A zipper is a focus on some node in the policy tree, plus the breadcrumbs
+needed to rebuild the tree around that node on the way back up.
+
+Zippers know their path, so moving between two paths (`move_to`) only
+climbs as far as their common prefix. They also remember the root they
+were focused from for as long as the tree is unchanged, so going "back to
+root" after a read-only descent costs nothing.
 """
-from calcifer.tree import UnknownPolicyNode
+from calcifer.tree import UNKNOWN, UnknownPolicyNode
 
 
 class Zipper(object):
@@ -9,25 +17,56 @@ class Zipper(object):
         """
         Initialize a zipper
         It takes two arguments:
-            - breadcrumbs is a list of Breadcrumb objects
+            - breadcrumbs is a list of Breadcrumb objects, most recent first
             - node is a PolicyNode
         """
-        self.breadcrumbs = breadcrumbs
         if node is None:
-            node = UnknownPolicyNode()
+            node = UNKNOWN
         self.node = node
 
+        # breadcrumbs are kept as a linked list of (breadcrumb, rest) pairs
+        crumbs = None
+        for breadcrumb in reversed(breadcrumbs):
+            crumbs = (breadcrumb, crumbs)
+        self.crumbs = crumbs
+
+        self.abs_path = tuple(reversed([
+            breadcrumb.step_taken for breadcrumb in breadcrumbs
+        ]))
+
+        # the root node, as long as it is known to be unchanged
+        self._root = node if not breadcrumbs else None
+
+    @classmethod
+    def _make(cls, crumbs, abs_path, node, root):
+        zipper = cls.__new__(cls)
+        zipper.crumbs = crumbs
+        zipper.abs_path = abs_path
+        zipper.node = node
+        zipper._root = root
+        return zipper
+
+    @property
+    def breadcrumbs(self):
+        breadcrumbs = []
+        crumbs = self.crumbs
+        while crumbs is not None:
+            breadcrumb, crumbs = crumbs
+            breadcrumbs.append(breadcrumb)
+        return breadcrumbs
+
     @property
     def root(self):
-        new_zipper = self
-        for _ in range(len(self.breadcrumbs)):
-            new_zipper = new_zipper.up()
-        return new_zipper
+        if self._root is None:
+            new_zipper = self
+            while new_zipper.crumbs is not None:
+                new_zipper = new_zipper.up()
+            self._root = new_zipper.node
+        return Zipper._make(None, (), self._root, self._root)
 
     @property
     def path(self):
-        mapped_crumbs = list(map(lambda breadcrumb: breadcrumb.step_taken, self.breadcrumbs))
-        return list(reversed(mapped_crumbs))
+        return list(self.abs_path)
 
     def select(self, path):
         new_zipper = self
@@ -35,31 +74,52 @@ class Zipper(object):
             new_zipper = new_zipper.down(step)
         return new_zipper
 
+    def move_to(self, path):
+        """
+        Re-focus the zipper on an absolute path, climbing only as far up
+        as the common prefix of the current path and `path`
+        """
+        path = tuple(path)
+        current = self.abs_path
+
+        common = 0
+        max_common = min(len(path), len(current))
+        while common < max_common and path[common] == current[common]:
+            common += 1
+
+        new_zipper = self
+        for _ in range(len(current) - common):
+            new_zipper = new_zipper.up()
+        return new_zipper.select(path[common:])
+
     def down(self, step):
-        chosen_node, new_node, steps_not_taken = self.node.choose(step)
-        new_breadcrumbs = [Breadcrumb(step, new_node, steps_not_taken)] + self.breadcrumbs
-        return Zipper(new_breadcrumbs, chosen_node)
+        chosen_node, new_node = self.node.choose(step)
+
+        root = self._root
+        if new_node is not self.node or isinstance(chosen_node, UnknownPolicyNode):
+            # descending fills in the tree, so the root will change
+            root = None
+
+        return Zipper._make(
+            (Breadcrumb(step, new_node), self.crumbs),
+            self.abs_path + (step,),
+            chosen_node,
+            root
+        )
 
     def set_node(self, node):
-        return Zipper(self.breadcrumbs, node)
+        root = self._root if node is self.node else None
+        return Zipper._make(self.crumbs, self.abs_path, node, root)
 
     def up(self):
-        first = self.breadcrumbs[0]
-        rest = self.breadcrumbs[1:]
-
-        possible_steps = {first.step_taken: self.node}
-        possible_steps.update(first.steps_not_taken)
+        first, rest = self.crumbs
 
-        empty_parent = first.from_node
-        new_node = empty_parent.reconstruct(possible_steps)
+        new_node = first.from_node.set_child(first.step_taken, self.node)
 
-        return Zipper(rest, new_node)
+        return Zipper._make(rest, self.abs_path[:-1], new_node, self._root)
 
 
 class Breadcrumb(object):
-    def __init__(self, step_taken, from_node, steps_not_taken=None):
+    def __init__(self, step_taken, from_node):
         self.step_taken = step_taken
         self.from_node = from_node
-        if steps_not_taken is None:
-            steps_not_taken = {}
-        self.steps_not_taken = steps_not_taken
@@ -19,6 +19,7 @@ setup(
     include_package_data=True,
     long_description=codecs.open('README.rst', encoding='utf-8').read(),
     install_requires=read_requirements_file('requirements.txt'),
+    extras_require={'columnar': ['numpy']},
     tests_require=read_requirements_file('requirements-tests.txt'),
     test_suite='nose.collector',
     author='DramaFever',
@@ -0,0 +1,10 @@
+def described(results):
+    """
+    The resolved `results` of a policy run, with the context frames of
+    their errors replaced by their reprs: frames compare by identity, so
+    results are compared by how their frames read instead
+    """
+    for result in results:
+        for error in result.get('errors', []):
+            error['context'] = [repr(frame) for frame in error['context']]
+    return results
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from calcifer.caching import (
+    LRUCache, SQLiteCache, freeze, key_digest, lru_cached,
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+
+        # "b" is now least recently used
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(len(cache), 2)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_cached(self):
+        calls = []
+
+        @lru_cached(maxsize=8)
+        def double(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual([double(1), double(2), double(1)], [2, 4, 2])
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(double.cache.hits, 1)
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        clock.now = 5
+        self.assertEqual(cache.get("a"), 1)
+
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class SQLiteCacheTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "memo.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shared(self):
+        clock = FakeClock()
+        cache = SQLiteCache(self.path, ttl=10, clock=clock)
+        key = freeze(({"a": [1, 2]}, "b"))
+        cache.set(key, {"result": [3]})
+
+        # another process' view of the same file
+        other = SQLiteCache(self.path, clock=clock)
+        self.assertIn(key, other)
+        self.assertEqual({"result": [3]}, other.get(key))
+        self.assertIsNone(other.get(freeze(({"a": [2, 1]}, "b"))))
+        self.assertEqual((other.hits, other.misses), (1, 1))
+
+        clock.now = 10
+        self.assertIsNone(other.get(key))
+
+        other.clear()
+        self.assertEqual(0, len(cache))
+
+
+class FreezeTestCase(TestCase):
+    def test_freeze(self):
+        obj = {"a": [1, {"b": set([2])}], "c": (3, 4)}
+        same = {"c": (3, 4), "a": [1, {"b": set([2])}]}
+        self.assertEqual(hash(freeze(obj)), hash(freeze(same)))
+        self.assertEqual(freeze(obj), freeze(same))
+        self.assertEqual(key_digest(freeze(obj)), key_digest(freeze(same)))
+
+        self.assertNotEqual(freeze([1, 2]), freeze((1, 2)))
+        self.assertNotEqual(freeze({"a": 1}), freeze([("a", 1)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
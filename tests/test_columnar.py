@@ -0,0 +1,109 @@
+# pylint: disable=no-self-argument
+import copy
+import unittest
+from unittest import TestCase
+
+from calcifer import columnar
+from calcifer.columnar import ColumnarPlan
+from calcifer.policy import DefaultPolicy
+
+from tests.helpers import described
+
+
+class Imports(object):
+    @DefaultPolicy
+    def client_policy(ctx):
+        ctx.select("/client").whitelist_values(["ios", "android"])
+
+    @DefaultPolicy(includes=['client_policy'])
+    def import_policy(ctx):
+        ctx.select("/sender").require()
+        ctx.select("/internal").forbid()
+        address = ctx.select("/address")
+        address.require()
+        address.select("zip").require()
+        ctx.select("/meta/source").forbid()
+
+    @DefaultPolicy
+    def nested_policy(ctx):
+        sender = ctx.select("/sender")
+        # the subcontext's value is not the node at /sender
+        sender.subctx().require()
+        ctx.select("/client").whitelist_values(["ios", "android"])
+
+    @DefaultPolicy
+    def forking_policy(ctx):
+        ctx.select("/client").whitelist_values(["ios", "android"])
+        ctx.select("/sender").set_value("someone")
+
+
+RECORDS = [
+    {"client": "ios", "sender": "me", "address": {"zip": "10001"}},
+    {"client": "android", "sender": "you", "address": {"zip": "94110"},
+     "meta": {}},
+    {"client": "ios", "sender": "me", "address": {"zip": None}},
+    {"client": "ios", "sender": "me", "address": {"street": "Main"}},
+    {"client": "ios", "sender": "me", "address": {}},
+    {"client": "web", "sender": "me", "address": {"zip": "10001"}},
+    {"sender": "me", "address": {"zip": "10001"}},
+    {"client": "ios", "address": {"zip": "10001"}},
+    {"client": "ios", "sender": "me", "address": {"zip": "1"},
+     "internal": True},
+    {"client": "ios", "sender": "me", "address": {"zip": "1"},
+     "meta": {"source": "csv"}},
+    {"client": "ios", "sender": "me", "address": {"zip": "1"},
+     "context": []},
+    {},
+]
+
+
+class ColumnarTestCase(TestCase):
+    def setUp(self):
+        self.numpy = columnar.numpy
+
+    def tearDown(self):
+        columnar.numpy = self.numpy
+
+    def assertSameResults(self, policy, records):
+        expected = [
+            described(policy.run(copy.deepcopy(record)))
+            for record in records
+        ]
+        actual = [
+            described(results)
+            for results in policy.run_batch(copy.deepcopy(records))
+        ]
+        self.assertEqual(expected, actual)
+
+    def test_same_results(self):
+        policy = Imports().import_policy
+        self.assertSameResults(policy, RECORDS)
+
+        columnar.numpy = None
+        self.assertSameResults(policy, RECORDS)
+
+    def test_plan(self):
+        plan = ColumnarPlan.for_policy(Imports().import_policy)
+        self.assertIsNotNone(plan)
+        kinds = [check.__class__.__name__ for check in plan.checks]
+        self.assertIn("WhitelistCheck", kinds)
+        # selecting /address/zip fills in a missing /address
+        self.assertIn("ExistsCheck", kinds)
+
+        plan.run(Imports().import_policy, copy.deepcopy(RECORDS))
+        self.assertEqual(3, plan.checked)
+        self.assertEqual(len(RECORDS) - 3, plan.interpreted)
+
+    def test_subcontext_checks(self):
+        policy = Imports().nested_policy
+        self.assertIsNone(ColumnarPlan.for_policy(policy))
+        self.assertSameResults(policy, RECORDS)
+
+    def test_not_planned(self):
+        policy = Imports().forking_policy
+        self.assertIsNone(ColumnarPlan.for_policy(policy))
+        self.assertSameResults(policy, [{"client": "ios"}, {}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ import logging
 import unittest
 from unittest import TestCase
 
+from calcifer.caching import LRUCache
 from calcifer.utils import run_policy
 
 from calcifer.contexts.base import Incomplete
@@ -12,7 +13,7 @@ from calcifer.contexts import (
 )
 
 from calcifer import (
-    regarding, set_value, unit,
+    Partial, regarding, set_value, unit,
 
     asts, PolicyRule
 )
@@ -161,6 +162,64 @@ class ContextTestCase(TestCase):
         self.assertEqual(error["scope"], "/dict/b")
         self.assertEqual(error["message"], "Value is required.")
 
+    def test_each_parallel(self):
+        def make_policy(parallel, writes_total=False):
+            ctx = Context(name="root")
+            item = ctx.select("/items").each(parallel=parallel)
+            item.select("sku").require()
+            item.select("qty").whitelist_values([1, 2])
+            if writes_total:
+                item.select("/total").set_value(1)
+            return ctx.finalize()
+
+        def run(policy, obj):
+            roots = [
+                partial.root
+                for _, partial in policy.run(Partial.from_obj(obj)).getValue()
+            ]
+            # context frames compare by identity
+            for root in roots:
+                for error in root.get("errors", []):
+                    error["context"] = [
+                        repr(frame) for frame in error["context"]
+                    ]
+            return roots
+
+        obj = {"items": [
+            {"sku": "a", "qty": 1}, {"qty": 3}, {"sku": "b"}, {"qty": 4}
+        ]}
+        for writes_total in [False, True]:
+            expected = run(make_policy(False, writes_total), obj)
+            results = run(make_policy(True, writes_total), obj)
+            self.assertEqual(expected, results)
+
+        # the errors are in the same order as with the children in turn
+        errors = results[0]["errors"]
+        self.assertEqual(
+            ["/items/1/sku", "/items/3/sku", "/items/1/qty", "/items/3/qty"],
+            [error["scope"] for error in errors]
+        )
+
+    def test_each_parallel_reads_errors(self):
+        def make_policy(parallel):
+            ctx = Context(name="root")
+            item = ctx.select("/items").each(parallel=parallel).fail_early()
+            item.select("sku").require()
+            return ctx.finalize()
+
+        def errors(policy, obj):
+            results = policy.run(Partial.from_obj(obj)).getValue()
+            return [
+                [error["scope"] for error in partial.root.get("errors", [])]
+                for _, partial in results
+            ]
+
+        # the children read the errors the ones before them add
+        obj = {"items": [{"sku": None}, {"sku": None}, {}]}
+        expected = errors(make_policy(False), obj)
+        self.assertEqual([["/items/0/sku"]], expected)
+        self.assertEqual(expected, errors(make_policy(True), obj))
+
     def test_finalize(self):
         ctx = Context(name="root")
         a = ctx.select("/a")
@@ -176,6 +235,91 @@ class ContextTestCase(TestCase):
         result = run_policy(completed)
         self.assertEqual(result['b'], 5)
 
+    def test_finalize_cached(self):
+        ctx = Context(name="root")
+        a = ctx.select("/a")
+        a.set_value(1)
+        b = ctx.select("/b")
+
+        finalized = ctx.finalize()
+        self.assertIs(finalized, ctx.finalize())
+        self.assertIs(a.finalize(), a.finalize())
+
+        # changes anywhere within invalidate the cache
+        b.require()
+        refinalized = ctx.finalize()
+        self.assertIsNot(finalized, refinalized)
+        self.assertEqual(
+            "Value is required.",
+            run_policy(refinalized)["errors"][0]["message"]
+        )
+
+        # error handlers too
+        b.error_ctx().select("hint").set_value("B")
+        self.assertEqual("B", run_policy(ctx.finalize())["errors"][0]["hint"])
+
+        # as do contexts a context's wrapper is applied to
+        each_ctx = ctx.select("/list").each()
+        each_ctx.set_value(0)
+        finalized = ctx.finalize()
+        each_ctx.set_value(2)
+        self.assertIsNot(finalized, ctx.finalize())
+        result = run_policy(ctx.finalize(), {"list": [5, 6]})
+        self.assertEqual([2, 2], result["list"])
+
+    def test_memoized_apply(self):
+        calls = []
+
+        def lookup(value):
+            calls.append(value)
+            return value["n"] * 2
+
+        ctx = Context()
+        each_ctx = ctx.select("/items").each()
+        doubled_ctx = each_ctx.memoized_apply(lookup, each_ctx.value)
+        doubled_ctx.select("doubled").set_value(doubled_ctx.value)
+
+        obj = {"items": {"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 1}}}
+        result = run_policy(ctx.finalize(), obj)
+        self.assertEqual(
+            [2, 4, 2],
+            [result["items"][key]["doubled"] for key in ["a", "b", "c"]]
+        )
+        self.assertEqual(2, len(calls))
+        self.assertEqual((1, 2), (lookup.memo.hits, lookup.memo.misses))
+
+        # a memo shared by functions keeps their results apart
+        memo = LRUCache()
+
+        def triple(value):
+            return value * 3
+
+        def quadruple(value):
+            return value * 4
+
+        ctx = Context()
+        ctx.select("/a").memoized_apply(triple, 1, memo=memo)
+        triple_ctx = ctx.memoized_apply(triple, 1, memo=memo)
+        quadruple_ctx = ctx.memoized_apply(quadruple, 1, memo=memo)
+        triple_ctx.select("/triple").set_value(triple_ctx.value)
+        quadruple_ctx.select("/quadruple").set_value(quadruple_ctx.value)
+
+        result = run_policy(ctx.finalize())
+        self.assertEqual((3, 4), (result["triple"], result["quadruple"]))
+        self.assertEqual(2, len(memo))
+
+        # as does one shared by lambdas of the same scope
+        memo = LRUCache()
+        ctx = Context()
+        triple_ctx = ctx.memoized_apply(lambda v: v * 3, 1, memo=memo)
+        quadruple_ctx = ctx.memoized_apply(lambda v: v * 4, 1, memo=memo)
+        triple_ctx.select("/triple").set_value(triple_ctx.value)
+        quadruple_ctx.select("/quadruple").set_value(quadruple_ctx.value)
+
+        result = run_policy(ctx.finalize())
+        self.assertEqual((3, 4), (result["triple"], result["quadruple"]))
+        self.assertEqual(2, len(memo))
+
     def test_finalize_own_ctx_value(self):
         ctx = Context(name="root")
         a = ctx.select("/a")
@@ -0,0 +1,117 @@
+import threading
+import unittest
+from unittest import TestCase
+
+from pymonad import List
+
+from calcifer import (
+    Partial, match, permit_values, regarding, policies,
+)
+from calcifer import dedup
+from calcifer.monads import Stream
+from calcifer.operators import operators_for
+from calcifer.policy import DefaultPolicy
+from calcifer.tree import UNKNOWN
+
+
+def collapsing_rule(ops):
+    # each whitelist doubles the branches, which then converge again
+    return ops.policies(
+        ops.regarding("/a", ops.permit_values([1, 2]), ops.set_value(0)),
+        ops.regarding("/b", ops.permit_values([1, 2]), ops.set_value(0)),
+        ops.regarding("/c", ops.permit_values([1, 2])),
+    )
+
+
+class DedupTestCase(TestCase):
+    def setUp(self):
+        dedup.counter.reset()
+
+    def tearDown(self):
+        dedup.disable()
+
+    def test_disabled(self):
+        rule = collapsing_rule(operators_for(List))
+        results = rule.run(Partial()).getValue()
+        self.assertEqual(8, len(results))
+        self.assertEqual(0, dedup.counter.branches)
+
+    def test_enabled(self):
+        dedup.enable()
+        rule = collapsing_rule(operators_for(List))
+        results = rule.run(Partial()).getValue()
+
+        self.assertEqual(
+            [{"a": 0, "b": 0, "c": 1}, {"a": 0, "b": 0, "c": 2}],
+            [partial.root for _, partial in results]
+        )
+        self.assertEqual(2, dedup.counter.merged)
+
+    def test_per_thread(self):
+        dedup.enable()
+        counts = []
+
+        def run():
+            rule = collapsing_rule(operators_for(List))
+            counts.append(len(rule.run(Partial()).getValue()))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual([8], counts)
+        self.assertTrue(dedup.is_enabled())
+
+    def test_same(self):
+        self.assertFalse(dedup._same(UNKNOWN, None))
+        self.assertFalse(dedup._same(None, UNKNOWN))
+
+    def test_stream(self):
+        dedup.enable()
+        rule = collapsing_rule(operators_for(Stream))
+        results = rule.run(Partial())
+
+        self.assertEqual(2, len(results.getValue()))
+
+    def test_keeps_distinct_branches(self):
+        dedup.enable()
+        rule = policies(
+            regarding("/a", permit_values([1, True, 1.0])),
+        )
+        results = rule.run(Partial()).getValue()
+        self.assertEqual(
+            [1, True, 1.0], [partial.root["a"] for _, partial in results]
+        )
+        self.assertEqual(
+            [int, bool, float],
+            [type(partial.root["a"]) for _, partial in results]
+        )
+        self.assertEqual(0, dedup.counter.merged)
+
+    def test_unhashable_values(self):
+        dedup.enable()
+        rule = policies(
+            regarding("/b", match({"x": [1]})),
+            regarding("/a", permit_values([1, 1])),
+            regarding("/c", permit_values([1])),
+        )
+        self.assertEqual(2, len(rule.run(Partial()).getValue()))
+
+    def test_policy_option(self):
+        class HasPolicy(object):
+            @DefaultPolicy(dedup=True)
+            def deduped(ctx):
+                ctx.select("/a").whitelist_values([1, 2])
+                ctx.select("/a").set_value(0)
+
+            @DefaultPolicy
+            def not_deduped(ctx):
+                ctx.select("/a").whitelist_values([1, 2])
+                ctx.select("/a").set_value(0)
+
+        self.assertEqual(2, len(HasPolicy().not_deduped.run({})))
+        self.assertEqual(1, len(HasPolicy().deduped.run({})))
+        self.assertEqual(1, dedup.counter.merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
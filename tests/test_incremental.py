@@ -0,0 +1,126 @@
+# pylint: disable=no-self-argument
+import copy
+import unittest
+from unittest import TestCase
+
+from calcifer.partial import Partial, ReadLog
+from calcifer.policy import DefaultPolicy
+
+from tests.helpers import described
+
+
+class Forms(object):
+    @DefaultPolicy
+    def client_policy(ctx):
+        ctx.select("/client").whitelist_values(["ios", "android"])
+
+    @DefaultPolicy(includes=['client_policy'])
+    def form_policy(ctx):
+        name = ctx.select("/name").require()
+        name.error_ctx().select("code").set_value("NAME_REQUIRED")
+        ctx.select("/email").require()
+        address = ctx.select("/address")
+        address.select("zip").require()
+        ctx.select("/age").forbid()
+        items = ctx.select("/items")
+        items.each().select("qty").require()
+
+    @DefaultPolicy
+    def tags_policy(ctx):
+        ctx.select("/tags").append_value("new")
+        ctx.select("/name").require()
+
+    @DefaultPolicy
+    def endpoint_policy(ctx):
+        ctx.select("/name").require()
+
+
+EDITS = [
+    {"name": "a", "items": [{"qty": 1}, {}]},
+    {"name": "a", "email": "e", "items": [{"qty": 1}, {}]},
+    {"name": "a", "email": "e", "items": [{"qty": 1}, {"qty": 2}],
+     "client": "ios"},
+    {"name": "", "email": "e", "items": [{"qty": 1}, {"qty": 2}],
+     "client": "ios", "age": 3},
+    {"name": "b", "email": "e", "items": [{"qty": 1}, {"qty": 2}],
+     "client": "web", "address": {"zip": "10001"}},
+    {"email": "e", "client": "android", "address": {"zip": "10001"}},
+    {},
+]
+
+
+class IncrementalTestCase(TestCase):
+    def assertSameResults(self, policy, incremental, obj):
+        self.assertEqual(
+            described(policy.run(copy.deepcopy(obj))),
+            described(incremental.run(copy.deepcopy(obj)))
+        )
+
+    def test_same_results(self):
+        policy = Forms().form_policy
+        incremental = policy.incremental()
+        self.assertIsNotNone(incremental.policy_rule)
+
+        for obj in EDITS + list(reversed(EDITS)):
+            self.assertSameResults(policy, incremental, obj)
+        self.assertGreater(incremental.reused, incremental.ran)
+
+    def test_reruns_affected(self):
+        incremental = Forms().form_policy.incremental()
+        obj = copy.deepcopy(EDITS[2])
+        incremental.run(copy.deepcopy(obj))
+        ran = incremental.ran
+
+        obj["email"] = "f"
+        incremental.run(copy.deepcopy(obj))
+        self.assertEqual(ran + 1, incremental.ran)
+
+        # the error for the name comes before the others, which are
+        # appended all the same
+        obj["name"] = ""
+        incremental.run(copy.deepcopy(obj))
+        self.assertEqual(ran + 2, incremental.ran)
+
+        # as recorded before
+        obj["name"] = "a"
+        results = incremental.run(copy.deepcopy(obj))
+        self.assertEqual(ran + 2, incremental.ran)
+        self.assertEqual(
+            ["MISSING_REQUIRED_VALUE"],
+            [error["code"] for error in results[0]["errors"]]
+        )
+
+    def test_node_kind_changes(self):
+        policy = Forms().tags_policy
+        incremental = policy.incremental()
+        for obj in [{"tags": None}, {"tags": ["old"]}, {"tags": None},
+                    {"tags": ["old"], "name": "a"}]:
+            self.assertSameResults(policy, incremental, obj)
+
+    def test_not_incremental(self):
+        policy = Forms().endpoint_policy
+        incremental = policy.incremental()
+        self.assertIsNone(incremental.policy_rule)
+        self.assertSameResults(policy, incremental, {})
+        self.assertEqual(0, incremental.ran)
+
+
+class ReadLogTestCase(TestCase):
+    def test_reads(self):
+        partial = Partial.from_obj({"a": {"b": 1}, "errors": [{}]})
+        _, partial = partial.select("/a")
+
+        with ReadLog() as read_log:
+            partial.peek("b")
+            partial.select("/c/d")
+            partial.select_path(("e",))
+            self.assertEqual(1, partial.append_index("/errors"))
+        partial.peek("/f")
+
+        self.assertEqual(set([("a", "b")]), read_log.peeked)
+        self.assertEqual(set([("c", "d")]), read_log.selected)
+        self.assertEqual(set([("errors",)]), read_log.appended)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import gc
+import pickle
+import unittest
+from unittest import TestCase
+
+from calcifer.definitions import Field, Value
+from calcifer.interning import InternTable
+from calcifer.tree import (
+    PolicyNode, LeafPolicyNode, DictPolicyNode, ListPolicyNode,
+    UnknownPolicyNode,
+)
+from calcifer import Partial, permit_values, regarding
+
+
+class Box(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class InternTableTestCase(TestCase):
+    def test_intern(self):
+        table = InternTable()
+        same = lambda box, other: box.value == other.value
+
+        first = Box(1)
+        self.assertIs(first, table.intern(first, 1, same))
+        self.assertIs(first, table.intern(Box(1), 1, same))
+        other = Box(2)
+        # same bucket, told apart by `same`
+        self.assertIs(other, table.intern(other, 1, same))
+        self.assertEqual(len(table), 2)
+        self.assertEqual((table.hits, table.misses), (1, 2))
+
+    def test_weak_values(self):
+        table = InternTable()
+        same = lambda box, other: box.value == other.value
+
+        table.intern(Box(1), 1, same)
+        gc.collect()
+        self.assertEqual(len(table), 0)
+
+
+class InternedNodesTestCase(TestCase):
+    def test_definitions(self):
+        self.assertIs(Value(5).interned(), Value(5).interned())
+        self.assertIsNot(Value(1).interned(), Value(True).interned())
+        self.assertIs(
+            Field("string", required=True).interned(),
+            Field("string", required=True).interned(),
+        )
+
+        # fields cannot change once hashed
+        field = Field("string", required=True).interned()
+        with self.assertRaises(TypeError):
+            field.params['required'] = False
+        with self.assertRaises(TypeError):
+            field.params.update(value="x")
+        with self.assertRaises(TypeError):
+            params = field.params
+            params |= {"required": False}
+        with self.assertRaises(TypeError):
+            field.params.__init__(required=False)
+        self.assertEqual(
+            {"type": "string", "required": True}, field.params
+        )
+        self.assertEqual(field, pickle.loads(pickle.dumps(field)))
+        self.assertIs(field, Field("string", required=True).interned())
+
+        # values that are not plain scalars are left alone
+        value = Value([1, 2])
+        self.assertIs(value, value.interned())
+        self.assertFalse(value._interned)
+
+    def test_from_obj(self):
+        obj = {"foo": {"bar": 5}, "baz": [1, "two"]}
+        node = PolicyNode.from_obj(obj)
+        self.assertIs(node, PolicyNode.from_obj(obj))
+        self.assertIs(
+            node["foo"], PolicyNode.from_obj({"bar": 5})
+        )
+        self.assertEqual(hash(node), hash(DictPolicyNode(**obj)))
+
+        self.assertIsNot(
+            PolicyNode.from_obj({"foo": 1}), PolicyNode.from_obj({"foo": 2})
+        )
+
+    def test_set_child_stays_interned(self):
+        node = PolicyNode.from_obj({"foo": 5, "bar": [6]})
+        new_node = node.set_child("foo", PolicyNode.from_obj(7))
+
+        self.assertIs(new_node, PolicyNode.from_obj({"foo": 7, "bar": [6]}))
+        self.assertIs(node, new_node.set_child("foo", PolicyNode.from_obj(5)))
+
+        new_list = node["bar"].set_child(0, PolicyNode.from_obj(8))
+        self.assertIs(new_list, PolicyNode.from_obj([8]))
+
+    def test_interned_nodes_are_immutable(self):
+        node = PolicyNode.from_obj({"foo": 5})
+        with self.assertRaises(TypeError):
+            node["foo"] = PolicyNode.from_obj(6)
+
+        # nodes built directly remain mutable until interned
+        node = DictPolicyNode()
+        node["foo"] = LeafPolicyNode(Value(5))
+        self.assertIs(node.interned(), PolicyNode.from_obj({"foo": 5}))
+
+    def test_equality(self):
+        self.assertEqual(
+            DictPolicyNode(foo=ListPolicyNode(1, 2)),
+            PolicyNode.from_obj({"foo": [1, 2]}),
+        )
+        self.assertNotEqual(
+            PolicyNode.from_obj({"foo": [1, 2]}),
+            PolicyNode.from_obj({"foo": [1, 3]}),
+        )
+        # equal values of different types are still equal nodes
+        self.assertEqual(
+            PolicyNode.from_obj({"foo": 1}), PolicyNode.from_obj({"foo": 1.0})
+        )
+        self.assertEqual(UnknownPolicyNode(), UnknownPolicyNode().interned())
+
+    def test_unhashable_values(self):
+        node = DictPolicyNode(foo=LeafPolicyNode(Value({"a": 1})))
+        self.assertIsNone(node.structural_hash())
+        self.assertIs(node, node.interned())
+        with self.assertRaises(TypeError):
+            hash(node)
+
+    def test_pickle(self):
+        node = PolicyNode.from_obj({"foo": [1, 2]})
+        hash(node)
+        unpickled = pickle.loads(pickle.dumps(node))
+        self.assertIsNone(unpickled._hash)
+        self.assertFalse(unpickled._interned)
+        self.assertEqual(node, unpickled)
+
+    def test_branches_share_subtrees(self):
+        rule = regarding("/foo", permit_values([1, 2]))
+        partial = Partial.from_obj({"foo": None, "bar": {"baz": [1, 2, 3]}})
+        _, partial = partial.select("/foo", set_path=True)
+        _, partial = partial.set_node(UnknownPolicyNode())
+
+        results = rule.run(partial).getValue()
+        self.assertEqual(2, len(results))
+        (_, first), (_, second) = results
+        self.assertIs(first.root_node["bar"], second.root_node["bar"])
+        self.assertIs(first.peek("/foo"), PolicyNode.from_obj(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import TestCase
+
+from calcifer import Partial, permit_values, regarding, policies
+from calcifer.limits import BranchLimit, LimitedResults, current, rank_by
+from calcifer.policy import DefaultPolicy
+
+
+class Catalog(object):
+    @DefaultPolicy
+    def wide_policy(ctx):
+        for field in ["a", "b", "c"]:
+            ctx.select("/" + field).whitelist_values([1, 2, 3, 4])
+
+
+class BranchLimitTestCase(TestCase):
+    def test_within_limit(self):
+        results = Catalog().wide_policy.run({"a": 1, "b": 2}, max_branches=8)
+        self.assertIsInstance(results, LimitedResults)
+        self.assertEqual(4, len(results))
+        self.assertFalse(results.truncated)
+        self.assertEqual(0, results.dropped)
+
+    def test_truncated(self):
+        self.assertEqual(64, len(Catalog().wide_policy.run({})))
+
+        results = Catalog().wide_policy.run({}, max_branches=5)
+        self.assertEqual(5, len(results))
+        self.assertTrue(results.truncated)
+        self.assertGreater(results.dropped, 0)
+        self.assertIsNone(current())
+
+        # with a limit on results as well
+        results = Catalog().wide_policy.run({}, limit=2, max_branches=3)
+        self.assertEqual(2, len(results))
+        self.assertTrue(results.truncated)
+
+    def test_strategy(self):
+        strategy = rank_by(lambda _, partial: partial.root["a"], reverse=True)
+        rule = policies(regarding("/a", permit_values([1, 2, 3, 4])))
+
+        with BranchLimit(2, strategy) as branch_limit:
+            results = rule.run(Partial()).getValue()
+        # the results of the last bind in `policies` are left to the caller
+        self.assertEqual(4, len(results))
+
+        kept = branch_limit.truncate(results)
+        self.assertEqual([4, 3], [partial.root["a"] for _, partial in kept])
+        self.assertEqual((1, 2), (branch_limit.truncations, branch_limit.dropped))
+
+    def test_keep_first_is_lazy(self):
+        produced = []
+
+        def results():
+            for idx in range(100):
+                produced.append(idx)
+                yield idx, None
+
+        branch_limit = BranchLimit(3)
+        kept = branch_limit.truncate(results())
+        self.assertEqual([0, 1, 2], [value for value, _ in kept])
+        # the branches after the first one over the limit are never run
+        self.assertEqual(4, len(produced))
+        self.assertEqual((1, 1), (branch_limit.truncations, branch_limit.dropped))
+
+        branch_limit = BranchLimit(3, rank_by(lambda value, _: -value))
+        kept = branch_limit.truncate(results())
+        self.assertEqual([99, 98, 97], [value for value, _ in kept])
+        self.assertEqual(97, branch_limit.dropped)
+
+    def test_limits_nest(self):
+        outer = BranchLimit(10)
+        inner = BranchLimit(1)
+        with outer:
+            with inner:
+                self.assertIs(inner, current())
+            self.assertIs(outer, current())
+        self.assertIsNone(current())
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            BranchLimit(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
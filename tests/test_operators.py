@@ -1,20 +1,28 @@
+from itertools import islice
+import inspect
+import threading
 import unittest
 from unittest import TestCase
 
 from pymonad import Just, List, Maybe
 
 from calcifer.monads import (
-    Identity, policy_rule_func
+    Identity, Stream, policy_rule_func
 )
+from calcifer.partial import parse_scope
+from calcifer.zipper import Zipper
 from calcifer.tree import (
-    LeafPolicyNode, DictPolicyNode, UnknownPolicyNode, Value
+    PolicyNode, LeafPolicyNode, DictPolicyNode, ListPolicyNode,
+    UnknownPolicyNode, Value
 )
+from calcifer.definitions import Field
 from calcifer import (
     Partial,
     set_value, select, check, policies, regarding, fail, match, attempt,
-    permit_values, define_as, children, each, scope,
+    permit_values, define_as, children, each, scope, or_error, wrap_context,
 )
-from calcifer import operators
+from calcifer.contexts.base import ContextFrame
+from calcifer import asts, operators
 
 
 # set up the operators for the Identity and Maybe monads for
@@ -31,6 +39,8 @@ regardingM = operators.make_regarding(Maybe)
 selectM = operators.make_select(Maybe)
 matchM = operators.make_match(Maybe)
 
+opsS = operators.operators_for(Stream)
+
 
 class PolicyTestCase(TestCase):
     def test_select(self):
@@ -79,6 +89,84 @@ class PolicyTestCase(TestCase):
         self.assertEqual(LeafPolicyNode(Value(5)), value)
         self.assertEqual([], new_item.path)
 
+    def test_parse_scope(self):
+        self.assertEqual((True, ()), parse_scope("/"))
+        self.assertEqual((True, ("foo", 0, "bar")), parse_scope("/foo/0/bar"))
+        self.assertEqual((False, ("foo", 1)), parse_scope("foo/1"))
+
+        partial = Partial.from_obj({"foo": [{"bar": 5}]})
+        _, partial = partial.select("/foo/0", set_path=True)
+        self.assertEqual(("foo", 0), partial.abs_path)
+        self.assertEqual(["foo", 0], partial.path)
+        self.assertEqual("/foo/0", partial.scope)
+        self.assertEqual(("foo", 0, "bar"), partial.scope_path("bar"))
+        self.assertEqual(("bar",), partial.scope_path("/bar"))
+
+        # re-scoping to the current path is free
+        node, same = partial.select_path(("foo", 0))
+        self.assertIs(same, partial)
+        self.assertEqual({"bar": 5}, node.value)
+
+    def test_peek(self):
+        partial = Partial.from_obj({"foo": {"bar": 5}, "errors": []})
+        _, partial = partial.select("/foo", set_path=True)
+
+        self.assertEqual(LeafPolicyNode(Value(5)), partial.peek("bar"))
+        self.assertEqual(LeafPolicyNode(Value(5)), partial.peek("/foo/bar"))
+        self.assertEqual([], partial.peek("/errors").value)
+        self.assertEqual({"bar": 5}, partial.peek().value)
+
+        # missing nodes are not filled in
+        self.assertEqual(UnknownPolicyNode(), partial.peek("/foo/baz/qux"))
+        self.assertEqual(UnknownPolicyNode(), partial.peek("/foo/bar/qux"))
+        self.assertEqual({"foo": {"bar": 5}, "errors": []}, partial.root)
+
+    def test_select_shares_structure(self):
+        policy = DictPolicyNode(**{
+            "field{}".format(i): {"value": i} for i in range(100)
+        })
+
+        node, new_policy = policy.select(["field7", "value"])
+        self.assertIs(new_policy, policy)
+
+        node, new_policy = policy.select(["field7", "other"])
+        self.assertEqual(UnknownPolicyNode(), node)
+        self.assertIsNot(new_policy, policy)
+        for i in range(100):
+            key = "field{}".format(i)
+            if i != 7:
+                self.assertIs(new_policy[key], policy[key])
+        self.assertIs(new_policy["field7"]["value"], policy["field7"]["value"])
+
+    def test_zipper_move_to(self):
+        root = PolicyNode.from_obj({"foo": {"bar": 5, "baz": 6}, "qux": 7})
+        zipper = Zipper([], root).select(["foo", "bar"])
+
+        moved = zipper.move_to(("foo", "baz"))
+        self.assertEqual(("foo", "baz"), moved.abs_path)
+        self.assertEqual(LeafPolicyNode(Value(6)), moved.node)
+        # nothing was filled in, so the root is the original one
+        self.assertIs(root, moved.root.node)
+
+        updated = moved.set_node(LeafPolicyNode(Value(8))).move_to(("qux",))
+        self.assertEqual(
+            {"foo": {"bar": 5, "baz": 8}, "qux": 7}, updated.root.node.value
+        )
+        self.assertIs(root["foo"]["bar"], updated.root.node["foo"]["bar"])
+
+    def test_partial_keeps_focus(self):
+        partial = Partial.from_obj({"foo": {"bar": 5}})
+        _, partial = partial.select("/foo/bar")
+        _, new_partial = partial.set_value(6)
+
+        self.assertEqual(("foo", "bar"), new_partial.abs_path)
+        self.assertEqual({"foo": {"bar": 6}}, new_partial.root)
+
+        _, new_partial = new_partial.set_value(7, "/foo/baz")
+        self.assertEqual(("foo", "bar"), new_partial.abs_path)
+        self.assertEqual({"foo": {"bar": 6, "baz": 7}}, new_partial.root)
+        self.assertEqual({"foo": {"bar": 5}}, partial.root)
+
 
 class PolicyBuilderTestCase(TestCase):
     def test_set_valueI(self):
@@ -266,6 +354,41 @@ class PolicyBuilderTestCase(TestCase):
         values = [r[1].select("/fields/foo")[0].value for r in results]
         self.assertEqual(["foo"], values)
 
+    def test_permit_values_determined(self):
+        permitted = ["a", ["b"], "c", "a", {"d": 1}]
+        rule = regarding("/x", permit_values(permitted))
+
+        def run(obj):
+            results = rule.run(Partial.from_obj(obj)).getValue()
+            return [value for value, _ in results]
+
+        self.assertEqual(["a", "a"], [
+            partial.root["x"]
+            for _, partial in rule.run(Partial.from_obj({"x": "a"})).getValue()
+        ])
+        self.assertEqual([], run({"x": "z"}))
+        unhashable_rule = regarding(
+            "/x", define_as(Value(["b"])), permit_values(permitted)
+        )
+        results = unhashable_rule.run(Partial()).getValue()
+        self.assertEqual([["b"]], [value for value, _ in results])
+
+        # undetermined nodes fork
+        self.assertEqual(5, len(run({})))
+
+        # as do fields without a value yet
+        field_rule = regarding(
+            "/x", define_as(Field(type="string")), permit_values(["a", "b"])
+        )
+        results = field_rule.run(Partial()).getValue()
+        self.assertEqual(["a", "b"], [partial.root["x"] for _, partial in results])
+
+        field_rule = regarding(
+            "/x", define_as(Field(value="b")), permit_values(set(["a", "b"]))
+        )
+        results = field_rule.run(Partial()).getValue()
+        self.assertEqual(["b"], [partial.root["x"] for _, partial in results])
+
     def test_attempt(self):
         rule = policies(
             regarding(
@@ -310,6 +433,31 @@ class PolicyBuilderTestCase(TestCase):
         results = ps.getValue()
         self.assertEqual(0, len(results))
 
+    def test_or_error(self):
+        frame = ContextFrame(
+            "named", None, regarding("code", set_value("NAMED_ERROR"))
+        )
+        rule = regarding(
+            "/fields/foo",
+            set_value(1),
+            wrap_context(frame, or_error(match(2))),
+            or_error(match(1)),
+        )
+
+        results = rule.run(Partial()).getValue()
+        self.assertEqual(1, len(results))
+
+        partial = results[0][1]
+        self.assertEqual(
+            [{
+                "value": 1,
+                "scope": "/fields/foo",
+                "context": [frame],
+                "code": "NAMED_ERROR",
+            }],
+            partial.root["errors"]
+        )
+
     def test_check(self):
         def get_policies(value):
             return regarding(
@@ -457,6 +605,184 @@ class PolicyBuilderTestCase(TestCase):
 
         self.assertEqual(root, ref_obj)
 
+    def test_permit_valuesS(self):
+        rule = opsS.policies(
+            opsS.regarding("/fields/foo", opsS.permit_values(range(10 ** 9))),
+            opsS.regarding("/fields/bar", opsS.permit_values(range(10 ** 9))),
+        )
+
+        ps = rule.run(Partial())
+        self.assertIsInstance(ps, Stream)
+
+        partials = [partial for _, partial in islice(ps, 3)]
+        self.assertEqual(
+            [{"fields": {"foo": 0, "bar": bar}} for bar in range(3)],
+            [partial.root for partial in partials]
+        )
+
+    def test_attemptS(self):
+        rule = opsS.regarding(
+            "/fields/foo",
+            opsS.permit_values(["foo", "bar"]),
+            opsS.attempt(
+                opsS.match("foo"),
+                opsS.set_value("foo_updated")
+            ),
+        )
+
+        results = rule.run(Partial()).getValue()
+        values = [r[1].select("/fields/foo")[0].value for r in results]
+        self.assertEqual(["foo_updated", "bar"], values)
+
+    def test_or_errorS(self):
+        rule = opsS.regarding("/foo", opsS.or_error(opsS.fail()))
+        results = rule.run(Partial()).getValue()
+        self.assertEqual(
+            [{"value": None, "scope": "/foo", "context": []}],
+            [r[1].root["errors"] for r in results][0]
+        )
+
+    def test_eachS(self):
+        def increment(value):
+            return opsS.set_value(value + 1)
+
+        rule = opsS.children() >> opsS.each(increment)
+        results = rule.run(Partial.from_obj([2, 5, 1])).getValue()
+
+        self.assertEqual([[3, 6, 2]], [r[1].root for r in results])
+
+    def test_each_parallel(self):
+        for ops in [operators.operators_for(List), opsS]:
+            def rules(parallel):
+                return ops.children() >> ops.each(
+                    ops.permit_values(["x", "y"]), parallel=parallel
+                )
+
+            root = ListPolicyNode(UnknownPolicyNode(), "x", UnknownPolicyNode())
+            expected = rules(False).run(Partial(root)).getValue()
+            results = rules(True).run(Partial(root)).getValue()
+            self.assertEqual(4, len(results))
+            self.assertEqual(
+                [partial.root for _, partial in expected],
+                [partial.root for _, partial in results]
+            )
+
+    def test_each_parallel_reads_siblings(self):
+        for ops in [operators.operators_for(List), opsS]:
+            def rules(parallel):
+                def after_first(value):
+                    return ops.set_value(value + 1)
+
+                # every child reads the first, which the first one sets
+                return ops.children() >> ops.each(
+                    ops.regarding("/0", ops.get_value()) >> after_first,
+                    parallel=parallel
+                )
+
+            for parallel in [False, True]:
+                results = rules(parallel).run(Partial.from_obj([1, 1, 1]))
+                self.assertEqual(
+                    [[2, 3, 3]],
+                    [partial.root for _, partial in results.getValue()]
+                )
+
+    def test_operator_registry(self):
+        # operator factories are made once per monad, and shared
+        self.assertIs(operators.make_regarding(Stream), opsS.regarding)
+        self.assertIs(operators.make_get_value(List), operators.get_value)
+        self.assertIsNot(
+            operators.make_each.uncached(List), operators.each
+        )
+
+        # documented rule funcs keep their docs, not classes of their own
+        self.assertIs(type(operators.regarding), type(operators.get_value))
+        self.assertIn("scope", inspect.getdoc(operators.regarding))
+
+
+class BindChainTestCase(TestCase):
+    def make_chain(self, ops, steps):
+        def increment(value):
+            return ops.unit(value + 1)
+
+        rule = ops.unit(0)
+        for _ in range(steps):
+            rule = rule >> increment
+        return rule
+
+    def test_long_chain(self):
+        results = self.make_chain(operators, 10 ** 4).run(Partial())
+        self.assertEqual([10 ** 4], [value for value, _ in results])
+
+        results = self.make_chain(opsS, 10 ** 4).run(Partial())
+        self.assertEqual([10 ** 4], [value for value, _ in results])
+
+    def test_order(self):
+        for ops in [operators, opsS]:
+            rule = ops.regarding("/x", ops.permit_values([1, 2]))
+            rule = rule >> (
+                lambda _: ops.regarding("/y", ops.permit_values(["a", "b"]))
+            )
+            rule = rule >> ops.regarding("/z", ops.set_value(0))
+
+            roots = [partial.root for _, partial in rule.run(Partial())]
+            self.assertEqual([
+                {"x": 1, "y": "a", "z": 0}, {"x": 1, "y": "b", "z": 0},
+                {"x": 2, "y": "a", "z": 0}, {"x": 2, "y": "b", "z": 0},
+            ], roots)
+
+    def test_stream_is_lazy(self):
+        rule = opsS.regarding("/x", opsS.permit_values(range(10 ** 9)))
+        rule = rule >> opsS.regarding("/y", opsS.set_value(0))
+
+        results = rule.run(Partial())
+        partials = [partial for _, partial in islice(results, 2)]
+        self.assertEqual([{"x": 0, "y": 0}, {"x": 1, "y": 0}],
+                         [partial.root for partial in partials])
+
+
+class PolicyRuleAstTestCase(TestCase):
+    def tearDown(self):
+        asts.enable()
+
+    def test_binding_repr(self):
+        rule = regarding("/foo", set_value(5))
+        for _ in range(2000):
+            rule = rule >> set_value
+
+        operands = rule.ast.operands
+        self.assertEqual(len(operands), 2001)
+        self.assertEqual(
+            repr(rule.ast),
+            " >> ".join(
+                ['regarding(\'/foo\', set_value(5))'] + ['set_value'] * 2000
+            )
+        )
+
+    def test_disabled(self):
+        asts.disable()
+        rule = regarding("/foo", set_value(5)) >> (
+            lambda _: regarding("/bar", set_value(6))
+        )
+        self.assertIsNone(rule.ast)
+
+        results = rule.run(Partial()).getValue()
+        self.assertEqual(1, len(results))
+        self.assertEqual({"foo": 5, "bar": 6}, results[0][1].root)
+
+    def test_thread_local(self):
+        asts.disable()
+        rules = []
+        thread = threading.Thread(
+            target=lambda: rules.append(regarding("/foo", set_value(5)))
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNotNone(rules[0].ast)
+
+        with asts.enabled_as(True):
+            self.assertIsNotNone(regarding("/foo", set_value(5)).ast)
+        self.assertIsNone(regarding("/foo", set_value(5)).ast)
+
 
 if __name__ == '__main__':
     unittest.main()
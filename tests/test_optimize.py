@@ -0,0 +1,103 @@
+import threading
+import unittest
+from unittest import TestCase
+
+from calcifer import Partial, policies, regarding, set_value, optimize
+from calcifer.optimize import count_rules, explain
+from calcifer.policy import DefaultPolicy
+
+from tests.helpers import described
+
+
+class Requests(object):
+    @DefaultPolicy
+    def client_policy(ctx):
+        ctx.select("/client").whitelist_values(["ios", "android"])
+
+    @DefaultPolicy(includes=['client_policy'])
+    def sender_policy(ctx):
+        ctx.select("/sender").require()
+        ctx.select("/fields").each().apply(str, ctx.value)
+
+    @DefaultPolicy(includes=['client_policy'])
+    def empty_incl(ctx):
+        pass
+
+
+class OptimizeTestCase(TestCase):
+    def tearDown(self):
+        optimize.enable()
+
+    def test_flatten_policies(self):
+        rule = policies(
+            policies(regarding("/a", set_value(1)), regarding("/b", set_value(2))),
+            regarding("/c", set_value(3)),
+        )
+        self.assertEqual(3, len(rule.value.policy_rules))
+        self.assertEqual(
+            {"a": 1, "b": 2, "c": 3}, rule.run(Partial()).getValue()[0][1].root
+        )
+
+        optimize.disable()
+        rule = policies(policies(set_value(1)), set_value(2))
+        self.assertEqual(2, len(rule.value.policy_rules))
+
+    def test_single_policy(self):
+        inner = regarding("/a", set_value(1))
+        rule = policies(inner)
+        self.assertIs(inner.value, rule.value)
+
+    def test_same_results(self):
+        for obj in [{}, {"client": "ios", "sender": "me"}, {"client": "x"},
+                    {"fields": {"a": 1, "b": 2}}]:
+            optimize.disable()
+            expected = described(Requests().sender_policy.run(dict(obj)))
+            optimize.enable()
+            self.assertEqual(
+                expected, described(Requests().sender_policy.run(dict(obj)))
+            )
+
+    def test_included_frames(self):
+        # the included policy's rules trace the including policy's frame
+        results = described(Requests().empty_incl.run({"client": "windows"}))
+        optimize.disable()
+        expected = described(Requests().empty_incl.run({"client": "windows"}))
+        self.assertEqual(expected, results)
+        self.assertIn("empty_incl", results[0]["errors"][0]["context"][0])
+
+    def test_explain(self):
+        counts = explain(Requests().sender_policy, {"client": "x"})
+        self.assertLess(counts.compiled['after'], counts.compiled['before'])
+        self.assertLess(counts.ran['after'], counts.ran['before'])
+        self.assertIn("compile", repr(counts))
+        self.assertTrue(optimize.is_enabled())
+
+        built, rule = count_rules(set_value, 5)
+        self.assertEqual(1, built)
+
+    def test_thread_local(self):
+        optimize.disable()
+        seen = []
+        thread = threading.Thread(
+            target=lambda: seen.append(optimize.is_enabled())
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual([True], seen)
+        self.assertFalse(optimize.is_enabled())
+
+        with optimize.enabled_as(True):
+            self.assertTrue(optimize.is_enabled())
+        self.assertFalse(optimize.is_enabled())
+
+    def test_plan_key(self):
+        # plans compiled without the optimisations are cached apart
+        policy = Requests().sender_policy
+        key = policy.get_plan_key()
+        with optimize.enabled_as(False):
+            self.assertNotEqual(key, policy.get_plan_key())
+        self.assertEqual(key, policy.get_plan_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import pickle
+import subprocess
+import sys
+import unittest
+from unittest import TestCase
+
+from calcifer.partial import Partial
+from calcifer.persistent import PersistentMap, PersistentVector
+
+
+class CollidingKey(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.value == self.value
+
+
+class PersistentMapTestCase(TestCase):
+    def test_set(self):
+        items = [("k{}".format(i), i) for i in range(2000)]
+        pmap = PersistentMap()
+        for key, value in items:
+            pmap = pmap.set(key, value)
+
+        self.assertEqual(len(pmap), 2000)
+        self.assertEqual(dict(pmap.items()), dict(items))
+        # insertion order, like dict
+        self.assertEqual(list(pmap), [key for key, _ in items])
+
+        updated = pmap.set("k5", "five")
+        self.assertEqual(updated["k5"], "five")
+        self.assertEqual(pmap["k5"], 5)
+        self.assertEqual(list(updated), list(pmap))
+
+        self.assertIs(pmap.set("k5", pmap["k5"]), pmap)
+        self.assertNotIn("nope", pmap)
+        self.assertIsNone(pmap.get("nope"))
+
+    def test_collisions(self):
+        keys = [CollidingKey(i) for i in range(10)]
+        pmap = PersistentMap((key, key.value) for key in keys)
+        pmap = pmap.set("other", -1)
+
+        self.assertEqual([pmap[key] for key in keys], list(range(10)))
+        self.assertEqual(pmap["other"], -1)
+        self.assertEqual(pmap.set(keys[3], "three")[CollidingKey(3)], "three")
+
+    def test_eq(self):
+        self.assertEqual(PersistentMap({"a": 1, "b": 2}), {"b": 2, "a": 1})
+        self.assertNotEqual(PersistentMap({"a": 1}), PersistentMap({"a": 2}))
+
+    def test_pickle(self):
+        items = [("k{}".format(i), i) for i in range(100)]
+        persistent = PersistentMap(items)
+        unpickled = pickle.loads(pickle.dumps(persistent))
+        self.assertEqual(persistent, unpickled)
+        self.assertEqual([key for key, _ in items], list(unpickled))
+
+    def test_pickle_hash_seed(self):
+        # string hashes differ between processes with different seeds
+        partial = Partial.from_obj({"client": "ios", "sender": {"id": 1}})
+        script = "\n".join([
+            "import pickle, sys",
+            "stdin = getattr(sys.stdin, 'buffer', sys.stdin)",
+            "partial = pickle.loads(stdin.read())",
+            "_, partial = partial.set_value('me', '/sender/name')",
+            "print(partial.peek('/client').value, partial.root['sender'])",
+        ])
+        seed = "3" if os.environ.get("PYTHONHASHSEED") == "2" else "2"
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+            sys.path
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-c", script], env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        out, _ = process.communicate(pickle.dumps(partial, protocol=2))
+        self.assertEqual(0, process.returncode)
+        self.assertEqual(
+            "ios {'id': 1, 'name': 'me'}", out.decode().strip()
+        )
+
+    def test_changed(self):
+        pmap = PersistentMap(("k{}".format(i), object()) for i in range(2000))
+        self.assertEqual(set(), pmap.changed(pmap))
+
+        updated = pmap.set("k7", object()).set("new", object())
+        self.assertEqual({"k7", "new"}, updated.changed(pmap))
+        self.assertEqual({"k7", "new"}, pmap.changed(updated))
+
+        keys = [CollidingKey(i) for i in range(3)]
+        colliding = PersistentMap((key, object()) for key in keys)
+        self.assertEqual(
+            {keys[1]}, colliding.set(keys[1], object()).changed(colliding)
+        )
+
+
+class PersistentVectorTestCase(TestCase):
+    def test_pickle(self):
+        vector = PersistentVector(range(100))
+        unpickled = pickle.loads(pickle.dumps(vector))
+        self.assertEqual(vector, unpickled)
+        self.assertEqual(list(range(100)), list(unpickled.append(100))[:100])
+
+    def test_append_set(self):
+        for size in [0, 1, 32, 33, 1024, 1025, 5000]:
+            values = list(range(size))
+            vector = PersistentVector(values)
+            self.assertEqual(list(vector), values)
+            self.assertEqual(len(vector), size)
+
+            appended = vector.append("x")
+            self.assertEqual(list(appended), values + ["x"])
+            self.assertEqual(len(vector), size)
+
+            if size:
+                updated = vector.set(size // 2, "y")
+                self.assertEqual(updated[size // 2], "y")
+                self.assertEqual(vector[size // 2], size // 2)
+                self.assertEqual(vector[-1], size - 1)
+
+    def test_changed(self):
+        vector = PersistentVector(object() for _ in range(5000))
+        self.assertEqual([], vector.changed(vector))
+
+        updated = vector.set(40, "x").set(4000, "y")
+        self.assertEqual([40, 4000], updated.changed(vector))
+        self.assertEqual([5000], vector.append("z").changed(vector))
+        self.assertEqual(
+            [32], PersistentVector(range(32)).append(32).changed(
+                PersistentVector(range(32))
+            )
+        )
+
+    def test_index_error(self):
+        vector = PersistentVector([1, 2])
+        self.assertRaises(IndexError, lambda: vector[2])
+        self.assertRaises(IndexError, lambda: vector.set(3, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
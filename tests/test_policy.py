@@ -1,10 +1,26 @@
 # pylint: disable=no-self-argument
+import pickle
 import unittest
 from unittest import TestCase
 
+from calcifer.contexts import Context
+from calcifer.monads import Stream
 from calcifer.partial import Partial
 
-from calcifer.policy import BasePolicy
+from calcifer.policy import BasePolicy, DefaultPolicy
+
+
+class Endpoints(object):
+    """
+    Policies defined at module level, so that they may be pickled
+    """
+    @DefaultPolicy
+    def client_policy(ctx):
+        ctx.select("/client").whitelist_values(["ios", "android"])
+
+    @DefaultPolicy(includes=['client_policy'])
+    def sender_policy(ctx):
+        ctx.select("/sender").require()
 
 
 class PolicyProviderTestCase(TestCase):
@@ -71,6 +87,257 @@ class PolicyProviderTestCase(TestCase):
         })
         self.assertEqual(results[0], [1, 2, 3])
 
+    def test_derive(self):
+        class Service(object):
+            def __init__(self, config):
+                self.config = config
+
+            @DefaultPolicy(bind_ref=True)
+            def config_policy(ctx, ref):
+                ctx.select("/config").set_value(ref.get("config"))
+
+        config = {"graph": [1, 2, 3]}
+        service = Service(config)
+        other = Service({})
+
+        # each access binds its own parent
+        policy = service.config_policy
+        self.assertIs(service, policy.parent)
+        self.assertIs(other, other.config_policy.parent)
+        self.assertIs(service, policy.parent)
+
+        # derived bindings share the parent rather than copying it
+        using = policy.using(1, 2)
+        self.assertIs(service, using.parent)
+        self.assertIs(service.config, using.parent.config)
+        self.assertEqual((1, 2), using.args)
+        self.assertEqual([], policy.args)
+
+        included = policy.include(Endpoints().client_policy)
+        self.assertEqual(1, len(included.includes))
+        self.assertEqual([], policy.includes)
+
+        results = policy.run({"config": 5})
+        self.assertEqual(5, results[0]["config"])
+        self.assertFalse(hasattr(policy, 'ref'))
+
+    def test_shared_includes(self):
+        built = []
+
+        class Shared(object):
+            @DefaultPolicy
+            def common_policy(ctx):
+                built.append('common_policy')
+                ctx.select("/common").require()
+
+            @DefaultPolicy(includes=['common_policy'])
+            def a_policy(ctx):
+                ctx.select("/a").set_value(1)
+
+            @DefaultPolicy(includes=['a_policy', 'common_policy'])
+            def b_policy(ctx):
+                ctx.select("/b").set_value(2)
+
+        results = Shared().b_policy.run({})
+        self.assertEqual(['common_policy'], built)
+
+        self.assertEqual(1, len(results))
+        self.assertEqual((1, 2), (results[0]["a"], results[0]["b"]))
+        # the shared rule still runs wherever it is included
+        self.assertEqual(2, len(results[0]["errors"]))
+
+    def test_cache_plan(self):
+        calls = []
+
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                @staticmethod
+                def resolve(final):
+                    return final.root['list']
+
+            @Policy(cache_plan=True)
+            def a(ctx, value):
+                calls.append(value)
+                ctx.select("/list").append_value(value)
+
+        BasePolicy.clear_plans()
+        policy_haver = HasPolicy()
+
+        results = policy_haver.a.using(1).run({"list": []})
+        self.assertEqual(results[0], [1])
+        results = policy_haver.a.using(1).run({"list": [0]})
+        self.assertEqual(results[0], [0, 1])
+        self.assertEqual(calls, [1])
+
+        # different args, different plan
+        results = policy_haver.a.using(2).run({"list": []})
+        self.assertEqual(results[0], [2])
+        self.assertEqual(calls, [1, 2])
+
+        policy_haver.a.invalidate_plans()
+        policy_haver.a.using(1).run({"list": []})
+        self.assertEqual(calls, [1, 2, 1])
+
+        # plans for policies made on the fly do not pile up
+        for value in range(BasePolicy.plans.maxsize + 10):
+            policy_haver.a.using(value).run({"list": []})
+        self.assertEqual(BasePolicy.plans.maxsize, len(BasePolicy.plans))
+        BasePolicy.clear_plans()
+
+    def test_cache_plan_bind_ref(self):
+        calls = []
+
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                @staticmethod
+                def resolve(final):
+                    return final.root['copy']
+
+            @Policy(cache_plan=True, bind_ref=True)
+            def a(ctx, ref):
+                calls.append(ref)
+                ctx.select("/copy").set_value(ref['value'])
+
+            @Policy(cache_plan=True, includes=['a'])
+            def b(ctx):
+                pass
+
+        policy_haver = HasPolicy()
+        self.assertIsNone(policy_haver.a.plan_key)
+        self.assertIsNone(policy_haver.b.plan_key)
+
+        results = policy_haver.b.run({"value": 1})
+        self.assertEqual(results[0], 1)
+        results = policy_haver.b.run({"value": 2})
+        self.assertEqual(results[0], 2)
+        self.assertEqual(len(calls), 2)
+
+    def test_run_many(self):
+        calls = []
+
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                @staticmethod
+                def resolve(final):
+                    return final.root['list']
+
+            @Policy
+            def a(ctx):
+                calls.append(None)
+                ctx.select("/list").append_value(1)
+
+        policy_haver = HasPolicy()
+        objs = [{"list": []}, {"list": [0]}, {"list": [2, 3]}]
+        results = policy_haver.a.run_many(iter(objs))
+
+        self.assertEqual(next(results), [[1]])
+        self.assertEqual(next(results), [[0, 1]])
+        self.assertEqual(next(results), [[2, 3, 1]])
+        self.assertEqual(len(calls), 1)
+
+    def test_pickle(self):
+        policy = Endpoints().sender_policy
+        results = policy.run({"sender": "someone", "client": "windows"})
+        self.assertEqual(len(results), 1)
+
+        unpickled = pickle.loads(pickle.dumps(policy))
+        self.assertIs(unpickled.method, policy.method)
+
+        result = pickle.loads(pickle.dumps(results[0]))
+        error = result['errors'][0]
+        self.assertEqual(error['scope'], "/client")
+        frame_names = [frame.name for frame in error['context']]
+        self.assertIn("whitelist_values", frame_names)
+        self.assertEqual(
+            [repr(frame.policy_ast) for frame in error['context']],
+            [repr(frame.policy_ast) for frame in results[0]['errors'][0]['context']]
+        )
+
+    def test_run_parallel(self):
+        policy = Endpoints().sender_policy
+        objs = [
+            {"sender": "someone", "client": "ios"},
+            {"client": "android"},
+            {"sender": "someone", "client": "windows"},
+        ] * 3
+
+        results = policy.run_parallel(objs, workers=2, chunksize=2)
+
+        expected = [policy.run(obj) for obj in objs]
+        self.assertEqual(len(results), len(expected))
+        for result, expected_result in zip(results, expected):
+            self.assertEqual(len(result), len(expected_result))
+            for final, expected_final in zip(result, expected_result):
+                self.assertEqual(
+                    [error['scope'] for error in final.get('errors', [])],
+                    [error['scope'] for error in expected_final.get('errors', [])]
+                )
+                self.assertEqual(final.get('sender'), expected_final.get('sender'))
+
+    def test_run_iter_stream(self):
+        class StreamContext(Context):
+            monad = Stream
+
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                ctx_class = StreamContext
+
+                @staticmethod
+                def resolve(final):
+                    return {k: v for k, v in final.root.items() if k != 'context'}
+
+            @Policy
+            def a(ctx):
+                ctx.select("/a").whitelist_values(list(range(10 ** 4)))
+                ctx.select("/b").whitelist_values(list(range(10 ** 4)))
+
+        policy_haver = HasPolicy()
+        results = policy_haver.a.run_iter({})
+        self.assertEqual(next(results), {"a": 0, "b": 0})
+        self.assertEqual(next(results), {"a": 0, "b": 1})
+
+        results = policy_haver.a.run({"a": -1, "b": 1})
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["errors"][0]["scope"], "/a")
+
+    def test_run_first(self):
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                @staticmethod
+                def resolve(final):
+                    return {k: v for k, v in final.root.items() if k != 'context'}
+
+            @Policy(includes=['b'])
+            def a(ctx):
+                ctx.select("/a").whitelist_values(list(range(10 ** 4)))
+
+            @Policy
+            def b(ctx):
+                ctx.select("/b").whitelist_values(list(range(10 ** 4)))
+
+        policy_haver = HasPolicy()
+        self.assertEqual(policy_haver.a.run_first({}), {"a": 0, "b": 0})
+        self.assertEqual(
+            policy_haver.a.run({"b": 5}, limit=3),
+            [{"a": a, "b": 5} for a in range(3)]
+        )
+        self.assertEqual(
+            policy_haver.a.run({"a": 2, "b": 5}, limit=3),
+            [{"a": 2, "b": 5}]
+        )
+
+    def test_run_first_no_results(self):
+        class HasPolicy(object):
+            class Policy(BasePolicy):
+                pass
+
+            @Policy
+            def a(ctx):
+                ctx.fail()
+
+        policy_haver = HasPolicy()
+        self.assertIsNone(policy_haver.a.run_first({}))
+
 
 if __name__ == '__main__':
     unittest.main()